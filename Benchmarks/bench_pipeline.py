@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the serial -> parse -> store -> display pipeline of Dashboard_2.
+
+Every stage is fed a synthetic stream of Controller_2 Status() frames and timed on its own:
+
+    decode   FrameDecoder over the raw byte stream (next to the old index/del loop for reference),
+             and the binary COBS/CRC16 frames through AutoFrameDecoder and BinaryFrameDecoder.feed_array
+    parse    split/strip of a frame into the data_list read_serial builds, and the compiled
+             controller-2 FrameSchema parser that replaced it
+    store    SensorDatabase.insert_reading, unbatched and batched (group commit), and batched
+             with the ingest journal in front of the writer
+    ingest   Rig.handle_frame (parse -> journal + writer queue -> UI buffers), without and with
+             the pipeline metrics (pipeline_metrics.py) that /metrics serves
+    display  the Dash callbacks update_data_table / update_serial_log, with a new and an unchanged LiveView
+    fetch    a polling consumer that gets 10 new readings per refresh: re-reading the last 1000 rows
+             on a new connection, as get_recent_readings does, vs a ReadingCursor (keyset, one
+             read-only connection)
+    reader   frame latency and idle CPU of SerialReader vs the old in_waiting/sleep(0.1) polling
+    e2e      Simulator/virtual_arduino.py pty -> Serial.read -> decode -> parse -> store
+
+Each result reports throughput (frames/s), p50/p99 latency per call and CPU time per frame
+(process CPU, so the e2e number also contains the simulator and the writer thread).
+Runs offline on plain Linux, no hardware needed:
+
+    python Benchmarks/bench_pipeline.py                       # all stages, print a table
+    python Benchmarks/bench_pipeline.py --save baselines/v2.json
+    python Benchmarks/bench_pipeline.py --compare baselines/v2.json --stages decode,store
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tty
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Dashboard_2"))
+sys.path.insert(0, str(ROOT / "Simulator"))
+
+from frame_decoder import FrameDecoder  # noqa: E402
+from frame_schema import CONTROLLER_2  # noqa: E402
+from binary_frames import AutoFrameDecoder, BinaryFrameDecoder, BINARY_HANDSHAKE, encode_frame  # noqa: E402
+from save_data import SensorDatabase  # noqa: E402
+from serial_reader import SerialReader  # noqa: E402
+
+BASE_KEYS = ("name", "frames", "throughput_fps", "p50_us", "p99_us", "mean_us", "cpu_us_per_frame")
+STAGES = ("decode", "parse", "store", "ingest", "display", "fetch", "reader", "e2e")
+
+
+# --- Synthetic data ---
+def make_frame(i, rnd):
+    """One Status() frame as Controller_2 prints it (CRLF from Serial.println)."""
+    return (f"<1, {i % 2}, {45 + rnd.random():.1f}, {22 + rnd.random():.1f}, 712.5, 30, "
+            f"{14 + rnd.random():.2f}, 15.00, {rnd.random():.4f}>\r\n").encode()
+
+
+def make_stream(n, seed=0):
+    rnd = random.Random(seed)
+    return [make_frame(i, rnd) for i in range(n)]
+
+
+def make_binary_stream(n, seed=0):
+    """The same readings as make_stream() in BINARY_FRAMES format, handshake first."""
+    rnd = random.Random(seed)
+    frames = [BINARY_HANDSHAKE + b"\r\n\x00"]
+    for i in range(n):
+        values = [1, i % 2, 45 + rnd.random(), 22 + rnd.random(), 712.5, 30, 14 + rnd.random(), 15.0, rnd.random()]
+        frames.append(encode_frame(i, i * 10, values))
+    return frames
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+# --- Measurement helpers ---
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(name, frames, wall, cpu, latencies, **extra):
+    latencies = sorted(latencies)
+    result = {
+        "name": name,
+        "frames": frames,
+        "throughput_fps": frames / wall if wall else 0.0,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "mean_us": statistics.fmean(latencies) * 1e6 if latencies else 0.0,
+        "cpu_us_per_frame": cpu / frames * 1e6 if frames else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def run_timed(name, calls, frames_per_call, fn):
+    """Time fn(arg) for every arg in calls. Latency is per call, throughput per frame."""
+    latencies = []
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for arg in calls:
+        t0 = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - t0)
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+    frames = frames_per_call * len(calls) if isinstance(frames_per_call, int) else frames_per_call()
+    return summarize(name, frames, wall, cpu, latencies)
+
+
+# --- Stages ---
+class LegacyDecoder:
+    """
+    The pre-FrameDecoder loop from read_serial, kept as a reference point. It keeps no junk or
+    truncation statistics, returns bytearrays and glues a truncated frame onto the next one, so
+    it is a floor for FrameDecoder's cost rather than a like-for-like rival.
+    """
+
+    def __init__(self):
+        self.chunk_array = bytearray()
+        self.frames = 0
+
+    def feed(self, chunk):
+        chunk_array = self.chunk_array
+        chunk_array.extend(chunk)
+        frames = []
+        while True:
+            try:
+                start_index = chunk_array.index(b'<')
+                end_index = chunk_array.index(b'>', start_index + 1)
+            except ValueError:
+                break
+            frames.append(chunk_array[start_index + 1:end_index])
+            del chunk_array[:end_index + 1]
+        self.frames += len(frames)
+        return frames
+
+
+def bench_decode(n):
+    data = b"".join(make_stream(n))
+    results = []
+    # 55 B = the old fixed read size, 4096 B = a busy input buffer, backlog = everything at once
+    for label, chunks in (("55B", chunked(data, 55)), ("4096B", chunked(data, 4096)), ("backlog", [data])):
+        for name, decoder in (("FrameDecoder", FrameDecoder()), ("legacy", LegacyDecoder())):
+            results.append(run_timed(f"decode/{name}/{label}", chunks, lambda d=decoder: d.frames, decoder.feed))
+
+    data = b"".join(make_binary_stream(n))
+    for label, chunks in (("41B", chunked(data, 41)), ("4096B", chunked(data, 4096)), ("backlog", [data])):
+        auto, array = AutoFrameDecoder(), BinaryFrameDecoder()
+        results.append(run_timed(f"decode/binary/{label}", chunks, lambda d=auto: d.frames, auto.feed))
+        results.append(run_timed(f"decode/binary-array/{label}", chunks, lambda d=array: d.frames, array.feed_array))
+    return results
+
+
+def parse_frame(frame):
+    raw_data = frame.decode('utf-8', errors='replace').strip()
+    data_list = [item.strip() for item in raw_data.split(',')]
+    data_list.insert(0, time.strftime('%H:%M:%S', time.localtime()))
+    return data_list
+
+
+def bench_parse(n):
+    payloads = FrameDecoder().feed(b"".join(make_stream(n)))
+    return [
+        run_timed("parse/split", payloads, 1, parse_frame),
+        run_timed("parse/schema", payloads, 1, lambda p: CONTROLLER_2.parse(p.decode('utf-8', errors='replace'))),
+    ]
+
+
+def bench_store(n, tmp_dir):
+    rows = [parse_frame(p)[1:] for p in FrameDecoder().feed(b"".join(make_stream(n)))]
+    results = []
+
+    # Unbatched: one connection + commit per frame, capped so the run stays short on SD cards
+    plain_rows = rows[:min(len(rows), 2000)]
+    db = SensorDatabase(database_path=Path(tmp_dir) / "plain.db")
+    results.append(run_timed("store/unbatched", plain_rows, 1, db.insert_reading))
+
+    db = SensorDatabase(database_path=Path(tmp_dir) / "batched.db", batched=True)
+    result = run_timed("store/batched/enqueue", rows, 1, db.insert_reading)
+    t0 = time.perf_counter()
+    db.close()
+    result["drain_s"] = time.perf_counter() - t0
+    # Sustained rate includes the time the writer needed to get everything committed
+    result["sustained_fps"] = len(rows) / (len(rows) / result["throughput_fps"] + result["drain_s"])
+    results.append(result)
+
+    # Journal: every reading is also written before it is queued; the journal's own thread
+    # fsync()s it every 0.2 s and the writer checkpoints it after each commit
+    db = SensorDatabase(database_path=Path(tmp_dir) / "journaled.db", batched=True, journal=True)
+    result = run_timed("store/batched+journal/enqueue", rows, 1, db.insert_reading)
+    db.close()
+    result["journal_syncs"] = db._journal.syncs
+    result["journal_checkpoints"] = db._journal.checkpoints
+    results.append(result)
+    return results
+
+
+def bench_ingest(n, tmp_dir):
+    from rig import Rig
+
+    payloads = [p.decode() for p in FrameDecoder().feed(b"".join(make_stream(n)))]
+    results = []
+    for name, metrics in (("ingest/rig", False), ("ingest/rig+metrics", True)):
+        db_dir = Path(tmp_dir) / name.replace("/", "_")
+        db_dir.mkdir()
+        rig = Rig("bench", None, db_dir, use_process=False, metrics=metrics, journal=True)
+        received_at = time.time()
+        results.append(run_timed(name, payloads, 1, lambda p: rig.handle_frame(p, received_at)))
+        rig.stop()
+    return results
+
+
+def bench_display(n, tmp_dir):
+    import dashboard_2  # no rigs are started on import
+
+    rig = dashboard_2.make_rig("bench", None)
+    dashboard_2.RIGS[rig.rig_id] = rig
+    from frame_schema import DEFAULT_SCHEMA
+
+    payloads = [p.decode() for p in FrameDecoder().feed(b"".join(make_stream(max(n // 10, 50))))]
+    t0 = time.time()
+    for i, payload in enumerate(payloads[:15]):  # one displayed frame per second: a full log and table
+        rig.apply_frame(payload, DEFAULT_SCHEMA.parse(payload), t0 + i, False, False, None)
+    shown_table = dashboard_2.update_data_table(0, rig.rig_id, None)[1]
+    shown_log = dashboard_2.update_serial_log(0, True, rig.rig_id, None)[1]
+
+    calls = list(range(len(payloads)))
+    return [
+        run_timed("display/update_data_table", calls, 1, lambda _: dashboard_2.update_data_table(0, rig.rig_id, None)),
+        run_timed("display/update_serial_log", calls, 1,
+                  lambda _: dashboard_2.update_serial_log(0, True, rig.rig_id, None)),
+        # a poll that finds the view it already shows: no_update, nothing serialised
+        run_timed("display/update_data_table/unchanged", calls, 1,
+                  lambda _: dashboard_2.update_data_table(0, rig.rig_id, shown_table)),
+        run_timed("display/update_serial_log/unchanged", calls, 1,
+                  lambda _: dashboard_2.update_serial_log(0, True, rig.rig_id, shown_log)),
+    ]
+
+
+def bench_fetch(n, tmp_dir):
+    import numpy as np
+
+    db_path = Path(tmp_dir) / "fetch.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=1000)
+    t0 = time.time()
+    for i, payload in enumerate(FrameDecoder().feed(b"".join(make_stream(n)))):
+        db.insert_values(CONTROLLER_2.parse(payload.decode()), received_at=t0 + i / 50)
+    db.flush()
+    new_rows = 10
+    calls = list(range(0, n - new_rows, new_rows))
+
+    def reread(_):
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute("SELECT * FROM sensor_readings ORDER BY id DESC LIMIT 1000").fetchall()
+        finally:
+            conn.close()
+        np.array(rows, dtype=np.float64)
+
+    cursor = db.cursor()
+    results = [
+        run_timed("fetch/reread_last_1000", calls, new_rows, reread),
+        run_timed("fetch/cursor", calls, new_rows, lambda _: cursor.fetch(limit=new_rows)),
+    ]
+    db.close()
+    return results
+
+
+class PollingReader:
+    """The old read_serial loop: poll in_waiting, sleep 100 ms when nothing is there."""
+
+    def __init__(self, ser, on_frame):
+        self.ser = ser
+        self.on_frame = on_frame
+        self.decoder = FrameDecoder()
+        self._running = False
+
+    def run(self):
+        self._running = True
+        while self._running:
+            if self.ser.in_waiting:
+                chunk = self.ser.read(self.ser.in_waiting)
+                received_at = time.time()
+                for frame in self.decoder.feed(chunk):
+                    self.on_frame(frame.decode(), received_at)
+            else:
+                time.sleep(0.1)
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+
+def bench_reader(frames, idle_seconds=2.0):
+    """Latency from os.write() on the pty master to the frame callback, plus CPU while idle."""
+    from serial import Serial
+
+    frames = min(frames, 200)
+    rnd = random.Random(1)
+    results = []
+    for name, reader_cls in (("SerialReader", SerialReader), ("polling", PollingReader)):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        ser = Serial(port=os.ttyname(slave), baudrate=115200, timeout=0.05)
+        latencies = []
+        sent = {}
+        reader = reader_cls(ser, on_frame=lambda raw, t: latencies.append(t - sent[raw.split(",")[0]]))
+        reader.start()
+        time.sleep(0.2)
+
+        cpu0 = time.process_time()
+        time.sleep(idle_seconds)
+        idle_cpu = time.process_time() - cpu0
+
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        for i in range(frames):
+            time.sleep(rnd.uniform(0.005, 0.05))
+            sent[str(i)] = time.time()
+            os.write(master, make_frame(i, rnd).replace(b"<1,", f"<{i},".encode(), 1))
+        time.sleep(0.3)
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        reader.stop()
+        ser.close()
+        os.close(master)
+        os.close(slave)
+        results.append(summarize(f"reader/{name}", len(latencies), wall, cpu, latencies,
+                                 idle_cpu_ms_per_s=idle_cpu / idle_seconds * 1e3))
+    return results
+
+
+def bench_e2e(rate, seconds, tmp_dir):
+    from serial import Serial
+    from virtual_arduino import VirtualArduino, ScriptedPressure
+
+    db = SensorDatabase(database_path=Path(tmp_dir) / "e2e.db", batched=True)
+    decoder = FrameDecoder()
+    latencies = []
+    frames = 0
+    with VirtualArduino(rate_hz=rate, pressure_model=ScriptedPressure([(0, 15.0)])) as sim:
+        ser = Serial(port=sim.port, baudrate=115200, timeout=0.05)
+        ser.write(b"START_PERFUSION,15.0,2.5,50,100,0\n")
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        while time.perf_counter() - wall0 < seconds:
+            chunk = ser.read(ser.in_waiting or 1)
+            t0 = time.perf_counter()
+            for frame in decoder.feed(chunk):
+                data_list = parse_frame(frame)
+                if len(data_list) == 10:
+                    db.insert_reading(data_list[1:])
+                    frames += 1
+            if chunk:
+                latencies.append(time.perf_counter() - t0)
+        db.close()
+        wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+        ser.close()
+        offered = sim.frames_sent
+    return [summarize(f"e2e/pty@{rate:g}Hz", frames, wall, cpu, latencies,
+                      offered_frames=offered, dropped_by_pty=sim.frames_dropped)]
+
+
+# --- Reporting ---
+def environment():
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_table(results, baseline=None):
+    base = {r["name"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'stage':34} {'frames/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'CPU µs/fr':>10}  {'vs baseline':>12}")
+    for r in results:
+        delta = ""
+        if r["name"] in base and base[r["name"]]["throughput_fps"]:
+            delta = f"{r['throughput_fps'] / base[r['name']]['throughput_fps']:.2f}x"
+        print(f"{r['name']:34} {r['throughput_fps']:12.0f} {r['p50_us']:10.1f} {r['p99_us']:10.1f} "
+              f"{r['cpu_us_per_frame']:10.2f}  {delta:>12}")
+        extra = {k: v for k, v in r.items() if k not in BASE_KEYS}
+        if extra:
+            print("    " + "  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in extra.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perfusion pipeline benchmarks")
+    parser.add_argument("--frames", type=int, default=20000, help="Synthetic frames per stage")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma separated subset of {STAGES}")
+    parser.add_argument("--e2e-rate", type=float, default=2000.0, help="Simulator frame rate for e2e (Hz)")
+    parser.add_argument("--e2e-seconds", type=float, default=5.0, help="Duration of the e2e run")
+    parser.add_argument("--save", default=None, help="Write results as JSON baseline to this path")
+    parser.add_argument("--compare", default=None, help="JSON baseline to compare throughput against")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stage(s): {', '.join(sorted(unknown))}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for stage in stages:
+            print(f"… {stage}", file=sys.stderr)
+            if stage == "decode":
+                results += bench_decode(args.frames)
+            elif stage == "parse":
+                results += bench_parse(args.frames)
+            elif stage == "store":
+                results += bench_store(args.frames, tmp_dir)
+            elif stage == "ingest":
+                results += bench_ingest(args.frames, tmp_dir)
+            elif stage == "display":
+                results += bench_display(args.frames, tmp_dir)
+            elif stage == "fetch":
+                results += bench_fetch(args.frames, tmp_dir)
+            elif stage == "reader":
+                results += bench_reader(args.frames)
+            elif stage == "e2e":
+                results += bench_e2e(args.e2e_rate, args.e2e_seconds, tmp_dir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.save:
+        Path(args.save).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "args": vars(args), "results": results}, f, indent=2)
+        print(f"Saved baseline to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
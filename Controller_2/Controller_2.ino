@@ -3,6 +3,7 @@
 #include "AS5048A.h"
 #include "PERFUSION.h"
 #include "Pressure_Ceraphant.h"
+#include "Framing.h"
 
 #include <Wire.h>
 #include <Adafruit_Sensor.h>
@@ -21,6 +22,10 @@ static double rpm = 0;
 float abs_time;
 
 bool valve_status = false;
+
+// Latest BME680 values (for binary frames) and frame counter
+float bme_humidity = 0, bme_temperature = 0, bme_pressure = 0, bme_iaq = 0;
+uint16_t frame_seq = 0;
 // define our CS PIN 
 AS5048A ABS(CS_PIN);
 
@@ -63,7 +68,12 @@ void setup() {
 	ABS.update_info();
 
 
-	Serial.println("<OK>");
+	if (BINARY_FRAMES) {
+		Serial.println("<OK,BIN>");
+		Serial.write((uint8_t)0);  // the host's binary decoder starts after this delimiter
+	} else {
+		Serial.println("<OK,C2>");  // frame layout version, see Dashboard*/frame_schema.py
+	}
 
 }
 
@@ -82,6 +92,14 @@ void loop() {
 		inputString = Serial.readStringUntil('\n'); // Read until newline
 		inputString.trim();
 		//Serial.println(inputString);
+
+		// Sequenced packet from the dashboard: 6 commands + ",#<seq>", acknowledged with <ACK,seq>
+		long command_seq = -1;
+		int seq_index = inputString.lastIndexOf(",#");
+		if (seq_index != -1) {
+			command_seq = inputString.substring(seq_index + 2).toInt();
+			inputString = inputString.substring(0, seq_index);
+		}
 		
 		if (inputString != Commands[0]+","+Commands[1]+","+Commands[2]+","+Commands[3]+","+Commands[4]+","+Commands[5]) {
 			CommandParser(inputString, Commands);
@@ -89,6 +107,10 @@ void loop() {
 		}
 		else{
 		}
+
+		if (command_seq >= 0) {
+			SendAck(command_seq);  // also for a repeat: the host retries until it hears one
+		}
 		
 	}
 
@@ -238,7 +260,21 @@ void CommandParser(String inputString, String *Commands) {
 }
 
 
+void SendAck(long seq){
+	Serial.println("<ACK," + String(seq) + ">");
+	if (BINARY_FRAMES) {
+		Serial.write((uint8_t)0);
+	}
+}
+
+
 void Status(){
+	if (BINARY_FRAMES) {
+		float values[7] = {bme_humidity, bme_temperature, bme_pressure, bme_iaq,
+		                   perfusion.get_current_pressure(), perfusion.get_target_pressure(), (float)rpm};
+		send_binary_frame(frame_seq++, perfusion.get_state(), valve_status, values);
+		return;
+	}
 	// perfusion.get_motor_speed() will be replaced by flow rate.
 	Serial.println("<"+ String(perfusion.get_state()) + ", " + String(valve_status) +", "+ result + ", " + perfusion.get_current_pressure()+ ", "+ perfusion.get_target_pressure() + ", "+ String(rpm,4) +">");
 }
@@ -261,6 +297,7 @@ String ReadTemperatureHumidity() {
 
   if (!bme.performReading()) {
     // failed read
+    bme_humidity = bme_temperature = bme_pressure = bme_iaq = 0;
     return String("0, 0, 0, 0, 0");
   }
 
@@ -289,6 +326,14 @@ String ReadTemperatureHumidity() {
   float raw_iaq   = gas_score + hum_score;   // 0–100%
   float IAQ_index = raw_iaq * 5.0;           // scale to 0–500
 
+  bme_humidity = humidity;
+  bme_temperature = temperature;
+  bme_pressure = pressure;
+  bme_iaq = IAQ_index;
+  if (BINARY_FRAMES) {
+    return String();  // no text to build
+  }
+
   // Build CSV string: humidity, temperature, pressure, gas (kΩ), IAQ
   String Readings = 
     String(humidity, 1) + ", " +
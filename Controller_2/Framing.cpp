@@ -0,0 +1,59 @@
+#include "Framing.h"
+
+
+uint16_t crc16_ccitt(const uint8_t* data, size_t length) {
+  uint16_t crc = 0xFFFF;
+  while (length--) {
+    crc ^= (uint16_t)(*data++) << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+
+size_t cobs_encode(const uint8_t* data, size_t length, uint8_t* out) {
+  size_t code_index = 0;
+  size_t write_index = 1;
+  uint8_t code = 1;
+
+  for (size_t i = 0; i < length; i++) {
+    if (data[i] != 0) {
+      out[write_index++] = data[i];
+      code++;
+    }
+    if (data[i] == 0 || code == 0xFF) {
+      out[code_index] = code;
+      code_index = write_index++;
+      code = 1;
+    }
+  }
+  out[code_index] = code;
+  return write_index;
+}
+
+
+void send_binary_frame(uint16_t seq, uint8_t state, uint8_t valve, const float values[7]) {
+  uint8_t payload[FRAME_PAYLOAD_SIZE];
+  uint8_t encoded[FRAME_PAYLOAD_SIZE + 2];
+  uint32_t now = millis();
+  size_t n = 0;
+
+  payload[n++] = FRAME_VERSION;
+  memcpy(payload + n, &seq, sizeof(seq));    // AVR and ARM are little-endian
+  n += sizeof(seq);
+  memcpy(payload + n, &now, sizeof(now));
+  n += sizeof(now);
+  payload[n++] = state;
+  payload[n++] = valve;
+  memcpy(payload + n, values, 7 * sizeof(float));
+  n += 7 * sizeof(float);
+
+  uint16_t crc = crc16_ccitt(payload, n);
+  payload[n++] = crc >> 8;
+  payload[n++] = crc & 0xFF;
+
+  Serial.write(encoded, cobs_encode(payload, n, encoded));
+  Serial.write((uint8_t)0);
+}
@@ -0,0 +1,16 @@
+#ifndef FRAMING_H
+#define FRAMING_H
+
+#include <Arduino.h>
+
+// Binary Status() frames (BINARY_FRAMES in config.h), decoded by Dashboard*/binary_frames.py:
+// COBS(payload) + 0x00, payload = version, seq, millis, state, valve, 7 floats (little-endian),
+// then CRC-16/CCITT-FALSE of the bytes before it (big-endian).
+constexpr uint8_t FRAME_VERSION = 1;
+constexpr size_t FRAME_PAYLOAD_SIZE = 1 + 2 + 4 + 1 + 1 + 7 * 4 + 2;
+
+uint16_t crc16_ccitt(const uint8_t* data, size_t length);
+size_t cobs_encode(const uint8_t* data, size_t length, uint8_t* out);  // out: length + length / 254 + 1 bytes
+void send_binary_frame(uint16_t seq, uint8_t state, uint8_t valve, const float values[7]);
+
+#endif
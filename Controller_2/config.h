@@ -29,3 +29,8 @@ constexpr uint8_t PRESSURE_PIN = A0;
 // For Pressure Calculation
 int LOW_PRESSURE = 5; // low pressure in cmH2O
 int HIGH_PRESSURE = 10; // high pressure in cmH2O
+
+// ——— Telemetry Format ———
+// false: text Status() frames <state, valve, ...> (what older dashboards expect)
+// true:  compact binary frames with sequence number and CRC16 (see Framing.h), announced by <OK,BIN>
+constexpr bool BINARY_FRAMES = false;
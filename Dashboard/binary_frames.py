@@ -0,0 +1,257 @@
+"""
+Binary Status() frames of Controller_2 (BINARY_FRAMES in config.h) and a decoder that accepts
+both those and the `<...>` text frames of older firmware.
+
+Frame on the wire: COBS(payload) followed by a 0x00 delimiter. The payload is fixed-layout,
+little-endian:
+
+    uint8  version          FRAME_VERSION
+    uint16 seq              +1 per frame, wraps; gaps = frames lost on the link
+    uint32 millis           controller uptime
+    uint8  perfusion_state
+    uint8  valve_state
+    float  humidity, temperature, envir_pressure, AQI, current_pressure, target_pressure, motor_speed
+    uint16 crc              CRC-16/CCITT-FALSE of everything before it, big-endian
+
+Firmware in binary mode announces itself with the text handshake `<OK,BIN>` followed by 0x00.
+Other text messages it sends in binary mode (<ACK,seq>) are terminated by 0x00 as well.
+"""
+import binascii
+import struct
+
+import numpy as np
+
+from frame_decoder import FrameDecoder
+
+
+FRAME_VERSION = 1
+BINARY_HANDSHAKE = b"<OK,BIN>"
+BODY_STRUCT = struct.Struct("<BHIBB7f")
+PAYLOAD_SIZE = BODY_STRUCT.size + 2  # + CRC
+# Same layout for bulk decoding with NumPy (np.frombuffer on concatenated bodies)
+BODY_DTYPE = np.dtype([
+    ("version", "u1"), ("seq", "<u2"), ("millis", "<u4"),
+    ("perfusion_state", "u1"), ("valve_state", "u1"),
+    ("humidity", "<f4"), ("temperature", "<f4"), ("envir_pressure", "<f4"), ("AQI", "<f4"),
+    ("current_pressure", "<f4"), ("target_pressure", "<f4"), ("motor_speed", "<f4"),
+])
+# Text rendering of the 9 sensor fields, as Status() prints them in text mode
+TEXT_FORMAT = "%d, %d, %.1f, %.1f, %.1f, %.0f, %.2f, %.2f, %.4f"
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), computed in C by binascii."""
+    return binascii.crc_hqx(data, crc)
+
+
+def cobs_encode(data):
+    """Consistent Overhead Byte Stuffing: the output contains no 0x00 bytes."""
+    out = bytearray(b"\x00")
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+    out[code_index] = code
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Inverse of cobs_encode(); raises ValueError on malformed input."""
+    out = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        code = data[i]
+        end = i + code
+        if code == 0 or end > n:
+            raise ValueError("malformed COBS block")
+        out += data[i + 1:end]
+        i = end
+        if code != 0xFF and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_frame(seq, millis, values, version=FRAME_VERSION):
+    """One wire frame (COBS + delimiter) for `values` in sensor_readings order (9 numbers)."""
+    state, valve, *floats = values
+    body = BODY_STRUCT.pack(version, seq & 0xFFFF, millis & 0xFFFFFFFF, int(state), int(valve), *floats)
+    return cobs_encode(body + crc16(body).to_bytes(2, "big")) + b"\x00"
+
+
+class BinaryFrameDecoder:
+    """
+    Incremental decoder for COBS/CRC16 frames.
+
+    feed() splits on the 0x00 delimiter, drops frames whose length or CRC is wrong (counted in
+    the statistics instead of failing later in the database) and unpacks all good frames of a
+    chunk in one struct.iter_unpack() call. Returns a list of BODY_STRUCT tuples.
+    """
+
+    def __init__(self, max_frame_size=64):
+        self.max_frame_size = max_frame_size
+        self._partial = b""
+        self._last_seq = None
+        self.messages = []  # payloads of <...> text messages between the frames, for the caller to take
+
+        # Statistics
+        self.frames = 0
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.lost_frames = 0  # from gaps in seq
+        self.discarded_bytes = 0
+
+    def _bodies(self, data):
+        if self._partial:
+            data = self._partial + data
+        parts = data.split(b"\x00")
+        tail = parts.pop()
+        if len(tail) > self.max_frame_size:
+            self.discarded_bytes += len(tail)
+            self.length_errors += 1
+            tail = b""
+        self._partial = tail
+
+        bodies = []
+        for part in parts:
+            if not part:
+                continue
+            try:
+                payload = cobs_decode(part)
+            except ValueError:
+                payload = b""
+            if len(payload) != PAYLOAD_SIZE:
+                text = part.strip()
+                if text[:1] == b"<" and text[-1:] == b">":
+                    self.messages.append(text[1:-1])
+                    continue
+                # a short run like the CRLF after the handshake is just junk
+                self.discarded_bytes += len(part)
+                if len(part) > 4:
+                    self.length_errors += 1
+                continue
+            if crc16(payload) != 0:  # the CRC is appended big-endian, so a good frame leaves 0
+                self.crc_errors += 1
+                self.discarded_bytes += len(part)
+                continue
+            bodies.append(payload[:-2])
+        return bodies
+
+    def _count(self, seqs):
+        if not len(seqs):
+            return
+        self.frames += len(seqs)
+        seqs = [int(s) for s in seqs]
+        previous = self._last_seq
+        for seq in seqs:
+            if previous is not None:
+                gap = (seq - previous - 1) & 0xFFFF
+                if gap < 0x8000:  # otherwise a repeat or a controller reset, not a loss
+                    self.lost_frames += gap
+            previous = seq
+        self._last_seq = previous
+
+    def feed(self, data):
+        """Append raw serial bytes and return the unpacked fields of every good frame."""
+        bodies = self._bodies(bytes(data))
+        if not bodies:
+            return []
+        frames = list(BODY_STRUCT.iter_unpack(b"".join(bodies)))
+        self._count([frame[1] for frame in frames])
+        return frames
+
+    def feed_array(self, data):
+        """Like feed(), but returns a NumPy structured array (BODY_DTYPE) for bulk processing."""
+        bodies = self._bodies(bytes(data))
+        frames = np.frombuffer(b"".join(bodies), dtype=BODY_DTYPE)
+        self._count(frames["seq"])
+        return frames
+
+    def pending(self):
+        return len(self._partial)
+
+    def reset(self):
+        self._partial = b""
+        self._last_seq = None
+        self.messages = []
+
+
+class AutoFrameDecoder:
+    """
+    Decoder for a port whose firmware may use either frame format.
+
+    Starts with the `<...>` text decoder. When the `<OK,BIN>` handshake goes by, the bytes after
+    it are handed to the binary decoder for good. A port opened after the controller booted
+    misses the handshake (pyserial drops pending input on open), so a chunk that contains a
+    delimiter and a CRC-valid binary frame switches as well. Binary frames are returned as the same text
+    payload bytes the text format would have carried, so everything downstream of the reader
+    (SerialReader, record/display code) is format-agnostic.
+    """
+
+    def __init__(self, max_frame_size=256):
+        self.text = FrameDecoder(max_frame_size=max_frame_size)
+        self.binary = BinaryFrameDecoder()
+        self.binary_mode = False
+        self._held = b""  # possible start of the handshake, split across two reads
+        self._tail = b""  # last bytes seen in text mode, to find a binary frame without handshake
+
+    @property
+    def frames(self):
+        return self.text.frames + self.binary.frames
+
+    def feed(self, data):
+        if self.binary_mode:
+            frames = [(TEXT_FORMAT % frame[3:]).encode() for frame in self.binary.feed(data)]
+            if self.binary.messages:
+                frames += self.binary.messages
+                self.binary.messages = []
+            return frames
+
+        data = self._held + bytes(data)
+        self._held = b""
+        index = data.find(BINARY_HANDSHAKE)
+        if index < 0:
+            recent = self._tail + data
+            self._tail = recent[-3 * PAYLOAD_SIZE:]
+            if b"\x00" in data:  # text frames never contain 0x00
+                probe = BinaryFrameDecoder(self.binary.max_frame_size)
+                frames = probe.feed(recent)
+                if frames:
+                    self.text.reset()
+                    self.binary = probe
+                    self.binary.messages = []
+                    self.binary_mode = True
+                    return [(TEXT_FORMAT % frame[3:]).encode() for frame in frames]
+        if index < 0:
+            # hold back a tail that could be the start of the handshake
+            for k in range(min(len(BINARY_HANDSHAKE) - 1, len(data)), 0, -1):
+                if data.endswith(BINARY_HANDSHAKE[:k]):
+                    self._held = data[-k:]
+                    data = data[:-k]
+                    break
+            return self.text.feed(data)
+
+        frames = self.text.feed(data[:index])
+        frames.append(BINARY_HANDSHAKE[1:-1])
+        self.text.reset()
+        self.binary_mode = True
+        frames += self.feed(data[index + len(BINARY_HANDSHAKE):])
+        return frames
+
+    def pending(self):
+        return len(self._held) + (self.binary.pending() if self.binary_mode else self.text.pending())
+
+    def reset(self):
+        """After a reconnect the firmware handshakes again, so start over in text mode."""
+        self.text.reset()
+        self.binary.reset()
+        self.binary_mode = False
+        self._held = b""
+        self._tail = b""
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+
+
+class CommandChannel:
+    """
+    Acknowledged command channel to one controller.
+
+    Every cmd_history packet goes out with a sequence number as a 7th field,
+
+        START_PERFUSION,15.0,2.5,50,100,0,#17
+
+    and Controller_2 answers <ACK,17> once it has applied it (firmware without ACK support
+    ignores fields after the 6th, so the packet still works there). The channel
+      - coalesces: submits within `coalesce_s` of each other, or made while a packet is in
+        flight, collapse into one packet carrying the latest state (packets are full state,
+        so nothing is lost by skipping the ones in between),
+      - retries the in-flight packet after `ack_timeout` seconds, up to `max_retries` times,
+      - records the time from the first write to the ACK of every packet (rtt).
+    If the very first packet is never acknowledged the controller is taken to be older
+    firmware and packets are written once, without waiting, as before.
+
+    `write(bytes)` is called on the channel's own thread. ACK frames ("ACK,17", as the frame
+    decoder returns them) are passed in with handle_frame(). `on_update(stats)` is called after
+    every ACK or failed packet.
+    """
+
+    def __init__(self, write, ack_timeout=1.5, max_retries=3, coalesce_s=0.05, on_update=None,
+                 name="", rtt_history=100):
+        self.write = write
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.coalesce_s = coalesce_s
+        self.on_update = on_update
+        self.name = name
+        self.acks_supported = None  # unknown until the first ACK or the first packet that gets none
+
+        self._cond = threading.Condition()
+        self._desired = None  # (packet body, submitted at) waiting to be sent
+        self._in_flight = None  # dict(seq, body, first_sent, sent_at, attempts)
+        self._seq = 0
+        self._closed = False
+        self.rtts = deque(maxlen=rtt_history)  # seconds, newest last
+
+        # Statistics
+        self.submitted = 0
+        self.sent = 0
+        self.acked = 0
+        self.retries = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"commands-{name}", daemon=True)
+        self._thread.start()
+
+    # --- producer side ---
+    def submit(self, cmd_history):
+        """Queue the state in `cmd_history` (the 6 command fields) for the controller."""
+        body = ",".join(filter(None, cmd_history))
+        with self._cond:
+            self.submitted += 1
+            in_flight = self._in_flight
+            if self._desired is not None:
+                self._desired = (body, self._desired[1])  # keep the first time of the burst
+                self.coalesced += 1
+            elif in_flight is not None and in_flight["body"] == body:
+                self.coalesced += 1  # already on its way
+            else:
+                self._desired = (body, time.monotonic())
+            self._cond.notify()
+
+    def handle_frame(self, raw_data):
+        """Consume an ACK frame; returns False for every other frame."""
+        if not raw_data.startswith("ACK,"):
+            return False
+        try:
+            seq = int(raw_data[4:])
+        except ValueError:
+            return True
+        stats = None
+        with self._cond:
+            self.acks_supported = True
+            in_flight = self._in_flight
+            if in_flight is not None and in_flight["seq"] == seq:
+                self.rtts.append(time.monotonic() - in_flight["first_sent"])
+                self.acked += 1
+                self._in_flight = None
+                stats = self._stats()
+                self._cond.notify()
+        if stats is not None and self.on_update is not None:
+            self.on_update(stats)
+        return True
+
+    def close(self, timeout=2.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    # --- sender thread ---
+    def _send(self, in_flight):
+        packet = f"{in_flight['body']},#{in_flight['seq']}\n"
+        in_flight["sent_at"] = time.monotonic()
+        in_flight["attempts"] += 1
+        try:
+            self.write(packet.encode())
+            print(f"[{self.name}] Sent: {packet.strip()}")
+        except Exception as e:
+            print(f"[{self.name}] Error sending command: {e}")
+
+    def _run(self):
+        while True:
+            failed_stats = None
+            with self._cond:
+                if self._closed:
+                    return
+                now = time.monotonic()
+                wait = None
+                in_flight = self._in_flight
+
+                if in_flight is not None and now - in_flight["sent_at"] >= self.ack_timeout:
+                    if self._desired is not None:
+                        self.superseded += 1  # the newer state replaces it
+                        self._in_flight = None
+                    elif in_flight["attempts"] > self.max_retries:
+                        self.failed += 1
+                        if self.acks_supported is None:
+                            self.acks_supported = False
+                            print(f"[{self.name}] No ACK from controller, sending without acknowledgement")
+                        self._in_flight = None
+                        failed_stats = self._stats()
+                    else:
+                        self.retries += 1
+                        self._send(in_flight)
+
+                if self._in_flight is None and self._desired is not None:
+                    body, submitted_at = self._desired
+                    due = submitted_at + self.coalesce_s
+                    if now >= due:
+                        self._desired = None
+                        self._seq = self._seq % 65535 + 1
+                        in_flight = {"seq": self._seq, "body": body, "first_sent": now, "sent_at": now, "attempts": 0}
+                        self.sent += 1
+                        self._send(in_flight)
+                        # unacknowledged firmware: fire and forget, like the plain packets before
+                        self._in_flight = None if self.acks_supported is False else in_flight
+                    else:
+                        wait = due - now
+
+                if self._in_flight is not None:
+                    until_retry = self._in_flight["sent_at"] + self.ack_timeout - time.monotonic()
+                    wait = until_retry if wait is None else min(wait, until_retry)
+
+                if failed_stats is None:
+                    self._cond.wait(None if wait is None else max(wait, 0.001))
+            if failed_stats is not None and self.on_update is not None:
+                self.on_update(failed_stats)
+
+    # --- views ---
+    def _stats(self):
+        ordered = sorted(self.rtts)
+        return {
+            "submitted": self.submitted, "sent": self.sent, "acked": self.acked, "retries": self.retries,
+            "failed": self.failed, "coalesced": self.coalesced, "superseded": self.superseded,
+            "acks_supported": self.acks_supported,
+            "rtt_last_ms": self.rtts[-1] * 1000 if ordered else None,
+            "rtt_p50_ms": ordered[len(ordered) // 2] * 1000 if ordered else None,
+            "rtt_max_ms": ordered[-1] * 1000 if ordered else None,
+        }
+
+    def stats(self):
+        with self._cond:
+            return self._stats()
+
+
+def command_stats_text(stats):
+    """One line for the dashboards, e.g. 'Commands acked: 4/4 · RTT 118 ms (p50 120 ms)'."""
+    if not stats or not stats["sent"]:
+        return "Commands: none sent"
+    if stats["acks_supported"] is False:
+        return f"Commands sent: {stats['sent']} (controller does not acknowledge)"
+    text = f"Commands acked: {stats['acked']}/{stats['sent']}"
+    if stats["rtt_last_ms"] is not None:
+        text += f" · RTT {stats['rtt_last_ms']:.0f} ms (p50 {stats['rtt_p50_ms']:.0f} ms)"
+    if stats["retries"]:
+        text += f" · retries: {stats['retries']}"
+    if stats["failed"]:
+        text += f" · failed: {stats['failed']}"
+    return text
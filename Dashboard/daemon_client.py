@@ -0,0 +1,143 @@
+"""
+UI side of the acquisition daemon (Dashboard_2/acquisition_daemon.py), which owns the serial
+ports, session databases and command channels so that UI processes can come and go without
+pausing the capture.
+
+Wire format on the daemon's Unix socket: one JSON value per line in each direction.
+
+    UI → daemon   {"op": "rigs"}                          → {"rigs": {"rig1": "/dev/ttyACM0", ...}}
+                  {"op": "attach", "rig": "rig1", "after_seq": n}
+                  {"op": "command", "commands": [...6 cmd_history fields...]}   (after attach)
+    daemon → UI   after attach, the rig's events as FrameIngest/acquisition_worker produce them:
+                  ["connected", port], ["schema", name], ["commands", stats], ["metrics", snapshot],
+                  then the recent frames numbered after `after_seq` and every new one:
+                  ["frame", raw_data, values, received_at, stored, error, db_path, seq], ["bad_frame", ...]
+                  (seq numbers the rig's frames in increasing order; it is taken off before on_event)
+"""
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+
+
+DEFAULT_SOCKET = Path(os.path.expanduser("~/Downloads/Perfusion_System/acquisition.sock"))
+
+
+def request(socket_path, message, timeout=5.0):
+    """One request/reply exchange with the daemon; raises OSError if it is not running."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+
+def daemon_rigs(socket_path):
+    """{rig id: serial port} of the rigs the daemon runs."""
+    return request(socket_path, {"op": "rigs"})["rigs"]
+
+
+class RigSubscription:
+    """
+    Connection to the daemon, attached to one rig: its events go to `on_event(event)` (on the
+    subscription's thread), commands go back with submit(). A lost connection is retried every
+    `retry_interval` seconds and resumes after the last frame seen, so nothing is delivered twice.
+
+    submit() and stats() match CommandChannel, so a UI can use the subscription in its place.
+    """
+
+    def __init__(self, socket_path, rig_id, on_event, retry_interval=1.0):
+        self.socket_path = str(socket_path)
+        self.rig_id = rig_id
+        self.on_event = on_event
+        self.retry_interval = retry_interval
+        self.attached = False
+        self.last_seq = None  # of the last frame, sent as `after_seq` when reattaching
+        self.command_stats = {}
+        self.metrics = []  # last MetricsRegistry.snapshot() of the rig's worker
+
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"daemon-{self.rig_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _send(self, message):
+        sock = self._sock
+        if sock is None:
+            return False
+        with self._send_lock:
+            try:
+                sock.sendall(json.dumps(message).encode() + b"\n")
+            except OSError:
+                return False
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                self._stop.wait(self.retry_interval)
+                continue
+            self._sock = sock
+            try:
+                self._send({"op": "attach", "rig": self.rig_id, "after_seq": self.last_seq})
+                with sock.makefile("rb") as lines:
+                    for line in lines:
+                        self._handle(json.loads(line))
+            except (OSError, ValueError) as e:
+                if not self._stop.is_set():
+                    print(f"[{self.rig_id}] Connection to the acquisition daemon lost: {e}")
+            finally:
+                self._sock = None
+                sock.close()
+                if self.attached:
+                    self.attached = False
+                    self.on_event(("disconnected", None))
+            self._stop.wait(self.retry_interval)
+
+    def _handle(self, message):
+        if isinstance(message, dict):  # {"error": ...}
+            raise ValueError(message.get("error", message))
+        event = tuple(message)
+        kind = event[0]
+        self.attached = True
+        if kind == "frame":
+            self.last_seq = event[-1]
+            event = event[:-1]  # as FrameIngest made it
+        elif kind == "commands":
+            self.command_stats = event[1]
+        elif kind == "metrics":
+            self.metrics = event[1]
+        self.on_event(event)
+
+    # --- CommandChannel interface ---
+    def submit(self, cmd_history):
+        """Hand the commands to the daemon's CommandChannel for this rig."""
+        if not self._send({"op": "command", "commands": list(cmd_history)}):
+            print(f"[{self.rig_id}] Acquisition daemon not reachable. Cannot send command.")
+            return False
+        return True
+
+    def stats(self):
+        return self.command_stats
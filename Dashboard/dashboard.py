@@ -4,10 +4,23 @@ from streamlit_autorefresh import st_autorefresh
 from serial import Serial # PySerial library for serial communication
 import serial.tools.list_ports
 import threading, os
+from functools import wraps
 from pathlib import Path
 import time, datetime
+import numpy as np
 import pandas as pd
-from save_data import SensorDatabase
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from save_data import SensorDatabase, recover_journals
+from serial_reader import SerialReader
+from command_channel import CommandChannel, command_stats_text
+from frame_schema import DEFAULT_SCHEMA, FrameError, is_handshake, schema_for_handshake
+from telemetry_buffer import TelemetryBuffer, VALUE_COLUMNS
+from downsample import PLOT_COLUMNS, downsample, read_overview, series_span
+from session_catalog import CATALOG_NAME, SessionCatalog
+from analytics import ControlAnalytics, summary_text
+from pipeline_metrics import MetricsRegistry, serve_metrics
+from daemon_client import RigSubscription, daemon_rigs
 
 
 for name, l in logging.root.manager.loggerDict.items():
@@ -25,11 +38,10 @@ st.set_page_config(
 #st_autorefresh(interval=1000, limit=None, key="serial_refresh")
 
 # --- Helper to make a unique filename ---
-@st.cache_resource
-def make_db_filename():
+def make_db_filename(rig_id: str):
     now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     #return f"databases/perfusion_{now}.db"
-    return DB_DIR/f"perfusion_{now}.db"
+    return DB_DIR/f"perfusion_{rig_id}_{now}.db"
 
 
 @st.cache_resource
@@ -40,34 +52,37 @@ def ensure_db_file(db_path: Path):
 
 # --- Initialization in Streamlit main thread ---
 @st.cache_resource
-def init_db():
+def init_db(port: str):
     db = [None, None, False]  # [db_instance, db_path, perfusion_on]
     return db
 
 
 # ————— CONFIG ————— and ————— SETUP SERIAL —————
-@st.cache_resource(ttl=3600)
-def connect():
-    
-    BAUD_RATE = 115200
+@st.cache_resource
+def find_ports():
+    """Serial ports of the rigs, at most RIG_MAX. PERFUSION_SERIAL_PORTS (comma separated) or
+    PERFUSION_SERIAL_PORT (e.g. Simulator/virtual_arduino.py ptys) skip the port scan."""
+    configured = os.environ.get("PERFUSION_SERIAL_PORTS") or os.environ.get("PERFUSION_SERIAL_PORT")
+    if configured:
+        return [port.strip() for port in configured.split(",") if port.strip()][:RIG_MAX]
 
     ports = serial.tools.list_ports.comports()
     choices = []
     for index, value in enumerate(sorted(ports)):
         if (value.hwid != 'n/a'):
-            choices.append(index)
+            choices.append(value.device)
             print(index, '\t', value.name, '\t', value.manufacturer)
+    if not choices and ports:
+        choices = [ports[0].device]  # as before: default to the first port
+    return choices[:RIG_MAX]
 
-    #choice = -1
-    #while choice not in choices:
-        #answer = input("➜ Select your port: ")
-        #if answer.isnumeric() and int(answer) <= int(max(choices)):
-        #    choice = int(answer)
-        
-    choice = 0  # Default to the first port for simplicity in this example
-    print('selecting: ', ports[choice].device)
-    port = ports[choice].device
 
+@st.cache_resource  # opened once per process: the reader and the command channel keep this Serial
+def connect(port: str):
+    
+    BAUD_RATE = 115200
+
+    print('selecting: ', port)
     ser = Serial(port=port, baudrate=BAUD_RATE, timeout=1)
     
     time.sleep(1)  # wait for the serial connection to initialize
@@ -76,17 +91,88 @@ def connect():
 
 # ————— DATA BUFFER —————
 @st.cache_resource
-def get_buffer():
+def get_buffer(port: str):
     """Return a mutable list to hold recent readings."""
     return []
 
 
+@st.cache_resource
+def get_telemetry(port: str):
+    """Typed ring buffer with every reading of one rig, shared by all sessions."""
+    return TelemetryBuffer()
+
+
+@st.cache_resource
+def get_analytics(port: str):
+    """[ControlAnalytics of the current session of one rig, lock], replaced when a session opens."""
+    return [ControlAnalytics(), threading.Lock()]
+
+
+@st.cache_resource
+def get_channel(port: str):
+    """Acknowledged, retried command channel of one rig, shared by all sessions. With the
+    acquisition daemon, the rig's subscription stands in for it (same submit() and stats())."""
+    if DAEMON_SOCKET:
+        return attach_rig(port)
+    return CommandChannel(connect(port).write, name=port)
+
+
+@st.cache_resource
+def get_catalog():
+    """Catalog of the session databases in DB_DIR (see session_catalog.py)."""
+    return SessionCatalog(DB_DIR / CATALOG_NAME)
+
+
+@st.cache_resource
+def get_metrics(rig_id: str):
+    """Pipeline metrics of one rig's reader, shared by all sessions (None without METRICS_PORT)."""
+    return MetricsRegistry(rig=rig_id) if METRICS_PORT else None
+
+
+@st.cache_resource
+def get_ui_metrics():
+    """Run times of the fragments (None without METRICS_PORT)."""
+    return MetricsRegistry() if METRICS_PORT else None
+
+
+@st.cache_resource
+def start_metrics_server(rig_ids: tuple):
+    """Streamlit has no route of its own to add, so /metrics gets a small HTTP server on METRICS_PORT."""
+    registries = [get_ui_metrics()] + [get_metrics(rig_id) for rig_id in rig_ids]
+    try:
+        return serve_metrics(lambda: [registry.snapshot() for registry in registries], METRICS_PORT)
+    except OSError as e:  # e.g. a second dashboard process on the same machine
+        print(f"Metrics not served on port {METRICS_PORT}: {e}")
+
+
+def timed_fragment(function):
+    """Observe every run of a fragment in the UI metrics."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = get_ui_metrics()
+        if metrics is None:
+            return function(*args, **kwargs)
+        with metrics.histogram("perfusion_fragment_seconds", "Seconds per run of a Streamlit fragment",
+                               fragment=function.__name__).time():
+            return function(*args, **kwargs)
+    return wrapper
+
+
+@st.cache_resource
+def recover_sessions():
+    """Once per process, before the readers start: commit what the ingest journals of sessions
+    cut short by a crash still hold, and catalog those sessions as ended."""
+    recovered = recover_journals(DB_DIR)
+    for db_path in recovered:
+        get_catalog().session_closed(db_path)
+    return recovered
+
+
 # ---- Send function ----
 def send_all_commands():
-    # join every command with ',' and terminate with newline
-    packet = ",".join(filter(None, st.session_state.cmd_history)) + "\n"
-    ser.write(packet.encode())
-    st.write(f"Sent: {packet.strip()}")
+    # the channel joins the commands, numbers the packet and resends it until the Arduino acknowledges
+    get_channel(port).submit(st.session_state.cmd_history)
+    st.write(f"Sent: {','.join(filter(None, st.session_state.cmd_history))}")
 
 
 def serial_write_button(name: str, button_key:str, command:str, position:int, button_icon)-> None:
@@ -170,86 +256,137 @@ def button_form():
 
 
 
-# ————— BACKGROUND READER —————
+# ————— ACQUISITION DAEMON —————
 @st.cache_resource
-def read_serial(buffer, _db):
+def get_daemon_rigs():
+    """{rig id: port} of the rigs the acquisition daemon runs."""
+    return daemon_rigs(DAEMON_SOCKET)
+
+
+@st.cache_resource
+def attach_rig(port: str):
+    """Instead of a reader: follow the frames the daemon records for one rig into the buffers
+    read_serial would fill. The daemon keeps recording while no dashboard is attached."""
+    rig_id = {p: r for r, p in get_daemon_rigs().items()}[port]
+    buffer, db, telemetry, analytics = get_buffer(port), init_db(port), get_telemetry(port), get_analytics(port)
+
+    def on_event(event):
+        if event[0] != "frame":
+            return
+        _, raw_data, values, received_at, stored, error, db_path = event
+        if db_path is not None and db_path != str(db[1]):  # the daemon opened a session
+            db[1] = Path(db_path)
+            analytics[0] = ControlAnalytics().start_at(telemetry)
+        telemetry.append(received_at, values)
+        buffer.append((received_at, raw_data))
+        if len(buffer) > 15:  # keep only the last 15
+            buffer.pop(0)
+
+    return RigSubscription(DAEMON_SOCKET, rig_id, on_event).start()
+
+
+# ————— BACKGROUND READER —————
+def read_serial(rig_id, ser, buffer, _db, _telemetry, _channel, _catalog, _analytics, _metrics):
     
-    """Continuously read lines from serial and append parsed values."""
-    chunk_Array = bytearray()
-    while True:
-        #start = time.time()
-        if ser.in_waiting:
-            chunk = ser.read(55)
-            #print(f"This function takes {time.time() - start}")
-        else:
-            time.sleep(0.1)  # wait a bit if no data is available
-            continue
-        #chunk = ser.read(ser.in_waiting or 2)
-        #print(chunk.decode('utf-8'))  # print the raw data for debugging
-
-        if not chunk:
-            continue
-        #print(chunk.decode('utf-8'))  # print the raw data for debugging
-        chunk_Array.extend(chunk)
+    """Continuously read frames from one rig's serial port and append parsed values."""
+    schema = DEFAULT_SCHEMA  # frame layout, switched by the controller's <OK...> handshake
+    firmware = None  # schema name once the controller has announced it, for the catalog
+    if _metrics is not None:
+        parse_time, store_time = _metrics.stage("parse"), _metrics.stage("store")
+        lag = _metrics.histogram("perfusion_ingest_lag_seconds",
+                                 "Seconds from a frame's arrival until it is in the UI buffers")
+
+    def update_catalog(method, *args):
+        try:
+            getattr(_catalog, method)(*args)
+        except Exception as e:
+            print(f"Session catalog not updated: {e}")
+
+    def handle_frame(raw_data, received_at):
+        nonlocal schema, firmware
+        if _channel.handle_frame(raw_data):  # <ACK,seq> of a command
+            return
+        if is_handshake(raw_data):
+            announced = schema_for_handshake(raw_data)
+            if announced is not None:
+                schema, firmware = announced, announced.name
+            return
+        started = time.perf_counter() if _metrics is not None else None
+        try:
+            values = schema.parse(raw_data)
+        except FrameError as e:
+            print(f"Frame rejected: {e}")
+            return
+        if started is not None:
+            parsed = time.perf_counter()
+            parse_time.observe(parsed - started)
+
+        cmd = values[0]
+        # 1) If START_PERFUSION (cmd == 1), open a new DB
+        if cmd == 1 and not _db[2]:
+            new_path = make_db_filename(rig_id)
+            ensure_db_file(new_path)
+            _db[1] = new_path
+            _db[0] = SensorDatabase(database_path=new_path, batched=True, journal=True, metrics=_metrics)
+            _db[2] = True
+            _analytics[0] = ControlAnalytics().start_at(_telemetry)  # the session starts with this frame
+            print(f"Perfusion started → logging to: {new_path}")
+            update_catalog("session_opened", new_path, rig_id, received_at, firmware)
         
-        while True:
-            #start = time.time()
-            try:
-                start_index = chunk_Array.index(b'<')
-                end_index = chunk_Array.index(b'>', start_index + 1)
-            except ValueError:
-                break
-
-            frame = chunk_Array[start_index + 1:end_index]
-            #print(frame.decode('utf-8'))  # print the raw data for debugging
-            del chunk_Array[:end_index + 1]  # remove the processed frame
-            
-            raw_data = frame.decode('utf-8').strip()
-            data_list = [item.strip() for item in raw_data.split(',')]
-
-            cmd = data_list[0]
-            # 1) If START_PERFUSION (cmd == "1"), open a new DB
-            if cmd == "1" and not _db[2]:
-                new_path = make_db_filename()
-                ensure_db_file(new_path)
-                _db[1] = new_path
-                _db[0] = SensorDatabase(database_path=new_path)
-                _db[2] = True
-                print(f"Perfusion started → logging to: {new_path}")
-            
-            # 2) If STOP_PERFUSION (cmd == "0"), close out current session
-            if cmd == "0" and _db[2]:
-                _db[2] = False
-                print(f"Perfusion stopped for: {_db[1]}")
-                # (Optionally: db = None)
-
-            # 3) If perfusion is active and we have a db, insert
-            if _db[2] and _db[0] is not None:
-                try:
-                    _db[0].insert_reading(data_list)
-                except Exception as e:
-                    #print(f"DB insert failed: {e}")
-                    pass
-            """        
+        # 2) If STOP_PERFUSION (cmd == 0), close out current session
+        if cmd == 0 and _db[2]:
+            _db[2] = False
+            _db[0].close()  # commit whatever the writer still holds
+            print(f"Perfusion stopped for: {_db[1]}")
+            update_catalog("session_closed", _db[1], received_at, firmware)
+            # (Optionally: db = None)
+
+        # 3) If perfusion is active and we have a db, insert
+        if _db[2] and _db[0] is not None:
             try:
-                if data_list[0] in ("1", "2"):
-                    save_db.insert_reading(data_list)
-            except:
+                _db[0].insert_values(values, received_at)
+            except Exception as e:
+                #print(f"DB insert failed: {e}")
                 pass
-            """
-            buffer.append((time.time(), frame.decode('utf-8')))
-            if len(buffer) > 15:  # keep only the last 15
-                buffer.pop(0)
+        if started is not None:
+            store_time.observe(time.perf_counter() - parsed)
 
-            #print(f"This function takes {time.time() - start}")
-        #print(f"This function takes {time.time() - start}")
+        _telemetry.append(received_at, values)
+        buffer.append((received_at, raw_data))
+        if len(buffer) > 15:  # keep only the last 15
+            buffer.pop(0)
+        if started is not None:
+            lag.observe(time.time() - received_at)
+
+    # Wakes up when bytes arrive instead of polling in_waiting every 100 ms
+    SerialReader(ser, on_frame=handle_frame, metrics=_metrics).run()
+
+    # Only a lost port (unplugged) ends the reader: close the session rather than leave it open
+    if _db[2]:
+        _db[2] = False
+        _db[0].close()
+        print(f"Serial port lost, perfusion stopped for: {_db[1]}")
+        update_catalog("session_closed", _db[1], time.time(), firmware)
+
+
+@st.cache_resource
+def start_reader(rig_id: str, port: str):
+    """One reader thread per rig, started once per process whichever rig a session looks at."""
+    t = threading.Thread(target=read_serial, name=f"reader-{rig_id}",
+                         args=(rig_id, connect(port), get_buffer(port), init_db(port), get_telemetry(port),
+                               get_channel(port), get_catalog(), get_analytics(port), get_metrics(rig_id)),
+                         daemon=True)
+    t.start()
+    return t
 
 
 @st.fragment(run_every=1)
+@timed_fragment
 def serial_log():
     #start = time.time()
     st.markdown("### 🔄 Latest Serial Response:")
     st.subheader("Full Log")
+    st.caption(command_stats_text(get_channel(port).stats()))
     st.write("This log shows the last 15 lines received from the Arduino.")
     st.write("If you want to see the full log, please check the checkbox below.")
     if st.checkbox("Show log"):
@@ -258,28 +395,88 @@ def serial_log():
     #print(f"This function takes {time.time() - start}")
    
 
+@st.fragment(run_every=2)
+@timed_fragment
+def control_stats(telemetry, analytics):
+    # Settling time, overshoot, RMS error and valve duty of the current/last run
+    with analytics[1]:
+        summary = analytics[0].update_from_buffer(telemetry).summary()
+    st.caption(summary_text(summary))
+
 @st.fragment(run_every=1)
-def read_db_list(buffer):
+@timed_fragment
+def read_db_list(telemetry):
     #start = time.time()
-    try:
-        reversed_buffer = reversed(buffer)
-        t, msg = next(reversed_buffer)  # get the last item
-        new_data = f"{time.strftime('%H:%M:%S', time.localtime(t))} , {msg}"
-        data_splited = [item.strip() for item in new_data.split(',')]
-        #print(data_splited)
-        if len(data_splited) > 1 and data_splited[1] != "0":
-            new_row_df = data_splited
-                # prepend to the list
-            st.session_state.data_rows.insert(1, new_row_df)
-                # cap length at 1000
-            if len(st.session_state.data_rows) > 11:
-                    st.session_state.data_rows.pop()  # drop the oldest 
-
-        st.table(st.session_state.data_rows)
-        
-    except Exception as e:
+    # Last reading of each of the last 10 seconds while perfusing, straight from the typed columns
+    rows = telemetry.window(600, now=time.time())
+    active = np.flatnonzero(rows["perfusion_state"] != 0)
+    seconds = np.floor(rows["timestamp"][active])
+    active = active[np.diff(seconds, append=np.inf) != 0][-10:][::-1]  # newest first
+    if not len(active):
         st.info(f"Database not loaded!")
-        #print(f"This function takes {time.time() - start}")
+        return
+
+    table = pd.DataFrame({name: rows[name][active] for name in VALUE_COLUMNS})
+    table.insert(0, "timestamp", [time.strftime('%H:%M:%S', time.localtime(t)) for t in rows["timestamp"][active]])
+    st.table(table)
+    #print(f"This function takes {time.time() - start}")
+
+@st.fragment(run_every=2)
+@timed_fragment
+def sensor_plot(telemetry, db):
+    # Pressure and motor speed of the current/last run; every trace is downsampled to
+    # PLOT_MAX_POINTS on the server, so a multi-day run costs the browser as much as 10 minutes
+    window = st.selectbox("Window", list(PLOT_WINDOWS) + ["Custom range"], key="plot_window")
+    db_path = db[1]
+    span = series_span(db_path) if db_path is not None and Path(db_path).exists() else None
+
+    start, end = None, None
+    if window == "Custom range":
+        if span is None or span[0] == span[1]:
+            st.info("No recorded run to pick a range from.")
+            return
+        first, last = (datetime.datetime.fromtimestamp(t) for t in span)
+        start, end = st.slider("Range", min_value=first, max_value=last, value=(first, last),
+                               step=datetime.timedelta(seconds=1), format="DD.MM HH:mm:ss", key="plot_range")
+        start, end = start.timestamp(), end.timestamp()
+    elif PLOT_WINDOWS[window] is not None:
+        start = time.time() - PLOT_WINDOWS[window]
+
+    if span is not None:
+        # raw readings, or the 1 s / 1 min / 1 h rollups when the range holds too many of them
+        series = read_overview(db_path, PLOT_COLUMNS, start, end, max_points=PLOT_MAX_POINTS)
+    else:
+        # Nothing recorded yet: plot what the reader has buffered
+        series = telemetry.between(start, end, ("timestamp",) + PLOT_COLUMNS)
+    if not len(series["timestamp"]):
+        st.info("No sensor data to plot yet.")
+        return
+
+    reduced = downsample(series["timestamp"], {name: series[name] for name in PLOT_COLUMNS},
+                         max_points=PLOT_MAX_POINTS, method=PLOT_METHOD)
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.06,
+                        subplot_titles=("Pressure", "Motor speed"))
+    for name, row in (("current_pressure", 1), ("target_pressure", 1), ("motor_speed", 2)):
+        if f"{name}_min" in series and name != "target_pressure":
+            # rollup buckets: shade the range each bucket's mean stands for
+            band_x = [datetime.datetime.fromtimestamp(t) for t in series["timestamp"].tolist()]
+            fig.add_trace(go.Scatter(x=band_x, y=series[f"{name}_max"], mode="lines", line={"width": 0},
+                                     showlegend=False, hoverinfo="skip"), row=row, col=1)
+            fig.add_trace(go.Scatter(x=band_x, y=series[f"{name}_min"], mode="lines", line={"width": 0},
+                                     fill="tonexty", showlegend=False, hoverinfo="skip"), row=row, col=1)
+        x, y = reduced[name]
+        fig.add_trace(go.Scatter(x=[datetime.datetime.fromtimestamp(t) for t in x.tolist()], y=y,
+                                 mode="lines", name=name,
+                                 line={"dash": "dash"} if name == "target_pressure" else None),
+                      row=row, col=1)
+    fig.update_layout(height=500, margin={"l": 40, "r": 10, "t": 30, "b": 30},
+                      uirevision=window, legend={"orientation": "h"})
+    st.plotly_chart(fig, use_container_width=True)
+    if series.get("resolution"):
+        st.caption(f"{int(series['count'].sum())} readings as {len(series['timestamp'])} buckets of "
+                   f"{series['resolution']} s (mean, shaded min–max)")
+    else:
+        st.caption(f"{len(series['timestamp'])} readings, drawn with at most {PLOT_MAX_POINTS} points per trace")
 
 @st.fragment(run_every=1)
 def show_latest_line(buffer):
@@ -290,40 +487,64 @@ def show_latest_line(buffer):
         placeholder.text(latest_line)
 
 
-@st.fragment(run_every=10)
-def repeat_commands():
-    send_all_commands()
-
 # Configurable directory (default to 'databases' but can be changed)
 DB_DIR = Path(os.path.expanduser("~/Downloads/Perfusion_System/databases"))
 DB_DIR.mkdir(parents=True, exist_ok=True)
 
+# Rigs: every serial port found runs its own reader, session database and command channel
+RIG_MAX = 4
 
-db = init_db()
+# With Dashboard_2/acquisition_daemon.py running, attach to it instead of opening the ports,
+# so restarting Streamlit does not pause the capture: the daemon's Unix socket, None = read here
+DAEMON_SOCKET = os.environ.get("PERFUSION_DAEMON_SOCKET")
 
+# Pipeline metrics (per-stage timings, ingest lag, queue depths, fragment run times) in the
+# Prometheus text format at http://127.0.0.1:METRICS_PORT/metrics (e.g. 9108, local scrapers
+# only); None = nothing is timed at all
+METRICS_PORT = None
 
-# --- Serial port initialization (only once) ---
-if 'ser' not in st.session_state:
-    st.session_state.ser = connect()
-ser = st.session_state.ser
+# Chart settings
+PLOT_MAX_POINTS = 1000
+PLOT_METHOD = "lttb"  # or "minmax"
+PLOT_WINDOWS = {"Last 10 min": 600, "Last hour": 3600, "Last 6 h": 6 * 3600, "Whole run": None}
 
 
-buffer = get_buffer()
-
-# ---- Initialize history ----
-if "cmd_history" not in st.session_state:
-    st.session_state.cmd_history = ["IDLE",  "15.0", "2.5", "0", "0", "0"]  # Initialize with Six strings
-
-
-# start background thread once
-if "reader" not in st.session_state:
-    buffer = get_buffer()
-    t = threading.Thread(target=read_serial, args=(buffer, db), daemon=True)
-    t.start()
-    st.session_state.reader = t
-
-# Send commands 
-#repeat_commands()
+if DAEMON_SOCKET:
+    try:
+        rigs = get_daemon_rigs()
+    except OSError as e:
+        st.error(f"Acquisition daemon not reachable at {DAEMON_SOCKET}: {e}")
+        st.stop()
+    for port in rigs.values():
+        attach_rig(port)
+else:
+    ports = find_ports()
+    if not ports:
+        st.error("No active serial ports found.")
+        st.stop()
+    rigs = {f"rig{i}": port for i, port in enumerate(ports, start=1)}
+
+    # start background threads once, one per rig
+    recover_sessions()
+    for rig_id, port in rigs.items():
+        start_reader(rig_id, port)
+if METRICS_PORT:
+    start_metrics_server(tuple(rigs))
+
+rig_id = st.sidebar.selectbox("Rig", list(rigs), format_func=lambda r: f"{r} ({rigs[r]})", key="rig")
+port = rigs[rig_id]
+
+db = init_db(port)
+
+
+buffer = get_buffer(port)
+telemetry = get_telemetry(port)
+
+# ---- Initialize history (one per rig) ----
+if "cmd_histories" not in st.session_state:
+    st.session_state.cmd_histories = {}
+st.session_state.cmd_history = st.session_state.cmd_histories.setdefault(
+    rig_id, ["IDLE",  "15.0", "2.5", "0", "0", "0"])  # Initialize with Six strings
 
 
 # ————— ST UI —————
@@ -377,14 +598,11 @@ except:
     st.rerun()
         
 
-# initialize an empty list in Session State
-if "data_rows" not in st.session_state:
-    st.session_state.data_rows = [("timestamp", "perfusion_state", "valve_state", "humidity", "temperature", "envir_pressure", "AQI", "current_pressure", "target_pressure", "motor_speed")]
-
-
 # --- in your main app flow ---
 
 st.subheader("Sensor Data Plot")
 
-read_db_list(buffer)
+sensor_plot(telemetry, db)
+control_stats(telemetry, get_analytics(port))
+read_db_list(telemetry)
 
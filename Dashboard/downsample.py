@@ -0,0 +1,197 @@
+import math
+import sqlite3
+
+import numpy as np
+
+from save_data import ROLLUP_COLUMNS, ROLLUP_RESOLUTIONS, to_us
+
+
+# Columns shown in the pressure / motor charts
+PLOT_COLUMNS = ("current_pressure", "target_pressure", "motor_speed")
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points of (x, y) that keep the
+    visual shape of the line (peaks and dips survive, flat stretches collapse).
+    First and last point are always kept. Returns all indices if there are few enough points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # threshold - 2 buckets between the first and the last point; the last point is the
+    # "next bucket" of the last one
+    edges = np.append(np.linspace(1, n - 1, threshold - 1).astype(np.intp), n)
+    out = np.empty(threshold, dtype=np.intp)
+    out[0] = 0
+    out[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        xc = x[hi:next_hi].mean()
+        yc = y[hi:next_hi].mean()
+        xa, ya = x[a], y[a]
+        area = np.abs((xa - xc) * (y[lo:hi] - ya) - (xa - x[lo:hi]) * (yc - ya))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax(x, y, threshold):
+    """
+    Min/max buckets: the lowest and the highest point of each of `threshold // 2` equal-count
+    buckets, in time order. Cheaper than LTTB and never hides a pressure spike.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    size = -(-n // (threshold // 2))  # points per bucket, rounded up
+    rows = -(-n // size)
+    padded = np.empty(rows * size)
+    padded[:n] = y
+    padded[n:] = np.inf
+    lows = padded.reshape(rows, size).argmin(axis=1)
+    padded[n:] = -np.inf
+    highs = padded.reshape(rows, size).argmax(axis=1)
+    offsets = np.arange(rows) * size
+    return np.unique(np.concatenate((offsets + lows, offsets + highs)))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(x, columns, max_points=1000, method="lttb"):
+    """
+    Reduce every series in `columns` ({name: y array}, all sharing `x`) to at most `max_points`
+    points. Returns {name: (x, y)}; each series keeps its own points, so peaks of one column
+    are not dropped because of the shape of another.
+    """
+    pick = METHODS[method]
+    x = np.asarray(x)
+    result = {}
+    for name, y in columns.items():
+        y = np.asarray(y)
+        idx = pick(x, y, max_points)
+        result[name] = (x[idx], y[idx])
+    return result
+
+
+def read_series(database_path, columns=PLOT_COLUMNS, start=None, end=None):
+    """
+    Read `columns` of a session database between `start` and `end` (epoch seconds, either may be
+    None) as NumPy arrays, plus "timestamp" in epoch seconds. The range is looked up through
+    idx_timestamp, so zooming into a short stretch of a multi-day run only reads that stretch.
+    """
+    where, params = [], []
+    if start is not None:
+        where.append("timestamp >= ?")
+        params.append(to_us(start))
+    if end is not None:
+        where.append("timestamp <= ?")
+        params.append(to_us(end))
+    query = (f"SELECT timestamp / 1e6, {', '.join(columns)} "
+             f"FROM sensor_readings {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY timestamp")
+
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(columns) + 1)
+    series = {"timestamp": data[:, 0]}
+    for i, name in enumerate(columns, start=1):
+        series[name] = data[:, i]
+    return series
+
+
+def series_span(database_path):
+    """(first, last) reading time of a session database in epoch seconds, None if it is empty."""
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        # two subqueries, so each MIN/MAX is a single lookup in idx_timestamp
+        first, last = conn.execute(
+            "SELECT (SELECT MIN(timestamp) FROM sensor_readings) / 1e6, "
+            "(SELECT MAX(timestamp) FROM sensor_readings) / 1e6").fetchone()
+    finally:
+        conn.close()
+    return None if first is None else (first, last)
+
+
+def choose_resolution(start, end, max_points, resolutions=ROLLUP_RESOLUTIONS):
+    """Finest rollup resolution (seconds) that covers start..end in at most `max_points` buckets."""
+    span = max(end - start, 1)
+    for resolution in resolutions:
+        if math.ceil(span / resolution) <= max_points:
+            return resolution
+    return resolutions[-1]
+
+
+def read_rollup(database_path, resolution, columns=ROLLUP_COLUMNS, start=None, end=None):
+    """
+    Buckets of one rollup resolution between start and end (epoch seconds, either may be None)
+    as NumPy arrays: "timestamp" (bucket start), "count", and per column its mean under the
+    column's own name plus "<column>_min" / "<column>_max".
+    """
+    where, params = ["resolution = ?"], [resolution]
+    if start is not None:
+        where.append("bucket >= ?")
+        params.append(int(start) // resolution * resolution)
+    if end is not None:
+        where.append("bucket <= ?")
+        params.append(int(end))
+    selected = ", ".join(f"{c}_sum / n, {c}_min, {c}_max" for c in columns)
+    query = f"SELECT bucket, n, {selected} FROM sensor_rollups WHERE {' AND '.join(where)} ORDER BY bucket"
+
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3 * len(columns) + 2)
+    series = {"timestamp": data[:, 0], "count": data[:, 1]}
+    for i, name in enumerate(columns):
+        series[name] = data[:, 2 + 3 * i]
+        series[f"{name}_min"] = data[:, 3 + 3 * i]
+        series[f"{name}_max"] = data[:, 4 + 3 * i]
+    return series
+
+
+def read_overview(database_path, columns=PLOT_COLUMNS, start=None, end=None, max_points=1000, raw_factor=4):
+    """
+    `columns` between start and end for a chart of about `max_points` points, from whichever
+    source is cheapest: the raw readings while there are at most raw_factor * max_points of them
+    (downsample() thins them out), otherwise the finest rollup with at most `max_points` buckets.
+    The result has the keys of read_series(), plus "<column>_min" / "<column>_max" envelopes and
+    "resolution" (0 for raw readings) when it comes from a rollup.
+    Databases recorded before the rollups existed are read raw.
+    """
+    if not set(columns) <= set(ROLLUP_COLUMNS):
+        return dict(read_series(database_path, columns, start, end), resolution=0)
+    conn = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+    try:
+        first, last = conn.execute(
+            "SELECT MIN(bucket), MAX(bucket) FROM sensor_rollups WHERE resolution = ?",
+            (ROLLUP_RESOLUTIONS[0],)).fetchone()
+        if first is None:
+            return dict(read_series(database_path, columns, start, end), resolution=0)
+        lo = first if start is None else max(first, int(start))
+        hi = last + ROLLUP_RESOLUTIONS[0] if end is None else min(last + ROLLUP_RESOLUTIONS[0], int(end) + 1)
+        resolution = choose_resolution(lo, hi, max_points)
+        readings = conn.execute(
+            "SELECT TOTAL(n) FROM sensor_rollups WHERE resolution = ? AND bucket >= ? AND bucket < ?",
+            (resolution, lo // resolution * resolution, hi)).fetchone()[0]
+    except sqlite3.OperationalError:  # no sensor_rollups table
+        return dict(read_series(database_path, columns, start, end), resolution=0)
+    finally:
+        conn.close()
+
+    if readings <= raw_factor * max_points:
+        return dict(read_series(database_path, columns, start, end), resolution=0)
+    return dict(read_rollup(database_path, resolution, columns, start, end), resolution=resolution)
+
@@ -0,0 +1,121 @@
+class FrameDecoder:
+    """
+    Incremental decoder for the `<...>` frames sent by the controller's Status().
+
+    Each chunk is scanned in place with a cursor: per frame one find() of its `>` and one of the
+    `<` before it, both in C, and the payload is sliced straight out of the chunk. So every byte
+    is looked at a constant number of times no matter how many frames are backed up, and the
+    chunk itself is never copied: only the bytes of a frame that has not been completed yet are
+    kept, and joined with the bytes up to its `>` when they arrive.
+
+    The statistics are worked out once per chunk from marker counts and payload lengths rather
+    than frame by frame, so the common case (clean frames with a CRLF between them) runs no
+    Python code beyond the find/slice/append of each frame.
+
+    Resync rules:
+      - bytes before a `<` are junk and are dropped,
+      - a `<` inside an open frame means the previous frame was truncated, restart at the new `<`,
+      - an open frame longer than `max_frame_size` is dropped as oversized.
+    """
+
+    def __init__(self, max_frame_size=256, start=b'<', end=b'>'):
+        self.max_frame_size = max_frame_size
+        self._start = start
+        self._end = end
+        self._partial = None  # bytes after the `<` of the frame still being received, None if none is open
+
+        # Statistics
+        self.frames = 0
+        self.discarded_bytes = 0
+        self.truncated_frames = 0
+        self.oversized_frames = 0
+
+    def feed(self, data):
+        """Append raw serial bytes and return the payloads (without `<`/`>`) of all complete frames."""
+        if not isinstance(data, bytes):
+            data = bytes(data)  # pyserial reads bytes; a bytearray/memoryview would slice into its own type
+        start_marker, end_marker = self._start, self._end
+        max_frame_size = self.max_frame_size
+        frames = []
+        discarded = truncated = oversized = 0
+        pos = 0
+
+        if self._partial is not None:
+            end = data.find(end_marker)
+            if end == -1:
+                data = start_marker + self._partial + data  # still open: grows until its `>` or max_frame_size
+            else:
+                # the frame left open by the last chunk
+                payload = self._partial + data[:end]
+                restart = payload.rfind(start_marker) + 1
+                if restart:
+                    truncated += payload.count(start_marker)
+                    discarded += restart
+                    payload = payload[restart:]
+                if len(payload) > max_frame_size:
+                    oversized += 1
+                    discarded += len(payload) + 2
+                else:
+                    frames.append(payload)
+                pos = end + 1
+        done = len(frames)
+
+        find = data.find
+        append = frames.append
+        first = pos
+        end = find(end_marker, pos)
+        while end != -1:
+            start = find(start_marker, pos, end)
+            if start != -1:
+                append(data[start + 1:end])
+            pos = end + 1
+            end = find(end_marker, pos)
+
+        if pos != first:
+            # data[first:pos] is settled. Every `<` in it either starts one of the payloads just
+            # sliced or is followed by another `<` before any `>`: a truncated frame, whose tail
+            # is at the front of the payload and is cut off here
+            found = frames[done:] if done else frames
+            restarts = data.count(start_marker, first, pos) - len(found)
+            if restarts:
+                truncated += restarts
+                found = [payload[payload.rfind(start_marker) + 1:] for payload in found]
+            total = sum(map(len, found))
+            if total > max_frame_size and max(map(len, found)) > max_frame_size:
+                kept = [payload for payload in found if len(payload) <= max_frame_size]
+                oversized += len(found) - len(kept)
+                found = kept
+                total = sum(map(len, found))
+            if restarts or oversized:
+                frames[done:] = found
+            discarded += pos - first - total - 2 * len(found)
+
+        partial = None
+        start = data.rfind(start_marker, pos)
+        if start == -1:
+            discarded += len(data) - pos
+        else:
+            if start != pos:
+                truncated += data.count(start_marker, pos, start)
+                discarded += start - pos
+            if len(data) - start - 1 > max_frame_size:
+                oversized += 1
+                discarded += len(data) - start
+            else:
+                partial = data[start + 1:]  # wait for the rest of the frame
+        self._partial = partial
+
+        self.frames += len(frames)
+        self.discarded_bytes += discarded
+        if truncated or oversized:
+            self.truncated_frames += truncated
+            self.oversized_frames += oversized
+        return frames
+
+    def pending(self):
+        """Number of buffered bytes not consumed yet (start of a partial frame)."""
+        return 0 if self._partial is None else len(self._partial) + 1
+
+    def reset(self):
+        """Drop any partial frame, e.g. after reconnecting to the port."""
+        self._partial = None
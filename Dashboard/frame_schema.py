@@ -0,0 +1,160 @@
+"""
+Declarative layouts of the comma-separated frames the controllers and older scripts send.
+
+A FrameSchema lists the fields of one firmware version (name, type, unit). From that list it
+compiles a parse function specialised to the layout, roughly
+
+    def parse(line):
+        f = line.split(",")
+        if len(f) != 9: raise FrameError(...)
+        return (int(f[0]), int(f[1]), float(f[2]), ...)
+
+so a frame is split once and every field converted once with the right type, and a frame
+with a different number of fields is rejected instead of shifting the columns after it.
+
+The controller tells the host which layout it speaks in its handshake; schema_for_handshake()
+maps the handshake payload (`<OK>`, `<OK,C2>`, `<OK,BIN>`) to the schema.
+"""
+from collections import namedtuple
+
+
+Field = namedtuple("Field", "name type unit", defaults=("",))
+
+# Python type → conversion used in the generated code
+_CONVERTERS = {int: "int", float: "float", str: "str.strip"}
+
+
+class FrameError(ValueError):
+    """A frame that does not match its schema (field count or a field's type)."""
+
+
+class FrameSchema:
+    def __init__(self, name, fields, handshakes=(), description=""):
+        self.name = name
+        self.fields = tuple(fields)
+        self.handshakes = tuple(handshakes)  # handshake payloads that announce this layout
+        self.description = description
+        self.columns = tuple(field.name for field in self.fields)
+        self.units = {field.name: field.unit for field in self.fields}
+        self.parse = self._compile()
+
+    def __repr__(self):
+        return f"FrameSchema({self.name!r}, {len(self.fields)} fields)"
+
+    def _compile(self):
+        for field in self.fields:
+            if field.type not in _CONVERTERS:
+                raise TypeError(f"{self.name}: unsupported type {field.type!r} for field {field.name!r}")
+        n = len(self.fields)
+        values = ", ".join(f"{_CONVERTERS[field.type]}(f[{i}])" for i, field in enumerate(self.fields))
+        source = (
+            "def parse(line):\n"
+            "    f = line.split(',')\n"
+            f"    if len(f) != {n}:\n"
+            f"        raise FrameError(f'{self.name}: expected {n} fields, got {{len(f)}}: {{line!r}}')\n"
+            "    try:\n"
+            f"        return ({values},)\n"
+            "    except ValueError as e:\n"
+            f"        raise FrameError(f'{self.name}: {{e}} in {{line!r}}') from None\n"
+        )
+        namespace = {"FrameError": FrameError}
+        exec(compile(source, f"<frame schema {self.name}>", "exec"), namespace)
+        parse = namespace["parse"]
+        parse.__doc__ = f"Parse one {self.name} frame payload into a tuple of {', '.join(self.columns)}."
+        return parse
+
+    def as_dict(self, line):
+        return dict(zip(self.columns, self.parse(line)))
+
+
+SCHEMAS = {}
+_HANDSHAKES = {}
+
+
+def register(schema):
+    """Add a schema to the registry; its handshakes must not be claimed by another schema."""
+    if schema.name in SCHEMAS:
+        raise ValueError(f"Frame schema {schema.name!r} is already registered")
+    for handshake in schema.handshakes:
+        if handshake in _HANDSHAKES:
+            raise ValueError(f"Handshake {handshake!r} already announces {_HANDSHAKES[handshake].name!r}")
+    SCHEMAS[schema.name] = schema
+    for handshake in schema.handshakes:
+        _HANDSHAKES[handshake] = schema
+    return schema
+
+
+def get_schema(name):
+    try:
+        return SCHEMAS[name]
+    except KeyError:
+        raise KeyError(f"Unknown frame schema {name!r}, expected one of {sorted(SCHEMAS)}") from None
+
+
+def schema_for_handshake(payload):
+    """Schema announced by a handshake frame payload (str or bytes, e.g. "OK,C2"), else None."""
+    if isinstance(payload, bytes):
+        payload = payload.decode("ascii", errors="replace")
+    return _HANDSHAKES.get(payload.replace(" ", ""))
+
+
+def is_handshake(payload):
+    """True for any `<OK...>` handshake payload, known or not."""
+    if isinstance(payload, bytes):
+        return payload[:2] == b"OK"
+    return payload[:2] == "OK"
+
+
+# --- Schemas ---
+# Status() of Controller_1 and Controller_2: the columns of sensor_readings
+STATUS_FIELDS = (
+    Field("perfusion_state", int),        # PerfusionState: 0 IDLE, 1 PERFUSING, 2 PAUSED
+    Field("valve_state", int),
+    Field("humidity", float, "%"),
+    Field("temperature", float, "°C"),
+    Field("envir_pressure", float, "mmHg"),
+    Field("AQI", float, "IAQ"),
+    Field("current_pressure", float, "mmHg"),
+    Field("target_pressure", float, "mmHg"),
+    Field("motor_speed", float, "rpm"),
+)
+
+CONTROLLER_1 = register(FrameSchema(
+    "controller-1", STATUS_FIELDS, handshakes=("OK",),
+    description="Controller_1, and Controller_2 before it announced a version (plain <OK>)"))
+
+CONTROLLER_2 = register(FrameSchema(
+    "controller-2", STATUS_FIELDS, handshakes=("OK,C2", "OK,BIN"),
+    description="Controller_2 Status(), text (<OK,C2>) or binary frames re-rendered as text (<OK,BIN>)"))
+
+DATALOGGING_PS_DHT_BME = register(FrameSchema(
+    "datalogging-ps-dht-bme", (
+        Field("zeroValue", int),
+        Field("sensorValue1", int),
+        Field("pressureValue", float),
+        Field("Temperature", float, "°C"),
+        Field("Humidity", float, "%"),
+        Field("BMEt", float, "°C"),
+        Field("BMEh", float, "%"),
+        Field("BMEp", float, "hPa"),
+        Field("BMEg", float, "Ω"),
+    ),
+    description="Pressure/DHT/BME680 logger sketch read by datalogging_ps_dht_bme.py (no handshake)"))
+
+SENSOR_DATA = register(FrameSchema(
+    "sensor-data", (
+        Field("humidity", float, "%"),
+        Field("temperature", float, "°C"),
+        Field("pressure", float, "mmHg"),
+        Field("tilt", float, "°"),
+        Field("gyro_x", float, "°/s"),
+        Field("gyro_y", float, "°/s"),
+        Field("gyro_z", float, "°/s"),
+        Field("motor_speed", float, "rpm"),
+        Field("motor_direction", str),    # "CW", "CCW" or "STOP"
+        Field("syringe_current_position", int),
+    ),
+    description="Sensor_Data.extract_sensor_data / Perfusion.update_data layout"))
+
+# Until a handshake says otherwise (e.g. the port was opened after the controller booted)
+DEFAULT_SCHEMA = CONTROLLER_2
@@ -0,0 +1,169 @@
+"""
+Append-only journal of the readings a session database has been handed but may not have
+committed yet (perfusion_..._HHMMSS.db → perfusion_..._HHMMSS.db.ingest).
+
+SensorDatabase(journal=True) appends every reading here before queueing it for the group-commit
+writer, so the writer can hold rows for seconds without risking them: after a crash or power
+loss the records past the rows the database has committed are replayed on the next start, and
+a database that is closed normally deletes its journal.
+
+File: HEADER, the uint64 id of the last row the database had when the journal was created,
+then fixed-size records
+
+    uint32 crc32 of the body
+    double received_at      epoch seconds
+    double × 9              the sensor_readings values
+
+Appends are plain os.write() calls (one syscall, no Python buffering, so a killed process loses
+nothing). The journal's own thread fsync()s what was appended every `sync_interval` seconds,
+which bounds what a power cut can take without the reader ever waiting for the disk. A record
+torn by the cut fails its CRC and ends the replay.
+
+After each group commit the writer checkpoints the journal: the records still uncommitted are
+copied to a new file with the new base id, which replaces the old one once it is fsync()ed. So
+the journal only holds the last seconds of readings however long the session runs, and after a
+power cut either file is a valid journal.
+"""
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+
+JOURNAL_SUFFIX = ".ingest"
+HEADER = b"PSJ1"
+_BASE_STRUCT = struct.Struct("<Q")
+BODY_STRUCT = struct.Struct("<d9d")
+_CRC_STRUCT = struct.Struct("<I")
+RECORD_SIZE = _CRC_STRUCT.size + BODY_STRUCT.size
+HEADER_SIZE = len(HEADER) + _BASE_STRUCT.size
+
+
+def journal_path(db_path):
+    return Path(str(db_path) + JOURNAL_SUFFIX)
+
+
+class IngestJournal:
+    def __init__(self, path, base_id=0, sync_interval=0.2):
+        self.path = Path(path)
+        self.sync_interval = sync_interval  # None = leave syncing to the OS
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            os.write(self._fd, HEADER + _BASE_STRUCT.pack(base_id))
+        else:  # carry on with a journal that was not replayed
+            (base_id,) = _BASE_STRUCT.unpack(os.pread(self._fd, _BASE_STRUCT.size, len(HEADER)))
+        self.base_id = base_id  # id of the row before the first record in the file
+        self._in_file = max(size - HEADER_SIZE, 0) // RECORD_SIZE
+        self._lock = threading.Lock()  # append() vs. checkpoint() switching files
+        self._sync_lock = threading.Lock()  # an fsync() vs. its file being closed
+        self._synced = 0  # `records` as of the last fsync()
+        self._closed = threading.Event()
+
+        # Statistics
+        self.records = 0
+        self.syncs = 0
+        self.checkpoints = 0
+
+        self._syncer = None
+        if sync_interval is not None:
+            self._syncer = threading.Thread(target=self._sync_loop, name=f"journal-{self.path.name}", daemon=True)
+            self._syncer.start()
+
+    def append(self, received_at, values):
+        body = BODY_STRUCT.pack(received_at, *values)
+        record = _CRC_STRUCT.pack(zlib.crc32(body)) + body
+        with self._lock:
+            os.write(self._fd, record)
+            self._in_file += 1
+            self.records += 1
+
+    def sync(self):
+        """fsync() the records appended since the last sync, if any."""
+        with self._sync_lock:
+            records = self.records
+            if self._fd is None or records == self._synced:
+                return
+            os.fsync(self._fd)
+            self._synced = records
+            self.syncs += 1
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.sync_interval):
+            try:
+                self.sync()
+            except OSError as e:
+                print(f"Journal {self.path.name} not synced: {e}")
+
+    def checkpoint(self, last_id):
+        """
+        The database has committed every row up to `last_id`: drop their records, so the file
+        keeps only what a replay would still need. Called by the writer after a group commit;
+        appends wait only while the records that arrived during the copy are added.
+        """
+        with self._lock:
+            drop = min(last_id - self.base_id, self._in_file)
+            if drop <= 0 or self._fd is None:
+                return
+            start = HEADER_SIZE + drop * RECORD_SIZE
+            kept = self._in_file - drop
+            base_id = self.base_id + drop
+            tail = os.pread(self._fd, kept * RECORD_SIZE, start)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        fd = os.open(tmp, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, HEADER + _BASE_STRUCT.pack(base_id) + tail)
+            os.fsync(fd)  # before it replaces the old file: either one holds the uncommitted records
+            with self._sync_lock, self._lock:
+                if self._fd is None:
+                    raise OSError(f"{self.path.name} was closed")
+                more = self._in_file - drop - kept  # appended during the copy, synced by the next sync()
+                if more:
+                    os.write(fd, os.pread(self._fd, more * RECORD_SIZE, start + kept * RECORD_SIZE))
+                os.replace(tmp, self.path)
+                fd, self._fd = self._fd, fd
+                self.base_id, self._in_file = base_id, kept + more
+                self._synced = min(self._synced, self.records - more)
+        except BaseException:
+            os.close(fd)
+            tmp.unlink(missing_ok=True)
+            raise
+        os.close(fd)  # the old file
+        self.checkpoints += 1
+
+    def close(self, remove=False):
+        """Close the file; remove=True once every record is committed to the database."""
+        self._closed.set()
+        if self._syncer is not None:
+            self._syncer.join()
+        if not remove:
+            self.sync()  # what is left is kept for a replay
+        with self._sync_lock, self._lock:
+            if self._fd is None:
+                return
+            os.close(self._fd)
+            self._fd = None
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+def read_journal(path):
+    """
+    The journal's base row id, and (received_at, values) of every intact record up to the
+    first torn or corrupt one.
+    """
+    data = Path(path).read_bytes()
+    start = HEADER_SIZE
+    if not data.startswith(HEADER) or len(data) < start:
+        return 0, []
+    (base_id,) = _BASE_STRUCT.unpack_from(data, len(HEADER))
+    records = []
+    for offset in range(start, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+        (crc,) = _CRC_STRUCT.unpack_from(data, offset)
+        body = data[offset + _CRC_STRUCT.size:offset + RECORD_SIZE]
+        if zlib.crc32(body) != crc:
+            break
+        received_at, *values = BODY_STRUCT.unpack(body)
+        records.append((received_at, values))
+    return base_id, records
@@ -0,0 +1,106 @@
+"""
+Upgrade session databases to the current sensor_readings schema (save_data.SCHEMA_VERSION), in
+place. Databases are also upgraded when SensorDatabase opens them, this converts a whole
+archive in one go:
+
+    python migrate_db.py ~/Downloads/Perfusion_System/databases     # every *.db in the directory
+    python migrate_db.py perfusion_rig1_20250601_101500.db --no-vacuum
+
+Each file is converted in a single transaction (an interrupted run leaves it untouched) and then
+VACUUMed to give the space of the old table back. Files are converted on a thread pool; sqlite3
+releases the GIL while it works. Do not run it on the database of a session that is recording.
+"""
+import argparse
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from save_data import SCHEMA_VERSION, replay_journal, schema_version, upgrade_schema
+
+
+def has_readings(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sensor_readings'").fetchone() is not None
+
+
+def migrate_file(path, vacuum=True):
+    """
+    Upgrade one database. Returns (rows converted or None if it was current, bytes before,
+    bytes after); raises sqlite3.Error for a file that is not a session database.
+    """
+    path = Path(path)
+    size_before = path.stat().st_size
+    conn = sqlite3.connect(path, isolation_level=None, timeout=10)
+    try:
+        if not has_readings(conn):
+            raise sqlite3.DatabaseError("no sensor_readings table")
+        rows = upgrade_schema(conn)
+        if rows is not None and vacuum:
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    if rows is not None:
+        replay_journal(path)  # readings a crash left in its ingest journal, now in the new format
+    return rows, size_before, path.stat().st_size
+
+
+def migrate(paths, workers=None, vacuum=True):
+    """Upgrade `paths` in parallel; yields (path, result of migrate_file() or the exception)."""
+    def run(path):
+        try:
+            return migrate_file(path, vacuum)
+        except sqlite3.Error as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from zip(paths, pool.map(run, paths))
+
+
+def session_files(targets):
+    """The .db files named on the command line, directories expanded."""
+    paths = []
+    for target in map(Path, targets):
+        paths += sorted(target.glob("*.db")) if target.is_dir() else [target]
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=f"Upgrade session databases to schema {SCHEMA_VERSION}.")
+    parser.add_argument("targets", nargs="+", help="Database files or directories of them")
+    parser.add_argument("--workers", type=int, default=None, help="Files converted at once (default: CPU based)")
+    parser.add_argument("--no-vacuum", dest="vacuum", action="store_false",
+                        help="Skip the VACUUM (faster, the file keeps its old size)")
+    parser.add_argument("--check", action="store_true", help="Only report the schema of each file")
+    args = parser.parse_args(argv)
+
+    paths = session_files(args.targets)
+    if args.check:
+        for path in paths:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                if has_readings(conn):
+                    print(f"{path.name}: schema {schema_version(conn)}")
+                else:
+                    print(f"{path.name}: not a session database")
+            finally:
+                conn.close()
+        return
+
+    started = time.perf_counter()
+    upgraded = 0
+    for path, result in migrate(paths, args.workers, args.vacuum):
+        if isinstance(result, Exception):
+            print(f"{path.name}: skipped ({result})")
+            continue
+        rows, before, after = result
+        if rows is None:
+            print(f"{path.name}: already schema {SCHEMA_VERSION}")
+        else:
+            upgraded += 1
+            print(f"{path.name}: {rows} rows, {before / 1e6:.1f} MB → {after / 1e6:.1f} MB")
+    print(f"Upgraded {upgraded} of {len(paths)} file(s) in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Counters, gauges and latency histograms of the acquisition pipeline, served in the Prometheus
+text format (https://prometheus.io/docs/instrumenting/exposition_formats/) so a Prometheus
+server, or plain curl, can watch ingest lag during long runs:
+
+    perfusion_stage_seconds{stage=...}  serial_read   one ser.read() of the bytes that woke the reader
+                                        frame_split   AutoFrameDecoder.feed() of that chunk
+                                        parse         FrameSchema.parse() of one frame
+                                        store         SessionRecorder.record() (journal + writer queue)
+                                        commit        one group commit of the SQLite writer
+                                        apply         one frame applied to the UI buffers
+    perfusion_ingest_lag_seconds        frame received → visible in the UI process
+    perfusion_decoder_pending_bytes     bytes read but not yet a complete frame
+    perfusion_queue_depth{queue=...}    readings waiting for the writer, frames waiting for the UI
+
+Components take an optional MetricsRegistry; without one they skip the timing entirely, so a
+disabled pipeline pays one `is None` test per chunk or frame. Everything here is plain data,
+so a rig's worker process sends MetricsRegistry.snapshot() to the UI process, which renders
+the snapshots of all rigs on one page.
+"""
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+STAGE_SECONDS = "perfusion_stage_seconds"
+
+
+class Counter:
+    def __init__(self, function=None):
+        self.value = 0.0
+        self.function = function  # read at snapshot time instead of value, e.g. an existing count
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def sample(self):
+        return float(self.function()) if self.function is not None else self.value
+
+
+class Gauge(Counter):
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Fixed upper bounds; observe() is a bisect and three additions."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager that observes the seconds its block took."""
+        return _Timer(self)
+
+    def sample(self):
+        with self._lock:
+            return self.buckets, list(self.counts), self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process or rig. Metrics are created on first use and identified by name
+    and labels; `labels` given here (e.g. rig="rig1") are added to every sample.
+    """
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self._metrics = {}  # (name, sorted label items) → (kind, help, metric)
+        self._lock = threading.Lock()
+
+    def _get(self, kind, factory, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            entry = self._metrics.get(key)
+            if entry is None:
+                entry = self._metrics[key] = (kind, help, factory())
+        return entry[2]
+
+    def counter(self, name, help, function=None, **labels):
+        counter = self._get("counter", Counter, name, help, labels)
+        if function is not None:
+            counter.function = function
+        return counter
+
+    def gauge(self, name, help, function=None, **labels):
+        """A gauge; with `function` its value is read from it whenever a snapshot is taken."""
+        gauge = self._get("gauge", Gauge, name, help, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._get("histogram", lambda: Histogram(buckets), name, help, labels)
+
+    def stage(self, stage):
+        """Latency histogram of one pipeline stage (see the module docstring)."""
+        return self.histogram(STAGE_SECONDS, "Seconds spent in each stage of the acquisition pipeline", stage=stage)
+
+    def snapshot(self):
+        """[(name, kind, help, labels, value)], picklable; value is (buckets, counts, sum, count) for histograms."""
+        with self._lock:
+            entries = list(self._metrics.items())
+        samples = []
+        for (name, labels), (kind, help, metric) in entries:
+            try:
+                value = metric.sample()
+            except Exception:  # a gauge function whose object is gone or cannot tell (e.g. qsize on macOS)
+                continue
+            samples.append((name, kind, help, {**self.labels, **dict(labels)}, value))
+        return samples
+
+
+def timed(histogram):
+    """Decorator: observe the run time of every call of the function in `histogram`."""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _label_text(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if value == value else "NaN"
+
+
+def render(snapshots):
+    """Prometheus text format of one or more snapshot() lists."""
+    families = {}
+    for snapshot in snapshots:
+        for name, kind, help, labels, value in snapshot:
+            families.setdefault(name, (kind, help, []))[2].append((labels, value))
+    lines = []
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind != "histogram":
+                lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+                continue
+            buckets, counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(tuple(buckets) + (float("inf"),), counts):  # a list once sent as JSON
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{name}_bucket{_label_text(labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(collect, port, host="127.0.0.1"):
+    """
+    Serve render(collect()) at http://host:port/metrics on a daemon thread, for apps that have
+    no web server of their own to add the route to (Streamlit). Returns the server. Only local
+    scrapers can reach it unless another host (e.g. "0.0.0.0") is given.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render(collect()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # one line per scrape would drown the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
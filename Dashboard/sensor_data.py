@@ -1,3 +1,6 @@
+from frame_schema import FrameError, SENSOR_DATA
+
+
 class Sensor_Data:
     def __init__(self):
         self._humidity = 0.0
@@ -13,16 +16,10 @@ class Sensor_Data:
     def extract_sensor_data(self, data: str):
         """Extract sensor data from a string."""
         try:
-            parts = data.split(',')
-            self._humidity = float(parts[0])
-            self._temperature = float(parts[1])
-            self._pressure = float(parts[2])
-            self._tilt = float(parts[3])
-            self._gyro = (float(parts[4]), float(parts[5]), float(parts[6]))
-            self._motor_speed = float(parts[7])
-            self._motor_direction = parts[8].strip()
-            self._syringe_current_position = int(parts[9])
-        except (ValueError, IndexError) as e:
+            (self._humidity, self._temperature, self._pressure, self._tilt, gyro_x, gyro_y, gyro_z,
+             self._motor_speed, self._motor_direction, self._syringe_current_position) = SENSOR_DATA.parse(data)
+            self._gyro = (gyro_x, gyro_y, gyro_z)
+        except FrameError as e:
             print(f"Error extracting sensor data: {e}")
 
 
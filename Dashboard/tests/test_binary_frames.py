@@ -0,0 +1,97 @@
+# test_binary_frames.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from binary_frames import (AutoFrameDecoder, BinaryFrameDecoder, cobs_decode, cobs_encode,
+                           encode_frame, PAYLOAD_SIZE)
+
+
+VALUES = [1, 0, 45.5, 22.25, 712.5, 30.0, 10.5, 15.0, 0.05]
+
+
+def test_cobs_round_trip():
+    for data in (b"", b"\x00", b"\x00\x00", b"abc\x00def", bytes(range(256)) * 2, b"\x01" * 300):
+        encoded = cobs_encode(data)
+        assert b"\x00" not in encoded
+        assert cobs_decode(encoded) == data
+
+
+def test_frames_split_across_chunks():
+    decoder = BinaryFrameDecoder()
+    stream = b"".join(encode_frame(seq, seq * 10, VALUES) for seq in range(100))
+    frames = []
+    for i in range(0, len(stream), 7):
+        frames.extend(decoder.feed(stream[i:i + 7]))
+    assert [frame[1] for frame in frames] == list(range(100))
+    assert frames[5][2] == 50
+    assert frames[0][3:5] == (1, 0)
+    assert frames[0][5] == 45.5
+    assert decoder.lost_frames == 0
+    assert decoder.pending() == 0
+
+
+def test_corrupted_frame_fails_crc():
+    payload = bytearray(cobs_decode(encode_frame(1, 0, VALUES)[:-1]))
+    payload[10] ^= 0x01
+    decoder = BinaryFrameDecoder()
+    frames = decoder.feed(cobs_encode(bytes(payload)) + b"\x00" + encode_frame(2, 0, VALUES))
+    assert [frame[1] for frame in frames] == [2]
+    assert decoder.crc_errors == 1
+
+
+def test_truncated_frame_and_seq_gaps():
+    decoder = BinaryFrameDecoder()
+    truncated = encode_frame(1, 0, VALUES)[:PAYLOAD_SIZE // 2]
+    stream = encode_frame(0, 0, VALUES) + truncated + encode_frame(2, 0, VALUES) + encode_frame(6, 0, VALUES)
+    frames = decoder.feed(stream)
+    assert [frame[1] for frame in frames] == [0, 6]  # the truncated frame swallows seq 2
+    assert decoder.length_errors == 1
+    assert decoder.lost_frames == 5
+
+
+def test_seq_wraps_without_loss():
+    decoder = BinaryFrameDecoder()
+    decoder.feed(encode_frame(0xFFFF, 0, VALUES) + encode_frame(0, 0, VALUES))
+    assert decoder.lost_frames == 0
+
+
+def test_feed_array():
+    decoder = BinaryFrameDecoder()
+    frames = decoder.feed_array(b"".join(encode_frame(seq, 0, VALUES) for seq in range(10)))
+    assert frames["seq"].tolist() == list(range(10))
+    assert frames["current_pressure"][0] == 10.5
+    assert decoder.frames == 10
+
+
+def test_auto_decoder_switches_on_handshake():
+    decoder = AutoFrameDecoder()
+    stream = (b"<0, 0, 45.0, 22.0, 712.5, 30, 0.00, 15.00, 0.0000>\r\n<OK,BIN>\r\n\x00"
+              + encode_frame(0, 0, VALUES) + encode_frame(1, 0, VALUES))
+    frames = []
+    for i in range(0, len(stream), 3):  # handshake split across reads
+        frames.extend(decoder.feed(stream[i:i + 3]))
+    assert frames[0].startswith(b"0, 0, 45.0")
+    assert frames[1] == b"OK,BIN"
+    assert frames[2] == b"1, 0, 45.5, 22.2, 712.5, 30, 10.50, 15.00, 0.0500"
+    assert len(frames) == 4
+    assert decoder.binary_mode
+    assert decoder.frames == 3
+
+    decoder.reset()
+    assert decoder.feed(b"<OK>") == [b"OK"]
+
+
+def test_auto_decoder_switches_without_handshake():
+    decoder = AutoFrameDecoder()
+    stream = b"".join(encode_frame(seq, 0, VALUES) for seq in range(5))
+    frames = decoder.feed(stream[9:])  # opened mid-stream: no handshake, first frame cut
+    assert decoder.binary_mode
+    assert len(frames) == 4
+    assert frames[0] == b"1, 0, 45.5, 22.2, 712.5, 30, 10.50, 15.00, 0.0500"
+
+
+def test_auto_decoder_text_only():
+    decoder = AutoFrameDecoder()
+    assert decoder.feed(b"<OK>\r\n<1, 0><") == [b"OK", b"1, 0"]
+    assert decoder.feed(b"0, 1>") == [b"0, 1"]
+    assert not decoder.binary_mode
@@ -0,0 +1,94 @@
+# test_command_channel.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import time
+from command_channel import CommandChannel, command_stats_text
+
+START = ["START_PERFUSION", "15.0", "2.5", "0", "0", "0"]
+
+
+class FakePort:
+    def __init__(self):
+        self.packets = []
+
+    def write(self, data):
+        self.packets.append(data.decode())
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_packet_is_numbered_and_acknowledged():
+    port = FakePort()
+    channel = CommandChannel(port.write, coalesce_s=0)
+    try:
+        channel.submit(START)
+        assert wait_for(lambda: port.packets)
+        assert port.packets == ["START_PERFUSION,15.0,2.5,0,0,0,#1\n"]
+        assert channel.handle_frame("ACK,1")
+        assert not channel.handle_frame("1, 0, 45.0")
+        stats = channel.stats()
+    finally:
+        channel.close()
+    assert stats["acked"] == 1
+    assert stats["acks_supported"] is True
+    assert stats["rtt_last_ms"] is not None
+    assert command_stats_text(stats).startswith("Commands acked: 1/1")
+
+
+def test_rapid_clicks_are_coalesced():
+    port = FakePort()
+    channel = CommandChannel(port.write, coalesce_s=0.2)
+    try:
+        for pressure in ("10", "11", "12", "13"):
+            channel.submit(["IDLE", pressure, "2.5", "0", "0", "0"])
+        assert wait_for(lambda: port.packets)
+        time.sleep(0.1)
+        stats = channel.stats()
+    finally:
+        channel.close()
+    assert port.packets == ["IDLE,13,2.5,0,0,0,#1\n"]
+    assert stats["coalesced"] == 3
+
+
+def test_unacknowledged_packet_is_retried_then_superseded():
+    port = FakePort()
+    channel = CommandChannel(port.write, ack_timeout=0.05, coalesce_s=0)
+    try:
+        channel.submit(START)
+        assert wait_for(lambda: len(port.packets) >= 2)
+        assert port.packets[1] == port.packets[0]  # same seq again
+        channel.handle_frame("ACK,1")
+        channel.submit(["PAUSE_PERFUSION", "15.0", "2.5", "0", "0", "0"])
+        channel.submit(["END_PERFUSION", "15.0", "2.5", "0", "0", "0"])
+        assert wait_for(lambda: port.packets[-1].startswith("END_PERFUSION"))
+        stats = channel.stats()
+    finally:
+        channel.close()
+    assert stats["retries"] >= 1
+    assert stats["acked"] == 1
+    assert port.packets[-1].endswith(",#2\n")
+
+
+def test_firmware_without_acks_falls_back_to_plain_sends():
+    port = FakePort()
+    channel = CommandChannel(port.write, ack_timeout=0.02, max_retries=1, coalesce_s=0)
+    try:
+        channel.submit(START)
+        assert wait_for(lambda: channel.acks_supported is False)
+        sent = len(port.packets)
+        channel.submit(["END_PERFUSION", "15.0", "2.5", "0", "0", "0"])
+        assert wait_for(lambda: len(port.packets) == sent + 1)
+        time.sleep(0.1)
+        stats = channel.stats()
+    finally:
+        channel.close()
+    assert sent == 2  # first send + one retry
+    assert len(port.packets) == 3  # no retries once the firmware is known not to answer
+    assert stats["failed"] == 1
+    assert "does not acknowledge" in command_stats_text(stats)
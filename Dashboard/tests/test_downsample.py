@@ -0,0 +1,104 @@
+# test_downsample.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import sqlite3
+import time
+import numpy as np
+from downsample import (lttb, minmax, downsample, read_series, series_span, choose_resolution,
+                        read_overview)
+from save_data import SensorDatabase, rebuild_rollups
+
+
+def test_lttb_keeps_ends_and_spike():
+    x = np.arange(10_000, dtype=float)
+    y = np.zeros_like(x)
+    y[4321] = 50.0  # pressure spike
+    idx = lttb(x, y, 200)
+    assert len(idx) == 200
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 4321 in idx
+
+
+def test_minmax_keeps_extremes_in_order():
+    x = np.arange(10_001, dtype=float)
+    y = np.sin(x / 300)
+    y[777] = -5.0
+    y[9000] = 5.0
+    idx = minmax(x, y, 100)
+    assert len(idx) <= 100
+    assert np.all(np.diff(idx) > 0)
+    assert {777, 9000} <= set(idx.tolist())
+
+
+def test_short_series_untouched():
+    x = np.arange(50.0)
+    assert lttb(x, x, 1000).tolist() == list(range(50))
+    assert minmax(x, x, 1000).tolist() == list(range(50))
+
+
+def test_downsample_per_series():
+    x = np.arange(5000.0)
+    out = downsample(x, {"a": np.sin(x), "b": np.cos(x)}, max_points=300)
+    assert set(out) == {"a", "b"}
+    for xs, ys in out.values():
+        assert len(xs) == len(ys) == 300
+
+
+def test_read_series_time_range(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path)
+    for i in range(5):
+        db.insert_reading([1, 0, 45.0, 22.0, 712.5, 30, float(i), 15.0, 0.5])
+    now = time.time()
+
+    series = read_series(db_path)
+    assert series["current_pressure"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert series["target_pressure"].tolist() == [15.0] * 5
+    assert abs(series["timestamp"][-1] - now) < 5  # epoch seconds, not local wall time
+
+    assert len(read_series(db_path, start=now + 60)["timestamp"]) == 0
+    assert len(read_series(db_path, start=now - 60, end=now + 60)["current_pressure"]) == 5
+
+
+def test_series_span(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path)
+    assert series_span(db_path) is None
+    db.insert_reading([1, 0, 45.0, 22.0, 712.5, 30, 1.0, 15.0, 0.5])
+    first, last = series_span(db_path)
+    assert first == last and abs(first - time.time()) < 5
+
+
+def test_choose_resolution():
+    assert choose_resolution(0, 600, 1000) == 1
+    assert choose_resolution(0, 6 * 3600, 1000) == 60
+    assert choose_resolution(0, 30 * 86400, 1000) == 3600  # coarsest, even if over budget
+
+
+def test_read_overview_switches_to_rollups(tmp_path):
+    db_path = tmp_path / "long.db"
+    SensorDatabase(database_path=db_path)
+    start = 1_699_999_200  # on an hour boundary
+    with sqlite3.connect(db_path) as conn:  # 3 h at 1 Hz
+        conn.executemany(
+            "INSERT INTO sensor_readings (timestamp, current_pressure, target_pressure, motor_speed) "
+            "VALUES (?, ?, 15.0, 0.5)",
+            [((start + i) * 1_000_000, float(i % 60)) for i in range(3 * 3600)])
+        rebuild_rollups(conn)
+
+    overview = read_overview(db_path, start=start, end=start + 3 * 3600 - 1, max_points=100)
+    assert overview["resolution"] == 3600
+    assert overview["timestamp"].tolist() == [start, start + 3600, start + 7200]
+    assert overview["count"].tolist() == [3600] * 3
+    assert overview["current_pressure"].tolist() == [29.5] * 3
+    assert overview["current_pressure_min"].tolist() == [0.0] * 3
+    assert overview["current_pressure_max"].tolist() == [59.0] * 3
+
+    assert read_overview(db_path, start=start, end=start + 3 * 3600 - 1, max_points=1000)["resolution"] == 60
+
+    # a short zoom has few enough readings to draw raw
+    zoom = read_overview(db_path, start=start + 60, end=start + 119, max_points=100)
+    assert zoom["resolution"] == 0
+    assert zoom["current_pressure"].tolist() == [float(i) for i in range(60)]
@@ -0,0 +1,64 @@
+# test_frame_decoder.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from frame_decoder import FrameDecoder
+
+
+def test_frames_split_across_chunks():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"<1, 0, 45.0") == []
+    assert decoder.feed(b", 15.0><0, 0") == [b"1, 0, 45.0, 15.0"]
+    assert decoder.feed(b">") == [b"0, 0"]
+    assert decoder.pending() == 0
+
+
+def test_junk_before_frame_is_discarded():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"\x00\xffnoise<OK>\r\n<1, 1>") == [b"OK", b"1, 1"]
+    assert decoder.discarded_bytes == len(b"\x00\xffnoise") + len(b"\r\n")
+
+
+def test_truncated_frame_resyncs_on_next_start():
+    decoder = FrameDecoder()
+    assert decoder.feed(b"<1, 0, 45<1, 0, 46>") == [b"1, 0, 46"]
+    assert decoder.truncated_frames == 1
+
+
+def test_oversized_frame_is_dropped():
+    decoder = FrameDecoder(max_frame_size=8)
+    assert decoder.feed(b"<" + b"x" * 20) == []
+    assert decoder.feed(b"yyy><ok>") == [b"ok"]
+    assert decoder.oversized_frames == 1
+
+
+def test_many_backed_up_frames():
+    decoder = FrameDecoder()
+    stream = b"".join(b"<%d, 0>" % i for i in range(5000))
+    frames = []
+    for i in range(0, len(stream), 55):
+        frames.extend(decoder.feed(stream[i:i + 55]))
+    assert len(frames) == 5000
+    assert frames[-1] == b"4999, 0"
+
+
+def test_dropped_oversized_frame_counts_every_byte():
+    decoder = FrameDecoder(max_frame_size=8)
+    assert decoder.feed(b"<" + b"x" * 20) == []
+    assert decoder.feed(b"yyy><ok>") == [b"ok"]
+    assert decoder.discarded_bytes == 1 + 20 + 3 + 1  # `<`, the payload so far, its rest and `>`
+
+
+def test_statistics_do_not_depend_on_chunking():
+    stream = b"\x00<1, 0>\r\n<2, 0<3, 0>>junk<" + b"x" * 40 + b"><4, 0>\r\n<5,"
+    whole = FrameDecoder(max_frame_size=16)
+    frames = whole.feed(stream)
+    assert frames == [b"1, 0", b"3, 0", b"4, 0"]
+    for size in (1, 2, 3, 7, 55):
+        decoder = FrameDecoder(max_frame_size=16)
+        chunked = []
+        for i in range(0, len(stream), size):
+            chunked.extend(decoder.feed(stream[i:i + size]))
+        assert chunked == frames
+        assert (decoder.discarded_bytes, decoder.truncated_frames, decoder.oversized_frames, decoder.pending()) == \
+               (whole.discarded_bytes, whole.truncated_frames, whole.oversized_frames, whole.pending())
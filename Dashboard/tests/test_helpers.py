@@ -24,13 +24,13 @@ def test_make_db_filename():
 def test_file_creation(tmp_path):
     # Patch the base directory used in make_db_filename if it uses a BASE_DIR or similar variable
     with patch("dashboard.DB_DIR", tmp_path):
-        filename = make_db_filename()
-        full_path = tmp_path / filename
-        
+        full_path = make_db_filename("rig1")
+
         # Create dummy file
         full_path.parent.mkdir(parents=True, exist_ok=True)
         full_path.touch()
-        
+
         assert full_path.exists()
-        assert "perfusion_" in filename
-        assert filename.endswith(".db")
\ No newline at end of file
+        assert full_path.parent == tmp_path
+        assert full_path.name.startswith("perfusion_rig1_")
+        assert full_path.suffix == ".db"
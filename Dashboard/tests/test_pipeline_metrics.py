@@ -0,0 +1,74 @@
+# test_pipeline_metrics.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import pickle
+import urllib.request
+from pipeline_metrics import MetricsRegistry, render, serve_metrics, timed
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = MetricsRegistry(rig="rig1")
+    stage = metrics.stage("parse")
+    for value in (0.00005, 0.0003, 0.0003, 0.2, 30.0):
+        stage.observe(value)
+    text = render([metrics.snapshot()])
+    assert "# TYPE perfusion_stage_seconds histogram" in text
+    assert 'perfusion_stage_seconds_bucket{rig="rig1",stage="parse",le="0.0001"} 1' in text
+    assert 'perfusion_stage_seconds_bucket{rig="rig1",stage="parse",le="0.0005"} 3' in text
+    assert 'perfusion_stage_seconds_bucket{rig="rig1",stage="parse",le="10.0"} 4' in text
+    assert 'perfusion_stage_seconds_bucket{rig="rig1",stage="parse",le="+Inf"} 5' in text
+    assert 'perfusion_stage_seconds_count{rig="rig1",stage="parse"} 5' in text
+
+
+def test_metrics_are_created_once_per_name_and_labels():
+    metrics = MetricsRegistry()
+    assert metrics.stage("parse") is metrics.stage("parse")
+    assert metrics.stage("parse") is not metrics.stage("store")
+    counter = metrics.counter("perfusion_frames_total", "Frames", result="stored")
+    counter.inc()
+    counter.inc(2)
+    assert render([metrics.snapshot()]).count("# TYPE perfusion_stage_seconds histogram") == 1
+    assert 'perfusion_frames_total{result="stored"} 3.0' in render([metrics.snapshot()])
+
+
+def test_function_gauges_and_snapshots_of_several_rigs():
+    depth = [0]
+    rigs = [MetricsRegistry(rig=f"rig{i}") for i in (1, 2)]
+    for rig in rigs:
+        rig.gauge("perfusion_queue_depth", "Items waiting", function=lambda: depth[0], queue="writer")
+    rigs[1].gauge("perfusion_broken", "Gone", function=lambda: 1 / 0)  # left out, not an error
+    depth[0] = 7
+    snapshots = [pickle.loads(pickle.dumps(rig.snapshot())) for rig in rigs]  # as sent by a worker process
+    text = render(snapshots)
+    assert text.count("# HELP perfusion_queue_depth") == 1
+    assert 'perfusion_queue_depth{rig="rig1",queue="writer"} 7.0' in text
+    assert 'perfusion_queue_depth{rig="rig2",queue="writer"} 7.0' in text
+    assert "perfusion_broken" not in text
+
+
+def test_timed_decorator():
+    metrics = MetricsRegistry()
+    histogram = metrics.histogram("perfusion_fragment_seconds", "Fragment run time", fragment="plot")
+
+    @timed(histogram)
+    def plot(x):
+        return x * 2
+
+    assert plot(21) == 42
+    assert plot.__name__ == "plot"
+    assert histogram.count == 1
+
+
+def test_serve_metrics():
+    metrics = MetricsRegistry()
+    metrics.counter("perfusion_frames_total", "Frames").inc(5)
+    server = serve_metrics(lambda: [metrics.snapshot()], port=0)
+    assert server.server_address[0] == "127.0.0.1"  # local scrapers only by default
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(url + "/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "perfusion_frames_total 5.0" in response.read().decode()
+    finally:
+        server.shutdown()
@@ -0,0 +1,58 @@
+# test_serial_reader.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import queue
+import time
+import tty
+from serial import Serial
+from serial_reader import SerialReader
+
+
+def test_frames_delivered_to_queue_and_callback():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    ser = Serial(port=os.ttyname(slave), baudrate=115200, timeout=0.1)
+    seen = []
+    frames = queue.Queue()
+    reader = SerialReader(ser, on_frame=lambda raw, t: seen.append(raw), frame_queue=frames)
+    reader.start()
+    try:
+        sent_at = time.time()
+        os.write(master, b"junk<1, 0, 14.8>\r\n<0, 0")
+        os.write(master, b", 0.0>\r\n")
+        received_at, raw = frames.get(timeout=2)
+        assert raw == "1, 0, 14.8"
+        assert received_at - sent_at < 0.1  # no 100 ms polling sleep in the way
+        assert frames.get(timeout=2)[1] == "0, 0, 0.0"
+        assert seen == ["1, 0, 14.8", "0, 0, 0.0"]
+    finally:
+        reader.stop(timeout=2)
+        reader.close()
+        reader.close()  # e.g. stop() and then a finally: the wake pipe is closed once
+        ser.close()
+        os.close(master)
+        os.close(slave)
+    assert not reader._thread.is_alive()
+
+
+def test_lost_port_ends_the_reader():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    ser = Serial(port=os.ttyname(slave), baudrate=115200, timeout=0.1)
+    lost = queue.Queue()
+    frames = queue.Queue()
+    reader = SerialReader(ser, frame_queue=frames, on_lost=lost.put)
+    reader.start()
+    try:
+        os.write(master, b"<1, 0, 14.8>\r\n")
+        assert frames.get(timeout=2)[1] == "1, 0, 14.8"
+        os.close(master)  # the USB adapter is unplugged: reads now fail with EIO
+        error = lost.get(timeout=2)
+        assert isinstance(error, OSError) and reader.lost is error
+        reader._thread.join(timeout=2)
+        assert not reader._thread.is_alive()
+    finally:
+        reader.close()
+        ser.close()
+        os.close(slave)
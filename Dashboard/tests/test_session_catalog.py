@@ -0,0 +1,93 @@
+# test_session_catalog.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import sqlite3
+from ingest_journal import journal_path
+from save_data import SensorDatabase
+from session_catalog import CATALOG_NAME, SessionCatalog, rig_from_filename, summarize
+
+
+def make_session(db_dir, name, pressures, target=15.0):
+    db_path = db_dir / name
+    db = SensorDatabase(database_path=db_path)
+    for p in pressures:
+        db.insert_values((1, 0, 45.0, 22.0, 712.5, 30, p, target, 0.5))
+    return db_path
+
+
+def test_rig_from_filename():
+    assert rig_from_filename("perfusion_rig2_20250601_101500.db") == "rig2"
+    assert rig_from_filename("/x/perfusion_20250601_101500.db") is None
+
+
+def test_summarize_from_rollups_and_raw(tmp_path):
+    db_path = make_session(tmp_path, "perfusion_rig1_20250601_101500.db", [10.0, 20.0, 30.0])
+    summary = summarize(db_path)
+    assert summary["rig_id"] == "rig1" and summary["rows"] == 3
+    assert (summary["current_pressure_min"], summary["current_pressure_max"]) == (10.0, 30.0)
+    assert summary["current_pressure_mean"] == 20.0
+    assert summary["setpoints"] == "[15.0]"
+    assert summary["started_at"] <= summary["ended_at"]
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE sensor_rollups")  # a file recorded before the rollups
+    assert {k: v for k, v in summarize(db_path).items() if k != "file_mtime"} == \
+        {k: v for k, v in summary.items() if k != "file_mtime"}
+
+
+def test_opened_then_closed(tmp_path):
+    catalog = SessionCatalog(tmp_path / CATALOG_NAME)
+    db_path = make_session(tmp_path, "perfusion_rig1_20250601_101500.db", [])
+    catalog.session_opened(db_path, "rig1", 1000.0, "controller-2")
+    session = catalog.get(db_path)
+    assert session["ended_at"] is None and session["rows"] == 0 and session["firmware"] == "controller-2"
+
+    SensorDatabase(database_path=db_path).insert_values((1, 0, 45.0, 22.0, 712.5, 30, 14.0, 15.0, 0.5))
+    catalog.session_closed(db_path, 2000.0)
+    session = catalog.get(db_path)
+    assert session["rows"] == 1 and session["ended_at"] == 2000.0
+    assert session["firmware"] == "controller-2"  # kept from the opening
+    assert session["setpoints"] == [15.0]
+
+
+def test_rebuild_indexes_changed_files_only(tmp_path):
+    for i in range(6):
+        make_session(tmp_path, f"perfusion_rig{i % 2 + 1}_2025060{i + 1}_101500.db", [float(i)])
+    catalog = SessionCatalog(tmp_path / CATALOG_NAME)
+    assert catalog.rebuild(tmp_path, workers=3) == 6
+    assert catalog.rebuild(tmp_path) == 0  # nothing changed
+
+    assert len(catalog.sessions()) == 6
+    rig2 = catalog.sessions(rig_id="rig2")
+    assert [s["current_pressure_max"] for s in rig2] in ([1.0, 3.0, 5.0], [5.0, 3.0, 1.0])
+    assert len(catalog.sessions(limit=2)) == 2
+
+    (tmp_path / "perfusion_rig1_20250601_101500.db").unlink()
+    make_session(tmp_path, "perfusion_rig2_20250602_101500.db", [9.0])
+    assert catalog.rebuild(tmp_path) == 1
+    assert len(catalog.sessions()) == 5
+    with sqlite3.connect(tmp_path / CATALOG_NAME) as conn:
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM sessions WHERE rig_id = 'rig1' ORDER BY started_at DESC"))
+    assert "idx_sessions_rig" in plan
+
+
+def test_rebuild_leaves_recording_sessions_open(tmp_path):
+    catalog = SessionCatalog(tmp_path / CATALOG_NAME)
+    opened = make_session(tmp_path, "perfusion_rig1_20250601_101500.db", [])
+    catalog.session_opened(opened, "rig1", 1000.0)
+    SensorDatabase(database_path=opened).insert_values((1, 0, 45.0, 22.0, 712.5, 30, 14.0, 15.0, 0.5))
+    journaled = make_session(tmp_path, "perfusion_rig2_20250601_101500.db", [12.0])
+    journal_path(journaled).touch()  # a recorder elsewhere is still writing it
+
+    assert catalog.rebuild(tmp_path) == 2
+    for db_path in (opened, journaled):
+        session = catalog.get(db_path)
+        assert session["rows"] == 1 and session["ended_at"] is None
+
+    catalog.session_closed(opened, 2000.0)
+    journal_path(journaled).unlink()
+    assert catalog.rebuild(tmp_path, force=True) == 2
+    assert catalog.get(opened)["ended_at"] is not None
+    assert catalog.get(journaled)["ended_at"] is not None
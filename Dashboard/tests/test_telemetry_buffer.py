@@ -0,0 +1,54 @@
+# test_telemetry_buffer.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+from telemetry_buffer import TelemetryBuffer
+
+
+def values(i):
+    return [1, 0, 45.0, 22.0, 712.5, 30, float(i), 15.0, 0.5]
+
+
+def test_last_rows_after_wrap_are_contiguous_views():
+    buf = TelemetryBuffer(capacity=8)
+    for i in range(21):
+        buf.append(1000.0 + i, values(i))
+
+    assert len(buf) == 8
+    assert buf.total == 21
+    pressure = buf.column("current_pressure")
+    assert pressure.tolist() == [float(i) for i in range(13, 21)]
+    assert np.shares_memory(pressure, buf._columns["current_pressure"])  # view, no copy
+    assert buf.last(3)["timestamp"].tolist() == [1018.0, 1019.0, 1020.0]
+
+
+def test_time_window():
+    buf = TelemetryBuffer(capacity=100)
+    for i in range(50):
+        buf.append(1000.0 + i * 0.5, values(i))
+    window = buf.window(5.0)  # newest row at t=1024.5
+    assert window["timestamp"][0] == 1019.5
+    assert len(window["current_pressure"]) == 11
+    assert len(buf.window(5.0, now=2000.0)["timestamp"]) == 0
+
+
+def test_append_frame_rejects_malformed():
+    buf = TelemetryBuffer(capacity=4)
+    assert buf.append_frame(["1", "0", "45.0", "22.0", "712.5", "30", "14.8", "15.0", "0.1"], 1.0)
+    assert not buf.append_frame(["OK"], 2.0)
+    assert not buf.append_frame(["1", "0", "x"], 3.0)
+    assert len(buf) == 1
+    assert buf.last(1)["perfusion_state"].dtype == np.int16
+    assert len(TelemetryBuffer(capacity=4).last(5)["timestamp"]) == 0
+
+
+def test_between():
+    buf = TelemetryBuffer(capacity=10)
+    for i in range(25):
+        buf.append(1000.0 + i, values(i))
+    rows = buf.between(1017.0, 1019.5, columns=("timestamp",))
+    assert rows["timestamp"].tolist() == [1017.0, 1018.0, 1019.0]
+    assert len(buf.between(start=1022.0)["timestamp"]) == 3
+    assert len(buf.between(end=1016.5)["timestamp"]) == 2
+    assert len(buf.between(2000.0, 3000.0)["timestamp"]) == 0
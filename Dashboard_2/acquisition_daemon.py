@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Headless acquisition daemon: owns the rigs' serial ports, session databases and command
+channels, and serves them to any number of dashboards over a local Unix socket. Restarting a
+dashboard, or a page that keeps its callbacks busy, never pauses the capture: every rig is still
+read, decoded and stored by its own acquisition_worker process (rig.py), as in dashboard_2.py.
+
+    python Dashboard_2/acquisition_daemon.py
+    PERFUSION_DAEMON_SOCKET=~/Downloads/Perfusion_System/acquisition.sock python Dashboard_2/dashboard_2.py
+    PERFUSION_DAEMON_SOCKET=~/Downloads/Perfusion_System/acquisition.sock streamlit run Dashboard/dashboard.py
+
+The protocol is described in daemon_client.py. An attaching UI first gets the rig's state (port,
+frame schema, command statistics, pipeline metrics), then the last BACKLOG_FRAMES frames it has
+not seen, then every new frame. A UI that falls CLIENT_QUEUE events behind is disconnected
+rather than slowing the others; it reattaches and resumes from its last frame.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from rig import WORKER_METRICS_INTERVAL, acquisition_worker, find_rig_ports, recover_sessions
+from daemon_client import DEFAULT_SOCKET, request
+from session_catalog import CATALOG_NAME
+from pipeline_metrics import serve_metrics
+
+
+DB_DIR = Path(os.path.expanduser("~/Downloads/Perfusion_System/databases"))
+RIG_MAX = 4
+STORE_SETTINGS = {
+    "store_all_frames": True,  # False = only the first frame of every 1/store_rate_hz s is stored
+    "store_rate_hz": 1.0,
+    "batch_size": 200,  # Rows per SQLite commit
+    "flush_interval": 1.0,  # Max seconds a row waits for its commit
+    "journal": True,  # Journal rows before they are queued, so a crash loses none
+}
+BACKLOG_FRAMES = 30000  # recent frames replayed to an attaching UI (10 min at 50 Hz)
+CLIENT_QUEUE = 10000  # events a UI may fall behind before it is disconnected
+RESTART_INTERVAL = 5.0  # seconds between attempts to reopen a rig whose port is gone
+
+_LINK_EVENTS = ("connected", "disconnected")
+_STATE_EVENTS = ("link", "schema", "commands", "metrics", "store")  # replayed to every UI that attaches
+
+
+def _encode(event):
+    return json.dumps(event).encode() + b"\n"
+
+
+class _Client:
+    """One attached UI: events are queued here and written by the client's own thread."""
+
+    def __init__(self, sock, name, maxsize):
+        self.sock = sock
+        self.name = name
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._send_loop, name=f"client-{name}", daemon=True)
+        self._thread.start()
+
+    def send(self, line):
+        """Queue one encoded event; False if the client is too far behind (or gone)."""
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            return False
+        return self._thread.is_alive()
+
+    def _send_loop(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            try:
+                self.sock.sendall(line)
+            except OSError:
+                return
+
+    def close(self):
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)  # the handler's read ends too
+        except OSError:
+            pass
+
+
+class DaemonRig:
+    """
+    One rig run by the daemon: its acquisition_worker process (restarted while the port is
+    gone, and when it is lost mid-run), the events it sends, fanned out to the attached
+    clients, and their backlog.
+    """
+
+    def __init__(self, rig_id, port, db_dir, store_settings, metrics_interval=WORKER_METRICS_INTERVAL,
+                 backlog=BACKLOG_FRAMES, client_queue=CLIENT_QUEUE):
+        self.rig_id = rig_id
+        self.port = port
+        self.db_dir = Path(db_dir)
+        self.store_settings = store_settings
+        self.metrics_interval = metrics_interval
+        self.frames = 0
+        self.state = {}  # _STATE_EVENTS kind → encoded last event of that kind
+        self.metrics = []  # last MetricsRegistry.snapshot() of the worker
+        self.backlog = deque(maxlen=backlog)  # (seq, encoded frame event)
+        # Frames are numbered, not resumed by received_at, which all frames of one read chunk
+        # share. Counting on from the clock (us) keeps the numbers growing across daemon
+        # restarts, so an after_seq of an earlier run never hides the frames of this one.
+        self._seq = time.time_ns() // 1000
+        self.client_queue = client_queue
+        self.clients = set()
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._commands = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return f"DaemonRig({self.rig_id!r}, {self.port!r})"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"rig-{self.rig_id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the worker; it closes the open session as a UI-driven Rig.stop() does."""
+        self._stop.set()
+        worker, commands = self._worker, self._commands
+        if worker is not None:
+            commands.put(None)
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._lock:
+            for client in self.clients:
+                client.close()
+            self.clients.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            events, self._commands = self._ctx.Queue(), self._ctx.Queue()
+            self._worker = self._ctx.Process(
+                target=acquisition_worker, name=f"rig-{self.rig_id}", daemon=True,
+                args=(self.rig_id, self.port, str(self.db_dir), events, self._commands, self.store_settings,
+                      self.metrics_interval))
+            self._worker.start()
+            self._pump(events)
+            self._worker.join()
+            self._stop.wait(RESTART_INTERVAL)
+
+    def _pump(self, events):
+        while True:
+            try:
+                event = events.get(timeout=1.0)
+            except queue.Empty:
+                if not self._worker.is_alive():
+                    self.publish(("disconnected", self.port))
+                    return
+                continue
+            self.publish(event)
+            if event[0] == "disconnected":
+                return
+
+    def publish(self, event):
+        """Remember `event` for clients still to attach and send it to the attached ones."""
+        kind = event[0]
+        line = _encode(event) if kind != "frame" else None
+        with self._lock:
+            if kind == "frame":
+                self.frames += 1
+                self._seq += 1
+                line = _encode(tuple(event) + (self._seq,))  # clients resume after the last seq they got
+                self.backlog.append((self._seq, line))
+            elif kind in _LINK_EVENTS:
+                self.state["link"] = line
+            elif kind in _STATE_EVENTS:
+                self.state[kind] = line
+                if kind == "metrics":
+                    self.metrics = event[1]
+            for client in [c for c in self.clients if not c.send(line)]:
+                print(f"[{self.rig_id}] {client.name} is too far behind, disconnecting it")
+                self.clients.discard(client)
+                client.close()
+
+    def attach(self, sock, name, after_seq=None):
+        """
+        Send the rig's state and the backlog frames numbered after `after_seq` to the client on
+        `sock`, then every event. Returns the client, for detach().
+        """
+        client = _Client(sock, name, self.backlog.maxlen + self.client_queue)
+        with self._lock:
+            for kind in _STATE_EVENTS:
+                if kind in self.state:
+                    client.send(self.state[kind])
+            for seq, line in self.backlog:
+                if after_seq is None or seq > after_seq:
+                    client.send(line)
+            self.clients.add(client)
+        return client
+
+    def detach(self, client):
+        with self._lock:
+            self.clients.discard(client)
+        client.close()
+
+    def submit(self, cmd_history):
+        """Queue commands for the worker's CommandChannel (dropped while the port is gone)."""
+        if self._worker is not None and self._worker.is_alive():
+            self._commands.put(list(cmd_history))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.acquisition
+        rig = client = None
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                    op = message["op"]
+                except (ValueError, KeyError, TypeError):
+                    self._reply({"error": "expected a JSON object with an 'op'"}, client)
+                    return
+                if op == "rigs":
+                    self._reply({"rigs": {rig_id: r.port for rig_id, r in daemon.rigs.items()}}, client)
+                elif op == "attach" and client is None:
+                    rig = daemon.rigs.get(message.get("rig"))
+                    if rig is None:
+                        self._reply({"error": f"no rig {message.get('rig')!r}"})
+                        return
+                    client = rig.attach(self.request, f"client {id(self):x}", message.get("after_seq"))
+                elif op == "command" and rig is not None:
+                    rig.submit(message["commands"])
+                else:
+                    self._reply({"error": f"unexpected {op!r}"}, client)
+                    return
+        except OSError:
+            pass
+        finally:
+            if client is not None:
+                rig.detach(client)
+
+    def _reply(self, message, client=None):
+        """Once attached, the client's thread owns the socket: the reply is queued behind the events."""
+        if client is None:
+            self.wfile.write(_encode(message))
+        else:
+            client.send(_encode(message))
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class AcquisitionDaemon:
+    """The rigs on `ports` ("rig1", "rig2", ... as in dashboard_2.py), served on `socket_path`."""
+
+    def __init__(self, ports, db_dir=DB_DIR, socket_path=DEFAULT_SOCKET, store_settings=None,
+                 metrics=True, backlog=BACKLOG_FRAMES):
+        self.db_dir = Path(db_dir)
+        self.socket_path = Path(socket_path)
+        settings = dict(STORE_SETTINGS if store_settings is None else store_settings,
+                        catalog_path=self.db_dir / CATALOG_NAME)
+        self.rigs = {f"rig{i}": DaemonRig(f"rig{i}", port, self.db_dir, settings,
+                                          WORKER_METRICS_INTERVAL if metrics else None, backlog)
+                     for i, port in enumerate(ports, start=1)}
+        self.server = None
+
+    def start(self):
+        """Recover crashed sessions, start the rigs and listen on the socket (on a thread)."""
+        self.db_dir.mkdir(parents=True, exist_ok=True)
+        recover_sessions(self.db_dir, self.db_dir / CATALOG_NAME)
+        self._claim_socket()
+        self.server = _Server(str(self.socket_path), _Handler)
+        self.server.acquisition = self
+        os.chmod(self.socket_path, 0o600)  # only this user's processes may attach or send commands
+        for rig in self.rigs.values():
+            rig.start()
+        threading.Thread(target=self.server.serve_forever, name="daemon-socket", daemon=True).start()
+        return self
+
+    def _claim_socket(self):
+        if not self.socket_path.exists():
+            return
+        try:
+            request(self.socket_path, {"op": "rigs"}, timeout=1.0)
+        except OSError:
+            self.socket_path.unlink()  # left behind by a daemon that did not shut down
+        else:
+            raise RuntimeError(f"Another acquisition daemon is serving {self.socket_path}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+        for rig in self.rigs.values():
+            rig.stop()
+
+    def metrics_snapshots(self):
+        return [rig.metrics for rig in self.rigs.values()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acquire from the perfusion rigs independently of any dashboard")
+    parser.add_argument("--socket", default=str(DEFAULT_SOCKET), help=f"Unix socket to serve (default {DEFAULT_SOCKET})")
+    parser.add_argument("--db-dir", default=str(DB_DIR), help=f"Session databases (default {DB_DIR})")
+    parser.add_argument("--ports", default=None,
+                        help="Comma separated serial ports (default: PERFUSION_SERIAL_PORT(S) or a port scan)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Also serve the pipeline metrics at http://localhost:PORT/metrics")
+    parser.add_argument("--no-metrics", action="store_true", help="Do not time the pipeline")
+    parser.add_argument("--backlog", type=int, default=BACKLOG_FRAMES,
+                        help=f"Frames per rig replayed to an attaching UI (default {BACKLOG_FRAMES})")
+    args = parser.parse_args()
+
+    ports = [p.strip() for p in args.ports.split(",") if p.strip()] if args.ports else find_rig_ports(RIG_MAX)
+    if not ports:
+        sys.exit("No serial ports to acquire from.")
+    daemon = AcquisitionDaemon(ports, args.db_dir, args.socket, metrics=not args.no_metrics, backlog=args.backlog)
+    try:
+        daemon.start()
+    except RuntimeError as e:
+        sys.exit(str(e))
+    if args.metrics_port:
+        serve_metrics(daemon.metrics_snapshots, args.metrics_port, host="127.0.0.1")
+    for rig_id, rig in daemon.rigs.items():
+        print(f"{rig_id}: {rig.port}")
+    print(f"🛰  Acquisition daemon listening on {daemon.socket_path}")
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # stop as cleanly as on Ctrl+C
+    try:
+        signal.pause()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        print("Stopping: closing the open sessions...")
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Control performance of a perfusion run: how well current_pressure follows target_pressure.
+
+    settling time   per setpoint change, from the first frame with the new target until the
+                    pressure enters the band |error| <= max(band_abs, band_rel * target) for good
+                    (None if it left the band again before the next change)
+    overshoot       per setpoint change, the largest excursion past the new target in the
+                    direction of the step (mmHg and % of the step)
+    RMS error       of current_pressure - target_pressure while PERFUSING
+    valve duty      fraction of the PERFUSING time with valve_state != 0
+    above 1.3×      time with current_pressure > 1.3 × target_pressure, the threshold at which
+                    Controller_2 stops as if at the end position
+
+Times are weighted by how long each frame's values held (until the next frame, gaps longer
+than `max_gap` are left out), so a session stored at 1 Hz and one stored at 50 Hz give the same
+numbers. ControlAnalytics works on chunks of columns with NumPy and carries the open step and
+the last frame over to the next chunk, so the same object runs live on a growing session
+(update_from_buffer) and in one call over a whole recorded run (analyze_session):
+
+    python analytics.py ~/Downloads/Perfusion_System/databases/perfusion_rig1_*.db
+"""
+import argparse
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from downsample import read_series
+
+
+ANALYTICS_COLUMNS = ("perfusion_state", "valve_state", "current_pressure", "target_pressure", "motor_speed")
+SAFETY_FACTOR = 1.3  # Controller_2: current_pressure > 1.3 × target_pressure counts as end position
+PERFUSING = 1  # PerfusionState
+
+
+class ControlAnalytics:
+    def __init__(self, band_abs=0.5, band_rel=0.05, max_gap=5.0, max_steps=1000):
+        self.band_abs = band_abs  # mmHg
+        self.band_rel = band_rel  # of the target
+        self.max_gap = max_gap  # seconds
+        self.steps = deque(maxlen=max_steps)  # finished setpoint changes, oldest first
+        self._open = None  # the setpoint change still in progress
+        self._last = None  # last frame; its values hold until the first frame of the next chunk
+        self.position = None  # TelemetryBuffer.total consumed by update_from_buffer()
+
+        # ∫ dt over the PERFUSING time
+        self.samples = 0
+        self.active_s = 0.0
+        self.sq_error_s = 0.0
+        self.abs_error_s = 0.0
+        self.valve_open_s = 0.0
+        self.above_threshold_s = 0.0
+        self.motor_speed_s = 0.0
+
+    # --- input ---
+    def update(self, series):
+        """Add frames, as {column: array} with "timestamp" (epoch s) and ANALYTICS_COLUMNS."""
+        n = len(series["timestamp"])
+        if not n:
+            return self
+        names = ("timestamp",) + ANALYTICS_COLUMNS
+        columns = {name: np.asarray(series[name], dtype=np.float64) for name in names}
+        if self._last is not None:
+            columns = {name: np.concatenate(([self._last[name]], columns[name])) for name in names}
+        t = columns["timestamp"]
+        pressure = columns["current_pressure"]
+        target = columns["target_pressure"]
+        error = pressure - target
+
+        # Each frame holds until the next one; the last frame of the chunk waits for the next chunk
+        dt = np.diff(t)
+        dt[(dt < 0) | (dt > self.max_gap)] = 0.0
+        weight = np.where(columns["perfusion_state"][:-1] == PERFUSING, dt, 0.0)
+        held_error = error[:-1]
+        self.samples += n
+        self.active_s += weight.sum()
+        self.sq_error_s += weight @ (held_error * held_error)
+        self.abs_error_s += weight @ np.abs(held_error)
+        self.valve_open_s += weight[columns["valve_state"][:-1] != 0].sum()
+        self.above_threshold_s += weight[pressure[:-1] > SAFETY_FACTOR * target[:-1]].sum()
+        self.motor_speed_s += weight @ columns["motor_speed"][:-1]
+
+        self._update_steps(t, target, error)
+        self._last = {name: columns[name][-1] for name in names}
+        return self
+
+    def _update_steps(self, t, target, error):
+        n = len(t)
+        outside = np.abs(error) > np.maximum(self.band_abs, self.band_rel * np.abs(target))
+        changes = np.flatnonzero(target[1:] != target[:-1]) + 1
+        starts = np.concatenate(([0], changes))
+        ends = np.append(changes, n)
+        # Per segment of constant target: direction of its step, largest excursion past the
+        # target in that direction, and the last frame outside the band (-1 if none)
+        direction = np.sign(target[starts] - target[np.maximum(starts - 1, 0)])
+        if self._open is not None:
+            direction[0] = self._open["direction"]  # segment 0 continues the open step
+        excursion = np.repeat(direction, ends - starts) * error
+        max_excursion = np.maximum.reduceat(excursion, starts)
+        last_outside = np.maximum.reduceat(np.where(outside, np.arange(n), -1), starts)
+
+        for k, start in enumerate(starts.tolist()):  # one iteration per setpoint change, not per frame
+            if k:
+                if self._open is not None:
+                    self.steps.append(self._open)
+                self._open = {"t": float(t[start]), "from": float(target[start - 1]), "to": float(target[start]),
+                              "direction": direction[k], "overshoot": 0.0, "settled_at": None}
+            step = self._open
+            if step is None:
+                continue  # frames before the first setpoint change of the data
+            step["overshoot"] = max(step["overshoot"], float(max_excursion[k]))
+            if last_outside[k] >= 0:
+                settle = last_outside[k] + 1
+                step["settled_at"] = float(t[settle]) if settle < ends[k] else None
+            elif step["settled_at"] is None:
+                step["settled_at"] = float(t[start])
+
+    def start_at(self, buffer):
+        """Make update_from_buffer() skip the rows `buffer` holds now, e.g. when a session starts."""
+        self.position = buffer.total
+        return self
+
+    def update_from_buffer(self, buffer):
+        """Add the rows a TelemetryBuffer received since the previous call (live sessions)."""
+        total = buffer.total
+        new = total if self.position is None else total - self.position
+        self.position = total
+        if new > 0:
+            self.update(buffer.last(new, ("timestamp",) + ANALYTICS_COLUMNS))
+        return self
+
+    # --- output ---
+    @staticmethod
+    def _step_view(step, done):
+        size = abs(step["to"] - step["from"])
+        settling = None if step["settled_at"] is None else step["settled_at"] - step["t"]
+        return {"t": step["t"], "from": step["from"], "to": step["to"], "settling_time_s": settling,
+                "overshoot": step["overshoot"], "overshoot_pct": 100 * step["overshoot"] / size if size else None,
+                "in_progress": not done}
+
+    def summary(self):
+        active = self.active_s
+        steps = [self._step_view(step, True) for step in self.steps]
+        if self._open is not None:
+            steps.append(self._step_view(self._open, False))
+        settled = [s["settling_time_s"] for s in steps if s["settling_time_s"] is not None and not s["in_progress"]]
+        overshoots = [s["overshoot_pct"] for s in steps if s["overshoot_pct"] is not None]
+        return {
+            "samples": self.samples,
+            "active_s": float(active),
+            "rms_error": math.sqrt(self.sq_error_s / active) if active else None,
+            "mean_abs_error": self.abs_error_s / active if active else None,
+            "valve_duty": self.valve_open_s / active if active else None,
+            "above_threshold_s": self.above_threshold_s,
+            "above_threshold_fraction": self.above_threshold_s / active if active else None,
+            "mean_motor_speed": self.motor_speed_s / active if active else None,
+            "steps": steps,
+            "median_settling_s": float(np.median(settled)) if settled else None,
+            "max_overshoot_pct": max(overshoots) if overshoots else None,
+        }
+
+
+def analyze_series(series, **settings):
+    return ControlAnalytics(**settings).update(series).summary()
+
+
+def analyze_session(database_path, start=None, end=None, **settings):
+    """Summary of a recorded session database (or of start..end of it, epoch seconds)."""
+    return analyze_series(read_series(database_path, ANALYTICS_COLUMNS, start, end), **settings)
+
+
+def analyze_sessions(paths, workers=None, **settings):
+    """Summaries of many sessions, read and computed on a thread pool (SQLite and NumPy release the GIL)."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(lambda path: analyze_session(path, **settings), paths)))
+
+
+def summary_text(summary):
+    """One line for the dashboards, e.g. 'RMS error 0.42 mmHg · valve 37% · > 1.3× target 0 s · ...'."""
+    if not summary or not summary["active_s"]:
+        return "Control: not perfusing yet"
+    text = (f"Control: RMS error {summary['rms_error']:.2f} mmHg · valve open {summary['valve_duty']:.0%} · "
+            f"> {SAFETY_FACTOR:g}× target {summary['above_threshold_s']:.0f} s")
+    done = [s for s in summary["steps"] if not s["in_progress"]]
+    last = summary["steps"][-1] if summary["steps"] else None
+    if last is not None:
+        settling = last["settling_time_s"]
+        text += (f" · last step {last['from']:g}→{last['to']:g} mmHg "
+                 + ("settling" if settling is None else f"settled in {settling:.1f} s"))
+        if last["overshoot_pct"] is not None:
+            text += f", overshoot {last['overshoot_pct']:.0f}%"
+    if done and summary["median_settling_s"] is not None:
+        text += f" · median settling {summary['median_settling_s']:.1f} s over {len(done)} steps"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Control performance of recorded perfusion sessions.")
+    parser.add_argument("sessions", nargs="+", help="Session databases")
+    parser.add_argument("--band", type=float, default=0.5, help="Settling band in mmHg (at least)")
+    parser.add_argument("--band-rel", type=float, default=0.05, help="Settling band as a fraction of the target")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    results = analyze_sessions(args.sessions, args.workers, band_abs=args.band, band_rel=args.band_rel)
+    for path, summary in results.items():
+        print(f"{path}\n  {summary_text(summary)}")
+        for step in summary["steps"]:
+            settling = "not settled" if step["settling_time_s"] is None else f"{step['settling_time_s']:.1f} s"
+            overshoot = "" if step["overshoot_pct"] is None else f", overshoot {step['overshoot']:.2f} mmHg ({step['overshoot_pct']:.0f}%)"
+            print(f"    {step['from']:g} → {step['to']:g} mmHg: {settling}{overshoot}")
+
+
+if __name__ == "__main__":
+    main()
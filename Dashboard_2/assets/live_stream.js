@@ -0,0 +1,89 @@
+// Live updates pushed by the /live Server-Sent Events endpoint of dashboard_2.py.
+// New rows and log lines are merged into the page with dash_clientside.set_props, so the
+// server no longer rebuilds the table for every open tab every second. While the stream is
+// down the 1 s interval polling is switched back on. The stream belongs to the rig picked in
+// the rig selector; dashboard_2.py calls window.perfusionLive.connect(rigId) when it changes.
+(function () {
+    var MAX_ROWS = 10;   // same as Rig.table_size in rig.py
+    var MAX_LOG = 15;    // same as Rig.log_size
+    var rows = [];
+    var log = [];
+    var source = null;
+
+    function setProps(id, props) {
+        if (document.getElementById(id)) {
+            window.dash_clientside.set_props(id, props);
+        }
+    }
+
+    function renderRows() {
+        setProps('data-table', {data: rows});
+    }
+
+    function renderLog() {
+        var box = document.getElementById('show-log-checkbox');
+        var children = [];
+        if (box && box.checked) {
+            children = log.map(function (line) {
+                return {type: 'P', namespace: 'dash_html_components', props: {children: line[0] + ' → ' + line[1]}};
+            });
+        }
+        setProps('serial-log-output', {children: children});
+    }
+
+    function setPolling(enabled) {
+        setProps('interval-live-update', {disabled: !enabled});
+    }
+
+    function connect(rigId) {
+        if (source) {
+            source.close();
+            source = null;
+        }
+        rows = [];
+        log = [];
+        if (!rigId || !window.EventSource) {
+            setPolling(true);
+            return;
+        }
+        source = new EventSource('/live?rig=' + encodeURIComponent(rigId));
+
+        source.addEventListener('open', function () {
+            setPolling(false);
+        });
+        source.addEventListener('error', function () {
+            // EventSource reconnects by itself; poll in the meantime
+            setPolling(true);
+        });
+        source.addEventListener('snapshot', function (e) {
+            var data = JSON.parse(e.data);
+            rows = data.rows;
+            log = data.log;
+            renderRows();
+            renderLog();
+            setProps('ingest-stats', {children: data.stats});
+        });
+        source.addEventListener('row', function (e) {
+            var row = JSON.parse(e.data);
+            if (rows.length && row.t <= rows[0].t) {
+                return;  // already part of the snapshot
+            }
+            rows.unshift(row);
+            rows.length = Math.min(rows.length, MAX_ROWS);
+            renderRows();
+        });
+        source.addEventListener('log', function (e) {
+            var data = JSON.parse(e.data);
+            log.unshift(data.line);
+            log.length = Math.min(log.length, MAX_LOG);
+            renderLog();
+            setProps('ingest-stats', {children: data.stats});
+        });
+        source.addEventListener('commands', function (e) {
+            // a command was acknowledged (or given up on): refresh the counters line
+            setProps('ingest-stats', {children: JSON.parse(e.data).stats});
+        });
+    }
+
+    window.perfusionLive = {connect: connect};
+})();
@@ -1,280 +1,609 @@
 import dash
-from dash import dcc, html, Input, Output, State
+from dash import dcc, html, Input, Output, State, no_update
 import dash_bootstrap_components as dbc
 from dash import dash_table  # Import dash_table module
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from dash.exceptions import PreventUpdate
-from serial import Serial
-import serial.tools.list_ports
-import threading
 import time
-from collections import deque
 import datetime
+import collections
+import threading
 from pathlib import Path
 import os
+import sqlite3
 from waitress import serve
-from save_data import SensorDatabase  # Uncomment when ready
+from flask import Response, g, request, stream_with_context
+from rig import Rig, find_rig_ports, recover_sessions
+from daemon_client import daemon_rigs
+from telemetry_buffer import VALUE_COLUMNS
+from downsample import PLOT_COLUMNS, downsample, read_overview
+from export import FORMATS, MIME_TYPES, iter_export
+from session_catalog import CATALOG_NAME, SESSION_GLOB
+from history import SessionHistory
+from pipeline_metrics import CONTENT_TYPE, MetricsRegistry, render
 
 # --- Global Variables and Initialization ---
 # Setup database directory
 DB_DIR = Path(os.path.expanduser("~/Downloads/Perfusion_System/databases"))
 DB_DIR.mkdir(parents=True, exist_ok=True)
 
-# Shared buffer for serial data
-buffer = deque(maxlen=15)  # For storing serial messages
-data_rows = [("timestamp", "perfusion_state", "valve_state", "humidity", "temperature", 
-              "envir_pressure", "AQI", "current_pressure", "target_pressure", "motor_speed")]
-DB_STATE = [None, None, False]  # [db_instance, db_path, perfusion_on]
+# Rigs: one controller per serial port, each with its own worker process, session database,
+# live buffers and command channel (see rig.py)
+RIG_MAX = 4
+RIG_PROCESSES = True  # False = read every rig on a thread of this process
+RIGS = {}  # rig id ("rig1", ...) → Rig
+DEFAULT_CMD_HISTORY = ["IDLE", "15.0", "2.5", "0", "0", "0"]
+# With acquisition_daemon.py running, attach to it instead of opening the ports here, so a
+# restart of this UI does not pause the capture: the daemon's Unix socket, None = acquire here
+ACQUISITION_SOCKET = os.environ.get("PERFUSION_DAEMON_SOCKET")
+
+# Typed live telemetry: every frame for plots/statistics, display-decimated rows for the table
+TELEMETRY_CAPACITY = 86400  # 24 h at 1 Hz
+TABLE_HEADER = ("timestamp",) + VALUE_COLUMNS
+
+# Ingest settings: storage and UI cost are tuned separately
+STORE_ALL_FRAMES = True  # False = old behaviour, only the first frame of every second is stored
+STORE_BATCH_SIZE = 200  # Rows per SQLite commit
+STORE_FLUSH_INTERVAL = 1.0  # Max seconds a row waits for its commit
+STORE_JOURNAL = True  # Journal rows before they are queued, so larger batches lose nothing in a crash
+DISPLAY_RATE_HZ = 1.0  # Frames per second that reach the live log and table (UI only)
+
+# Live updates are pushed to the browsers over Server-Sent Events (/live); the 1 s interval
+# polling is only used as a fallback while the event stream is down
+LIVE_PUSH = True
+LIVE_MAX_CLIENTS = 8  # waitress keeps one worker thread per open event stream
 
-# Timing variables
-last_displayed_second = None  # Track the last second we displayed a message
-last_data_table_update = 0  # Track last data table update time
-table_update_interval = 0.5  # Update table every 1 second
-is_connected = False  # Track connection status
+# Pipeline metrics at /metrics (Prometheus text format): per-stage timings of every rig, ingest
+# lag, queue depths and the time of each Dash callback. False = nothing is timed at all
+METRICS = True
+UI_METRICS = MetricsRegistry()  # metrics of this process that belong to no rig
+
+# Charts: any time window is reduced to PLOT_MAX_POINTS per trace on the server, so the browser
+# draws the same number of points for a 10 minute window and for a multi-day run
+PLOT_MAX_POINTS = 1000
+PLOT_METHOD = "lttb"  # or "minmax"
+PLOT_REFRESH_S = 2
+PLOT_WINDOWS = {"Last 10 min": 600, "Last hour": 3600, "Last 6 h": 6 * 3600, "Whole run": None}
+
+# History tab: any session in DB_DIR, the one being recorded included, browsed a page at a time
+# with keyset pagination over a read-only connection (see history.py)
+HISTORY_PAGE_ROWS = 500
+HISTORY_OPEN_SESSIONS = 4  # session databases kept open for browsing
 
 # --- Helper Functions ---
-def make_db_filename():
-    """Creates a unique, timestamped filename for the database."""
-    now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    return DB_DIR / f"perfusion_{now}.db"
-
-def ensure_db_file(db_path: Path):
-    """Ensures the database file exists."""
-    if not db_path.exists():
-        db_path.touch()
-
-def connect_serial():
-    """Finds available serial ports and connects to the first one."""
-    global is_connected
+def make_rig(rig_id, port):
+    return Rig(rig_id, port, DB_DIR, use_process=RIG_PROCESSES, display_rate_hz=DISPLAY_RATE_HZ,
+               telemetry_capacity=TELEMETRY_CAPACITY, store_all_frames=STORE_ALL_FRAMES,
+               batch_size=STORE_BATCH_SIZE, flush_interval=STORE_FLUSH_INTERVAL,
+               catalog_path=DB_DIR / CATALOG_NAME, journal=STORE_JOURNAL, metrics=METRICS,
+               daemon_socket=ACQUISITION_SOCKET)
+
+def start_rigs():
+    """Start one acquisition worker per port found, or attach to the daemon's rigs."""
+    if ACQUISITION_SOCKET:
+        try:
+            rigs = daemon_rigs(ACQUISITION_SOCKET)
+        except OSError as e:
+            print(f"❌ Acquisition daemon not reachable at {ACQUISITION_SOCKET}: {e}")
+            return
+    else:
+        recover_sessions(DB_DIR, DB_DIR / CATALOG_NAME)
+        rigs = {f"rig{i}": port for i, port in enumerate(find_rig_ports(RIG_MAX), start=1)}
+    for rig_id, port in rigs.items():
+        rig = make_rig(rig_id, port)
+        RIGS[rig.rig_id] = rig
+        rig.start()
+
+def get_rig(rig_id):
+    rig = RIGS.get(rig_id)
+    if rig is None:
+        raise PreventUpdate
+    return rig
+
+def view_key(rig_id, view, *options):
+    """Identifies what a live callback has shown: the rig's LiveView version (and display options)."""
+    return "/".join(map(str, (rig_id, view.version) + options))
+
+_histories = collections.OrderedDict()  # file name -> SessionHistory, least recently used first
+_histories_lock = threading.Lock()
+
+def open_history(name):
+    """
+    The SessionHistory of a session file in DB_DIR (by file name, never a path from the browser).
+    The HISTORY_OPEN_SESSIONS most recently used stay open, the one that drops out is closed
+    (a callback still using it reopens it for its remaining queries).
+    """
+    name = Path(name).name
+    with _histories_lock:
+        history = _histories.pop(name, None)
+        if history is None:
+            history = SessionHistory(DB_DIR / name)
+        _histories[name] = history
+        evicted = [_histories.popitem(last=False)[1] for _ in range(len(_histories) - HISTORY_OPEN_SESSIONS)]
+    for old in evicted:
+        old.close()
+    return history
+
+def recording_sessions():
+    return {Path(rig.db_path).name for rig in list(RIGS.values()) if rig.db_path}
+
+def history_sessions():
+    """Session files in DB_DIR as dropdown options, newest first."""
+    recording = recording_sessions()
+    paths = sorted(DB_DIR.glob(SESSION_GLOB), key=lambda path: path.stat().st_mtime, reverse=True)
+    return [{"label": f"{path.name} (recording)" if path.name in recording else path.name, "value": path.name}
+            for path in paths]
+
+def parse_time(text, day):
+    """Epoch seconds of a local time typed as "YYYY-MM-DD HH:MM[:SS]", or "HH:MM[:SS]" on `day`;
+    None if empty. Raises ValueError if it is neither."""
+    text = (text or "").strip()
+    if not text:
+        return None
     try:
-        ports = serial.tools.list_ports.comports()
-        active_ports = [p for p in sorted(ports) if p.hwid != 'n/a']
-        if not active_ports:
-            print("❌ No active serial ports found.")
-            return None
-        
-        port_device = active_ports[0].device
-        for p in active_ports:
-            print(f"Found serial port: {p.device} - {p.description}")
-        print(f"🔌 Connecting to port: {port_device}")
-        ser = Serial(port=port_device, baudrate=115200, timeout=1)
-        time.sleep(1) # Wait for connection to establish
-        is_connected = True
-        return ser
-    except Exception as e:
-        print(f"Error connecting to serial port: {e}")
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return datetime.datetime.combine(day, datetime.time.fromisoformat(text)).timestamp()
+
+def time_text(epoch_us):
+    moment = datetime.datetime.fromtimestamp(epoch_us / 1e6)
+    return moment.strftime('%Y-%m-%d %H:%M:%S.') + f"{moment.microsecond // 1000:03d}"
+
+def history_record(row):
+    """A history table record: "id" the reading id, "0" its date/time, "1".. the VALUE_COLUMNS."""
+    record = {"id": row[0], "0": time_text(row[1])}
+    for i, value in enumerate(row[2:], start=1):
+        record[str(i)] = value
+    return record
+
+def plot_series(rig, start=None, end=None):
+    """PLOT_COLUMNS between start and end (epoch s) from the rig's current/last session database
+    (its rollups for long ranges), or from its live telemetry buffer while no session has been
+    recorded yet."""
+    db_path = rig.db_path
+    if db_path is not None and Path(db_path).exists():
+        return read_overview(db_path, PLOT_COLUMNS, start, end, max_points=PLOT_MAX_POINTS)
+    return rig.telemetry.between(start, end, ("timestamp",) + PLOT_COLUMNS)
+
+def zoom_range(relayout):
+    """(start, end) epoch seconds of a zoom in the chart, None if it was reset, False if no x change."""
+    if not relayout:
+        return False
+    if any(key.startswith('xaxis') and key.endswith('autorange') for key in relayout):
         return None
+    bounds = [value for key, value in sorted(relayout.items())
+              if key.startswith('xaxis') and ('.range[' in key or key.endswith('.range'))]
+    if not bounds:
+        return False
+    if isinstance(bounds[0], list):
+        bounds = bounds[0]
+    start, end = (datetime.datetime.fromisoformat(str(b)).timestamp() for b in bounds[:2])
+    return start, end
+
+def build_figure(series, uirevision):
+    """Pressure and motor speed over time, every trace downsampled to PLOT_MAX_POINTS."""
+    reduced = downsample(series["timestamp"], {name: series[name] for name in PLOT_COLUMNS},
+                         max_points=PLOT_MAX_POINTS, method=PLOT_METHOD)
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.06,
+                        subplot_titles=("Pressure", "Motor speed"))
+    for name, row in (("current_pressure", 1), ("target_pressure", 1), ("motor_speed", 2)):
+        if f"{name}_min" in series and name != "target_pressure":
+            # rollup buckets: shade the range each bucket's mean stands for
+            band_x = [datetime.datetime.fromtimestamp(t) for t in series["timestamp"].tolist()]
+            fig.add_trace(go.Scatter(x=band_x, y=series[f"{name}_max"], mode='lines', line={'width': 0},
+                                     showlegend=False, hoverinfo='skip'), row=row, col=1)
+            fig.add_trace(go.Scatter(x=band_x, y=series[f"{name}_min"], mode='lines', line={'width': 0},
+                                     fill='tonexty', showlegend=False, hoverinfo='skip'), row=row, col=1)
+        x, y = reduced[name]
+        fig.add_trace(go.Scatter(x=[datetime.datetime.fromtimestamp(t) for t in x.tolist()], y=y,
+                                 mode='lines', name=name,
+                                 line={'dash': 'dash'} if name == "target_pressure" else None),
+                      row=row, col=1)
+    fig.update_layout(height=500, margin={'l': 40, 'r': 10, 't': 30, 'b': 30},
+                      uirevision=uirevision, legend={'orientation': 'h'})
+    return fig
 
-def send_all_commands(cmd_history):
-    """Joins commands and sends them over serial."""
-    if not SER or not SER.is_open or not is_connected:
-        print("Serial port not available. Cannot send command.")
-        return
-    packet = ",".join(filter(None, cmd_history)) + "\n"
-    try:
-        SER.write(packet.encode())
-        print(f"Sent: {packet.strip()}")
-    except Exception as e:
-        print(f"Error sending command: {e}")
-
-# --- Background thread for reading serial ---
-def read_serial():
-    global buffer, DB_STATE, last_displayed_second, last_data_table_update
-    if not SER or not is_connected:
-        return
-        
-    chunk_array = bytearray()
-    
-    while is_connected:
-        try:
-            if SER.in_waiting:
-                chunk = SER.read(55)
-                chunk_array.extend(chunk)
-                
-                while True:
-                    try:
-                        start_index = chunk_array.index(b'<')
-                        end_index = chunk_array.index(b'>', start_index + 1)
-                    except ValueError:
-                        break
-
-                    frame = chunk_array[start_index + 1:end_index]
-                    del chunk_array[:end_index + 1]
-                    
-                    raw_data = frame.decode('utf-8').strip()
-                    data_list = [item.strip() for item in raw_data.split(',')]
-                    data_list.insert(0, time.strftime('%H:%M:%S', time.localtime()))  # Add timestamp at the start
-                    
-                    # Get current time
-                    current_time = time.time()
-                    current_second = int(current_time)
-                    
-                    # Only store one message per second
-                    if last_displayed_second != current_second:
-                        # Database handling
-                        cmd = data_list[1]
-                        if cmd == "1" and not DB_STATE[2]:  # START_PERFUSION
-                            new_path = make_db_filename()
-                            ensure_db_file(new_path)
-                            DB_STATE[1] = new_path
-                            DB_STATE[0] = SensorDatabase(database_path=new_path)  # Uncomment when ready
-                            DB_STATE[2] = True
-                            print(f"Perfusion started → logging to: {new_path}")
-                        
-                        if cmd == "0" and DB_STATE[2]:  # STOP_PERFUSION
-                            DB_STATE[2] = False
-                            print(f"Perfusion stopped for: {DB_STATE[1]}")
-                        
-                        if DB_STATE[2] and DB_STATE[0] is not None:
-                            try:
-                                DB_STATE[0].insert_reading(data_list[1:])  # Uncomment when ready
-                                pass
-                            except Exception as e:
-                                pass
-                        
-                        # Add to buffer with formatted timestamp
-                        formatted_time = time.strftime('%H:%M:%S', time.localtime(current_time))
-                        buffer.appendleft((formatted_time, raw_data))
-                        
-                        # Update last displayed second
-                        last_displayed_second = current_second
-                        
-                        # Update data table immediately
-                        if len(data_list) > 1 and data_list[1] != "0":
-                            global data_rows
-                            data_rows.insert(1, data_list)
-                            if len(data_rows) > 11:
-                                data_rows.pop()
-                            
-                            # Update last update time
-                            last_data_table_update = current_time
-            
-            else:
-                time.sleep(0.1)
-                
-        except Exception as e:
-            print(f"Serial error: {e}")
-            time.sleep(1)
-
-# Initialize serial connection globally
-SER = connect_serial()
-
-# Start the background thread once
-if SER and is_connected:
-    reader_thread = threading.Thread(target=read_serial, daemon=True)
-    reader_thread.start()
 
 # --- Dash App Definition ---
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 server = app.server  # For deployment environments
 
 # --- App Layout ---
-app.layout = dbc.Container(fluid=True, children=[
-    # Store for session state, equivalent to st.session_state
-    dcc.Store(id='cmd-history-store', data=["IDLE", "15.0", "2.5", "0", "0", "0"]),
+def history_tab():
+    return [
+        dcc.Store(id='history-page', data=None),  # [first id, last id] of the page shown
+        dbc.Row([
+            dbc.Col([dbc.Label("Session"), dcc.Dropdown(id='history-session', clearable=False,
+                                                         placeholder="No session recorded")], width=4),
+            dbc.Col([dbc.Label("From"), dbc.Input(id='history-from', placeholder="YYYY-MM-DD HH:MM or HH:MM")], width=2),
+            dbc.Col([dbc.Label("To"), dbc.Input(id='history-to', placeholder="YYYY-MM-DD HH:MM or HH:MM")], width=2),
+            dbc.Col(dbc.Button("FILTER", id='history-filter-btn', className="w-100"), width=1),
+            dbc.Col([dbc.Label("Jump to"), dbc.Input(id='history-jump', placeholder="HH:MM:SS")], width=2),
+            dbc.Col(dbc.Button("GO", id='history-jump-btn', className="w-100"), width=1),
+        ], className="mt-3 mb-2 align-items-end"),
+        dbc.Row([
+            dbc.Col(dbc.ButtonGroup([
+                dbc.Button("⏮️ Oldest", id='history-oldest', outline=True, color="secondary"),
+                dbc.Button("◀️ Older", id='history-older', outline=True, color="secondary"),
+                dbc.Button("Newer ▶️", id='history-newer', outline=True, color="secondary"),
+                dbc.Button("Newest ⏭️", id='history-newest', outline=True, color="secondary"),
+            ]), width="auto"),
+            dbc.Col(html.Small(id='history-status', className="text-muted")),
+        ], className="mb-2 align-items-center"),
+        # Only the rows in view are rendered, so a page of HISTORY_PAGE_ROWS scrolls smoothly
+        dash_table.DataTable(
+            id='history-table',
+            columns=[{"name": "#", "id": "id"}] + [{"name": col, "id": str(i)} for i, col in enumerate(TABLE_HEADER)],
+            data=[],
+            virtualization=True,
+            fixed_rows={'headers': True},
+            page_action='none',
+            style_table={'height': '600px', 'overflowY': 'auto', 'overflowX': 'auto'},
+            style_cell={'minWidth': '110px', 'width': '110px', 'maxWidth': '220px'},
+            style_cell_conditional=[{'if': {'column_id': '0'}, 'width': '200px'}],
+        ),
+    ]
+
+def serve_layout():
+    """Built per page load, so the rig selector lists the rigs that are running now."""
+    rig_ids = list(RIGS)
+    return dbc.Container(fluid=True, children=[
+        # Store for session state, equivalent to st.session_state ({rig id: command history})
+        dcc.Store(id='cmd-history-store', data={}),
+        dcc.Store(id='live-rig', data=None),
+        # view_key() of what the table and the log show, so unchanged views are not sent again
+        dcc.Store(id='table-view', data=None),
+        dcc.Store(id='log-view', data=None),
     
-    # Timer to trigger UI updates (only for display refresh)
-    dcc.Interval(id='interval-live-update', interval=1 * 1000, n_intervals=0),  # 1-second update
+        # Timer to trigger UI updates (only for display refresh); with LIVE_PUSH it stays disabled
+        # unless assets/live_stream.js loses the event stream
+        dcc.Interval(id='interval-live-update', interval=1 * 1000, n_intervals=0, disabled=LIVE_PUSH),  # 1-second update
     
-    html.H1("📊 Raspberry Pi ↔️ Arduino Dashboard"),
-    html.Hr(),
-
-    # --- Control Panel ---
-    dbc.Row([
-        dbc.Col([
-            dbc.Label("Pressure (mmHg)"),
-            dbc.Input(id="pressure-input", type="number", value=15.0, step=1.0),
-            dbc.Button("SET PRESSURE", id="pressure-btn", color="success", className="mt-2 w-100"),
-        ], width=3),
-        dbc.Col([
-            dbc.Label("Flow Rate (ml/day)"),
-            dbc.Input(id="flow-rate-input", type="number", value=2.5, step=0.1),
-            dbc.Button("SET FLOW RATE", id="flow-rate-btn", color="success", className="mt-2 w-100"),
-        ], width=3),
-        dbc.Col([
-            dbc.Label("Set Raw Low Pressure"),
-            dbc.Input(id="raw-low-input", type="number", value=50, step=1),
-            dbc.Button("SET RAW LOW", id="low-pressure-btn", color="success", className="mt-2 w-100"),
-        ], width=3),
-        dbc.Col([
-            dbc.Label("Set Raw High Pressure"),
-            dbc.Input(id="raw-high-input", type="number", value=100, step=1),
-            dbc.Button("SET RAW HIGH", id="high-pressure-btn", color="success", className="mt-2 w-100"),
-        ], width=3),
-    ], className="mb-3"),
-
-    dbc.Row([
-        dbc.Col(dbc.Button("▶️ START PERFUSION", id="start-btn", className="w-100")),
-        dbc.Col(dbc.Button("⏸️ PAUSE PERFUSION", id="pause-btn", className="w-100")),
-        dbc.Col(dbc.Button("⏯️ CONTINUE PERFUSION", id="continue-btn", className="w-100")),
-    ], className="mb-3 g-2"),
+        dbc.Row([
+            dbc.Col(html.H1("📊 Raspberry Pi ↔️ Arduino Dashboard"), width=9),
+            dbc.Col(dcc.Dropdown(id='rig-select',
+                                 options=[{"label": f"{rig_id} ({RIGS[rig_id].port})", "value": rig_id} for rig_id in rig_ids],
+                                 value=rig_ids[0] if rig_ids else None, clearable=False,
+                                 placeholder="No rig connected"), width=3),
+        ], className="align-items-center"),
+        html.Hr(),
+        dbc.Tabs(id="main-tabs", active_tab="live", children=[
+            dbc.Tab(label="Live", tab_id="live", children=[
+
+                # --- Control Panel ---
+                dbc.Row([
+                    dbc.Col([
+                        dbc.Label("Pressure (mmHg)"),
+                        dbc.Input(id="pressure-input", type="number", value=15.0, step=1.0),
+                        dbc.Button("SET PRESSURE", id="pressure-btn", color="success", className="mt-2 w-100"),
+                    ], width=3),
+                    dbc.Col([
+                        dbc.Label("Flow Rate (ml/day)"),
+                        dbc.Input(id="flow-rate-input", type="number", value=2.5, step=0.1),
+                        dbc.Button("SET FLOW RATE", id="flow-rate-btn", color="success", className="mt-2 w-100"),
+                    ], width=3),
+                    dbc.Col([
+                        dbc.Label("Set Raw Low Pressure"),
+                        dbc.Input(id="raw-low-input", type="number", value=50, step=1),
+                        dbc.Button("SET RAW LOW", id="low-pressure-btn", color="success", className="mt-2 w-100"),
+                    ], width=3),
+                    dbc.Col([
+                        dbc.Label("Set Raw High Pressure"),
+                        dbc.Input(id="raw-high-input", type="number", value=100, step=1),
+                        dbc.Button("SET RAW HIGH", id="high-pressure-btn", color="success", className="mt-2 w-100"),
+                    ], width=3),
+                ], className="mb-3"),
+
+                dbc.Row([
+                    dbc.Col(dbc.Button("▶️ START PERFUSION", id="start-btn", className="w-100")),
+                    dbc.Col(dbc.Button("⏸️ PAUSE PERFUSION", id="pause-btn", className="w-100")),
+                    dbc.Col(dbc.Button("⏯️ CONTINUE PERFUSION", id="continue-btn", className="w-100")),
+                ], className="mb-3 g-2"),
     
-    dbc.Row([
-        dbc.Col(dbc.Button("⏹️ END PERFUSION", id="end-btn", className="w-100")),
-        dbc.Col(dbc.Button("🔄 TOGGLE VALVE", id="valve-btn", className="w-100")),
-        dbc.Col(dbc.Button("🔙 REVERSE FLOW", id="reverse-btn", className="w-100")),
-    ], className="mb-4 g-2"),
+                dbc.Row([
+                    dbc.Col(dbc.Button("⏹️ END PERFUSION", id="end-btn", className="w-100")),
+                    dbc.Col(dbc.Button("🔄 TOGGLE VALVE", id="valve-btn", className="w-100")),
+                    dbc.Col(dbc.Button("🔙 REVERSE FLOW", id="reverse-btn", className="w-100")),
+                ], className="mb-4 g-2"),
     
-    html.Hr(),
+                html.Hr(),
     
-    # --- Live Data Display ---
-    dbc.Row([
-        # Main content area
-        dbc.Col([
-            html.H3("Sensor Data Log", className="mt-4"),
-            html.Div(id='data-table-container'),
-        ], width=9),
-
-        # Sidebar for raw serial log
-        dbc.Col([
-            html.H3("🔄 Serial Log"),
-            dbc.Checkbox(id='show-log-checkbox', label="Show full log", value=False),
-            html.Div(id='serial-log-output', style={
-                'height': '400px',
-                'overflowY': 'scroll',
-                'border': '1px solid #ccc',
-                'padding': '10px',
-                'marginTop': '10px'
-            }),
-        ], width=3),
-    ]),
-])
+                # --- Live Data Display ---
+                dbc.Row([
+                    # Main content area
+                    dbc.Col([
+                        html.H3("Sensor Data Log", className="mt-4"),
+                        html.Small(id='ingest-stats', className="text-muted"),
+                        html.Div(id='data-table-container', children=dash_table.DataTable(
+                            id='data-table',
+                            columns=[{"name": col, "id": str(i)} for i, col in enumerate(TABLE_HEADER)],
+                            data=[],
+                            page_size=10,
+                            style_table={'overflowX': 'auto'}
+                        )),
+                    ], width=9),
+
+                    # Sidebar for raw serial log
+                    dbc.Col([
+                        html.H3("🔄 Serial Log"),
+                        dbc.Checkbox(id='show-log-checkbox', label="Show full log", value=False),
+                        html.Div(id='serial-log-output', style={
+                            'height': '400px',
+                            'overflowY': 'scroll',
+                            'border': '1px solid #ccc',
+                            'padding': '10px',
+                            'marginTop': '10px'
+                        }),
+                    ], width=3),
+                ]),
+
+                # --- Charts ---
+                html.Hr(),
+                dbc.Row([
+                    dbc.Col(html.H3("📈 Pressure & Motor Speed"), width=9),
+                    dbc.Col(dcc.Dropdown(id='plot-window', options=list(PLOT_WINDOWS), value="Last 10 min",
+                                         clearable=False), width=3),
+                ], className="align-items-center"),
+                dcc.Store(id='plot-zoom', data=None),
+                dcc.Interval(id='interval-plot', interval=PLOT_REFRESH_S * 1000, n_intervals=0),
+                dcc.Graph(id='telemetry-graph', config={'displaylogo': False}),
+                html.Small(id='control-stats', className="text-muted"),
+                html.Div(id='export-links', className="mb-4"),
+            ]),
+            dbc.Tab(label="History", tab_id="history", children=history_tab()),
+        ]),
+    ])
+
+app.layout = serve_layout
 
 # --- Optimized Callbacks ---
 
 # Callback for serial log
 @app.callback(
     Output('serial-log-output', 'children'),
+    Output('log-view', 'data'),
     Input('interval-live-update', 'n_intervals'),
-    Input('show-log-checkbox', 'value')
+    Input('show-log-checkbox', 'value'),
+    Input('rig-select', 'value'),
+    State('log-view', 'data'),
 )
-def update_serial_log(n, show_log):
-    if not show_log or not buffer:
-        return []
-    
-    # Simply return pre-formatted buffer contents
-    return [html.P(f"{ts} → {msg}") for ts, msg in buffer]
+def update_serial_log(n, show_log, rig_id, shown):
+    view = get_rig(rig_id).view  # read once: the reader replaces it, never changes it
+    key = view_key(rig_id, view, bool(show_log))
+    if key == shown:
+        return no_update, no_update
+    if not show_log:
+        return [], key
+    return [html.P(f"{ts} → {msg}") for ts, msg in view.log], key
 
 # Callback for data table
 @app.callback(
-    Output('data-table-container', 'children'),
-    Input('interval-live-update', 'n_intervals')
+    Output('data-table', 'data'),
+    Output('table-view', 'data'),
+    Input('interval-live-update', 'n_intervals'),
+    Input('rig-select', 'value'),
+    State('table-view', 'data'),
 )
-def update_data_table(n):
-    global last_data_table_update
-    current_time = time.time()
-    
-    # Only update if enough time has passed since last update
-    if current_time - last_data_table_update < table_update_interval:
+def update_data_table(n, rig_id, shown):
+    view = get_rig(rig_id).view
+    key = view_key(rig_id, view)
+    if key == shown:
+        return no_update, no_update
+    # Newest row first
+    return list(view.rows), key
+
+# Callback for ingest counters
+@app.callback(
+    Output('ingest-stats', 'children'),
+    Input('interval-live-update', 'n_intervals'),
+    Input('rig-select', 'value')
+)
+def update_ingest_stats(n, rig_id):
+    rig = get_rig(rig_id)
+    status = "" if rig.connected else " · ⚠️ not connected"
+    return rig.ingest_stats_text() + status
+
+# Callback for the charts: live window, or a fixed zoom re-read at full detail
+@app.callback(
+    Output('telemetry-graph', 'figure'),
+    Output('plot-zoom', 'data'),
+    Input('interval-plot', 'n_intervals'),
+    Input('plot-window', 'value'),
+    Input('telemetry-graph', 'relayoutData'),
+    Input('rig-select', 'value'),
+    State('plot-zoom', 'data'),
+)
+def update_telemetry_graph(n, window, relayout, rig_id, zoom):
+    rig = get_rig(rig_id)
+    trigger = dash.callback_context.triggered_id
+    if trigger in ('plot-window', 'rig-select'):
+        zoom = None
+    elif trigger == 'telemetry-graph':
+        new_zoom = zoom_range(relayout)
+        if new_zoom is False:
+            raise PreventUpdate
+        zoom = new_zoom
+    elif zoom:
+        raise PreventUpdate  # zoomed in: keep the view still while new data arrives
+
+    if zoom:
+        start, end = zoom
+    else:
+        seconds = PLOT_WINDOWS.get(window)
+        end = None
+        start = time.time() - seconds if seconds else None
+    return build_figure(plot_series(rig, start, end), uirevision=f"{rig_id}/{window}"), zoom
+
+# Callback for the control performance line (settling, overshoot, RMS error, valve duty)
+@app.callback(
+    Output('control-stats', 'children'),
+    Input('interval-plot', 'n_intervals'),
+    Input('rig-select', 'value')
+)
+def update_control_stats(n, rig_id):
+    return get_rig(rig_id).control_summary_text()
+
+# Callback for the export links of the current/last run
+@app.callback(
+    Output('export-links', 'children'),
+    Input('interval-plot', 'n_intervals'),
+    Input('rig-select', 'value')
+)
+def update_export_links(n, rig_id):
+    rig = get_rig(rig_id)
+    if rig.db_path is None:
+        return []
+    name = Path(rig.db_path).name
+    return [html.Span(f"⬇️ Export {name}: ")] + [
+        html.A(fmt.upper(), href=f"/export/{name}?format={fmt}", className="me-2") for fmt in FORMATS]
+
+# Session list of the History tab, refreshed each time the tab is opened
+@app.callback(
+    Output('history-session', 'options'),
+    Output('history-session', 'value'),
+    Input('main-tabs', 'active_tab'),
+    State('history-session', 'value'),
+    State('rig-select', 'value')
+)
+def update_history_sessions(active_tab, session, rig_id):
+    if active_tab != "history":
         raise PreventUpdate
-    
-    # Create table only when necessary
-    return dash_table.DataTable(
-        id='data-table',
-        columns=[{"name": col, "id": str(i)} for i, col in enumerate(data_rows[0])],
-        data=[{str(i): val for i, val in enumerate(row)} for row in data_rows[1:]],
-        page_size=10,
-        style_table={'overflowX': 'auto'}
-    )
+    options = history_sessions()
+    names = [option["value"] for option in options]
+    if session not in names:
+        rig = RIGS.get(rig_id)
+        current = Path(rig.db_path).name if rig is not None and rig.db_path else None
+        session = current if current in names else (names[0] if names else None)
+    return options, session
+
+# One page of the History tab: found from the ids of the page shown, never with OFFSET
+@app.callback(
+    Output('history-table', 'data'),
+    Output('history-page', 'data'),
+    Output('history-status', 'children'),
+    Output('history-older', 'disabled'),
+    Output('history-newer', 'disabled'),
+    Input('history-session', 'value'),
+    Input('history-oldest', 'n_clicks'),
+    Input('history-older', 'n_clicks'),
+    Input('history-newer', 'n_clicks'),
+    Input('history-newest', 'n_clicks'),
+    Input('history-filter-btn', 'n_clicks'),
+    Input('history-jump-btn', 'n_clicks'),
+    State('history-from', 'value'),
+    State('history-to', 'value'),
+    State('history-jump', 'value'),
+    State('history-page', 'data')
+)
+def update_history_page(session, oldest, older, newer, newest, filter_btn, jump_btn,
+                        start_text, end_text, jump_text, shown):
+    if not session:
+        return [], None, "No session selected", True, True
+    try:
+        history = open_history(session)
+        span = history.span()
+    except (sqlite3.Error, ValueError) as e:
+        return [], None, f"❌ {session}: {e}", True, True
+    if span is None:
+        return [], None, f"{session}: no readings yet", True, True
+
+    day = datetime.date.fromtimestamp(span[0])
+    try:
+        start, end, jump = (parse_time(text, day) for text in (start_text, end_text, jump_text))
+    except ValueError:
+        return no_update, no_update, "❌ Times are YYYY-MM-DD HH:MM[:SS] or HH:MM[:SS]", no_update, no_update
+
+    button = dash.callback_context.triggered_id
+    first_id, last_id = shown or (None, None)
+    if button == 'history-older' and first_id:
+        page = history.page_before(first_id, start, end, HISTORY_PAGE_ROWS)
+    elif button == 'history-newer' and last_id:
+        page = history.page_after(last_id, start, end, HISTORY_PAGE_ROWS)
+    elif button == 'history-jump-btn' and jump is not None:
+        page = history.page_at(jump, start, end, HISTORY_PAGE_ROWS)
+    elif button in ('history-oldest', 'history-filter-btn'):
+        page = history.page_after(0, start, end, HISTORY_PAGE_ROWS)
+    else:  # a session was picked, or Newest: the latest readings (the session may still be recording)
+        page = history.page_before(None, start, end, HISTORY_PAGE_ROWS)
+
+    if not page.rows:
+        return [], None, "No readings in this time range", True, True
+    recording = " (recording)" if session in recording_sessions() else ""
+    status = (f"Readings #{page.rows[0][0]}–#{page.rows[-1][0]} of {history.last_id()}{recording} · "
+              f"session {time_text(span[0] * 1e6)} → {time_text(span[1] * 1e6)}")
+    return ([history_record(row) for row in page.rows], [page.rows[0][0], page.rows[-1][0]], status,
+            not page.has_older, not page.has_newer)
+
+# The event stream follows the selected rig (assets/live_stream.js)
+app.clientside_callback(
+    """function (rigId) {
+        if (window.perfusionLive) { window.perfusionLive.connect(rigId); }
+        return rigId;
+    }""",
+    Output('live-rig', 'data'),
+    Input('rig-select', 'value')
+)
+
+# --- Server push ---
+@server.route('/live')
+def live_events():
+    """Server-Sent Events for one rig (?rig=rig1): a snapshot of the table/log, then every new
+    row/log line as it is decoded."""
+    rig = RIGS.get(request.args.get('rig'))
+    if rig is None:
+        return Response("Unknown rig", status=404)
+    if sum(r.broadcaster.clients for r in RIGS.values()) >= LIVE_MAX_CLIENTS:
+        # Keep worker threads free for the Dash callbacks; the page falls back to polling
+        return Response("Too many live clients", status=503)
+
+    def initial():
+        view = rig.view
+        return [("snapshot", {"rows": list(view.rows), "log": list(view.log), "stats": rig.ingest_stats_text()})]
+
+    return Response(stream_with_context(rig.broadcaster.stream(initial)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@server.route('/export/<name>')
+def export_session(name):
+    """Stream a session database as Parquet/CSV; the download starts with the first chunk of rows."""
+    fmt = request.args.get('format', 'parquet')
+    db_path = DB_DIR / Path(name).name
+    if fmt not in FORMATS or db_path.suffix != '.db' or not db_path.is_file():
+        return Response("Unknown session or format", status=404)
+
+    def generate():
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            yield from iter_export(conn, fmt)
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype=MIME_TYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{db_path.stem}{FORMATS[fmt]}"'})
+
+# --- Metrics ---
+def is_callback_request():
+    return request.path.endswith('/_dash-update-component')
+
+if METRICS:
+    @server.before_request
+    def start_callback_timer():
+        if is_callback_request():
+            g.callback_started = time.perf_counter()
+
+    @server.after_request
+    def observe_callback_time(response):
+        if is_callback_request() and 'callback_started' in g:
+            output = (request.get_json(silent=True) or {}).get('output', 'unknown')  # e.g. "telemetry-graph.figure"
+            UI_METRICS.histogram('perfusion_callback_seconds', "Seconds per Dash callback request",
+                                 output=output).observe(time.perf_counter() - g.callback_started)
+        return response
+
+    @server.route('/metrics')
+    def metrics():
+        snapshots = [UI_METRICS.snapshot()] + [rig.metrics_snapshot() for rig in list(RIGS.values())]
+        return Response(render(snapshots), content_type=CONTENT_TYPE)
 
 # Command history callback
 @app.callback(
@@ -296,7 +625,8 @@ def update_data_table(n):
         State('flow-rate-input', 'value'),
         State('raw-low-input', 'value'), 
         State('raw-high-input', 'value'),
-        State('cmd-history-store', 'data')
+        State('cmd-history-store', 'data'),
+        State('rig-select', 'value')
     ],
     prevent_initial_call=True
 )
@@ -304,14 +634,16 @@ def update_command_history(press_btn, flow_btn, low_press_btn, high_press_btn,
                           start_btn, pause_btn, continue_btn, end_btn, 
                           valve_btn, reverse_btn,
                           pressure_val, flow_val, raw_low_val, raw_high_val,
-                          current_history):
+                          histories, rig_id):
     # Identify which button was clicked
     ctx = dash.callback_context
     if not ctx.triggered:
         raise PreventUpdate
+    rig = get_rig(rig_id)
     
     button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    new_history = current_history.copy()
+    current_history = (histories or {}).get(rig_id, DEFAULT_CMD_HISTORY)
+    new_history = list(current_history)
     
     # Update command history based on button clicked
     if button_id == 'pressure-btn' and pressure_val is not None:
@@ -343,11 +675,12 @@ def update_command_history(press_btn, flow_btn, low_press_btn, high_press_btn,
             new_history[2] = "2.5"
     
     # Send commands immediately after updating history
-    send_all_commands(new_history)
-    return new_history
+    rig.send_commands(new_history)
+    return dict(histories or {}, **{rig_id: new_history})
 
 if __name__ == '__main__':
     #app.run(debug=True, use_reloader=False)
+    start_rigs()
     print("Server running on http://127.0.0.50:8050")
-    serve(app, host="127.0.0.50", port=8050)
+    serve(app, host="127.0.0.50", port=8050, threads=4 + (LIVE_MAX_CLIENTS if LIVE_PUSH else 0))
     
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Streaming export of a session database (sensor_readings) to Parquet or CSV.
+
+Rows are read from SQLite with fetchmany() in chunks of `chunk_rows` and written as Arrow
+record batches, so memory stays bounded by one chunk whatever the length of the run.
+
+Command line (writes to stdout when no output file is given):
+    python export.py perfusion_20250601_101500.db -o run.parquet
+    python export.py perfusion_20250601_101500.db --format csv > run.csv
+"""
+import argparse
+import sqlite3
+import sys
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+EXPORT_CHUNK_ROWS = 10000
+FORMATS = {"parquet": ".parquet", "csv": ".csv"}
+MIME_TYPES = {"parquet": "application/vnd.apache.parquet", "csv": "text/csv"}
+
+# Declared SQLite column type → Arrow type; anything else is exported as text
+_ARROW_TYPES = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+
+
+def table_schema(conn: sqlite3.Connection, table="sensor_readings") -> pa.Schema:
+    """Arrow schema of `table` from its declared column types (fixed for every chunk)."""
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not columns:
+        raise ValueError(f"No table named {table!r} in this database")
+    return pa.schema([(name, _arrow_type(name, decl)) for _, name, decl, *_ in columns])
+
+
+def _arrow_type(name, decl):
+    if name == "timestamp" and decl.upper() == "INTEGER":
+        return pa.timestamp("us", tz="UTC")  # schema 2: epoch microseconds
+    return _ARROW_TYPES.get(decl.upper(), pa.string())
+
+
+def count_rows(conn: sqlite3.Connection, table="sensor_readings") -> int:
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def iter_batches(conn: sqlite3.Connection, schema: pa.Schema, chunk_rows=EXPORT_CHUNK_ROWS,
+                 table="sensor_readings"):
+    """Yield the rows of `table` in id order as Arrow record batches of up to `chunk_rows` rows."""
+    names = ", ".join(schema.names)
+    cursor = conn.execute(f"SELECT {names} FROM {table} ORDER BY rowid")
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _ChunkSink:
+    """Write-only file object whose bytes are collected until the caller takes them."""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _writer(fmt, sink, schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "csv":
+        return pa_csv.CSVWriter(sink, schema)
+    raise ValueError(f"Unknown export format {fmt!r}, expected one of {sorted(FORMATS)}")
+
+
+def iter_export(conn: sqlite3.Connection, fmt="parquet", chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yield the export file as byte chunks, one per `chunk_rows` rows, for a streaming HTTP
+    response: the first bytes go out before the rest of the table has been read.
+    For Parquet every chunk is one row group and the footer comes with the last chunk.
+    """
+    schema = table_schema(conn)
+    sink = _ChunkSink()
+    writer = _writer(fmt, sink, schema)
+    try:
+        for batch in iter_batches(conn, schema, chunk_rows):
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=chunk_rows)
+            else:
+                writer.write_batch(batch)
+            data = sink.take()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = sink.take()
+    if data:
+        yield data
+
+
+def export(conn: sqlite3.Connection, destination, fmt="parquet", chunk_rows=EXPORT_CHUNK_ROWS,
+           progress=None) -> int:
+    """
+    Write sensor_readings to `destination` (path or binary file object) chunk by chunk.
+    `progress(rows_written)` is called after every chunk. Returns the number of rows written.
+    """
+    schema = table_schema(conn)
+    rows = 0
+    writer = _writer(fmt, destination, schema)
+    try:
+        for batch in iter_batches(conn, schema, chunk_rows):
+            if fmt == "parquet":
+                writer.write_batch(batch, row_group_size=chunk_rows)
+            else:
+                writer.write_batch(batch)
+            rows += batch.num_rows
+            if progress is not None:
+                progress(rows)
+    finally:
+        writer.close()
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a perfusion session database to Parquet or CSV.")
+    parser.add_argument("database", help="Session database (perfusion_*.db)")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=sorted(FORMATS),
+                        help="Export format (default: from the output suffix, else parquet)")
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS, help="Rows per chunk")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output and args.output.endswith(".csv") else "parquet"
+
+    conn = sqlite3.connect(f"file:{args.database}?mode=ro", uri=True)
+    try:
+        if args.output:
+            rows = export(conn, args.output, fmt, args.chunk_rows)
+        else:
+            for data in iter_export(conn, fmt, args.chunk_rows):
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+    finally:
+        conn.close()
+    if args.output:
+        print(f"Exported {rows} readings to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
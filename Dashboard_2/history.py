@@ -0,0 +1,118 @@
+"""
+Keyset-paginated browsing of a session database, for the History tab of dashboard_2.py.
+
+A page is PAGE_ROWS readings in id order, found from the id of the page next to it
+(WHERE id > ? ORDER BY id LIMIT n), so the first hour of a multi-day run costs the same range
+scan of the rowid as the last one; nothing is skipped with OFFSET. Time filters and jumps are
+turned into id bounds through idx_timestamp first: readings are appended in the order they
+arrive, so ids and timestamps grow together.
+
+Each SessionHistory keeps one read-only connection. The recorder's writer keeps the session
+databases in WAL mode, so browsing the session being recorded never blocks its commits, and
+every query sees the rows committed until then. Databases of an older schema are not upgraded
+from here (the connection is read-only): run migrate_db.py on them first.
+"""
+import sqlite3
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+from save_data import FETCH_COLUMNS, SCHEMA_VERSION, schema_version, to_us
+
+
+PAGE_ROWS = 500
+
+# rows are FETCH_COLUMNS tuples (timestamp in epoch µs), oldest first; has_older/has_newer tell
+# whether the filtered session goes on before/after them
+Page = namedtuple("Page", "rows has_older has_newer")
+
+_SELECT = f"SELECT {', '.join(FETCH_COLUMNS)} FROM sensor_readings"
+
+
+class SessionHistory:
+    def __init__(self, database_path):
+        self.database_path = Path(database_path)
+        self._conn = self._connect()
+        self._lock = threading.Lock()
+        if schema_version(self._conn) < SCHEMA_VERSION:
+            self._conn.close()
+            raise ValueError(f"{self.database_path.name} has an older schema, run migrate_db.py on it first")
+
+    def __repr__(self):
+        return f"SessionHistory({str(self.database_path)!r})"
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True,
+                               isolation_level=None, check_same_thread=False)
+
+    def close(self):
+        """Close the connection. A query after this opens it again (e.g. a caller that still had
+        the history when dashboard_2.py's cache closed it); it is closed with the history."""
+        with self._lock:  # after the query another thread may still be running on it
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _all(self, query, params=()):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return self._conn.execute(query, params).fetchall()
+
+    def _one(self, query, params=()):
+        return self._all(query, params)[0][0]
+
+    def span(self):
+        """(first, last) reading time in epoch seconds, None if the session is empty."""
+        first, last = self._all("SELECT (SELECT MIN(timestamp) FROM sensor_readings) / 1e6, "
+                                "(SELECT MAX(timestamp) FROM sensor_readings) / 1e6")[0]
+        return None if first is None else (first, last)
+
+    def last_id(self):
+        """Id of the newest reading; readings are numbered from 1 in the order they arrived."""
+        return self._one("SELECT IFNULL(MAX(id), 0) FROM sensor_readings")
+
+    def _id_after(self, t):
+        """The id before the first reading at or after `t` (epoch s): an exclusive lower bound."""
+        row = self._all("SELECT id FROM sensor_readings WHERE timestamp >= ? ORDER BY timestamp LIMIT 1",
+                        (to_us(t),))
+        return row[0][0] - 1 if row else self.last_id()
+
+    def _id_until(self, t):
+        """The id of the last reading at or before `t` (epoch s): an inclusive upper bound."""
+        row = self._all("SELECT id FROM sensor_readings WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1",
+                        (to_us(t),))
+        return row[0][0] if row else 0
+
+    def bounds(self, start=None, end=None):
+        """(lo, hi): the readings between start and end (epoch s, None = open) are lo < id <= hi."""
+        lo = 0 if start is None else self._id_after(start)
+        hi = self.last_id() if end is None else self._id_until(end)
+        return lo, hi
+
+    def _page(self, rows, lo, hi):
+        if not rows:
+            return Page([], False, False)
+        has_older = self._one("SELECT EXISTS (SELECT 1 FROM sensor_readings WHERE id > ? AND id < ?)",
+                              (lo, rows[0][0]))
+        has_newer = self._one("SELECT EXISTS (SELECT 1 FROM sensor_readings WHERE id > ? AND id <= ?)",
+                              (rows[-1][0], hi))
+        return Page(rows, bool(has_older), bool(has_newer))
+
+    def page_after(self, after_id=0, start=None, end=None, limit=PAGE_ROWS):
+        """The `limit` readings after id `after_id` (0 = the oldest page) between start and end."""
+        lo, hi = self.bounds(start, end)
+        rows = self._all(f"{_SELECT} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (max(after_id, lo), hi, limit))
+        return self._page(rows, lo, hi)
+
+    def page_before(self, before_id=None, start=None, end=None, limit=PAGE_ROWS):
+        """The `limit` readings before id `before_id` (None = the newest page) between start and end."""
+        lo, hi = self.bounds(start, end)
+        below = hi + 1 if before_id is None else min(before_id, hi + 1)
+        rows = self._all(f"{_SELECT} WHERE id > ? AND id < ? ORDER BY id DESC LIMIT ?", (lo, below, limit))
+        return self._page(rows[::-1], lo, hi)
+
+    def page_at(self, t, start=None, end=None, limit=PAGE_ROWS):
+        """The page that starts with the first reading at or after `t` (epoch s); the newest page if there is none."""
+        page = self.page_after(self._id_after(t), start, end, limit)
+        return page if page.rows else self.page_before(None, start, end, limit)
@@ -0,0 +1,81 @@
+import json
+import queue
+import threading
+
+
+class LiveBroadcaster:
+    """
+    Fan-out of live events from the serial reader thread to Server-Sent Events clients.
+
+    publish() never blocks the reader: every client has its own bounded queue and a client that
+    stops reading loses its oldest events instead of holding up ingest. Payloads are serialised
+    once per event, not once per client.
+    """
+
+    def __init__(self, max_queue=256, heartbeat=15.0):
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    @property
+    def clients(self):
+        return len(self._subscribers)
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event, data):
+        """Send one event to every connected client."""
+        if not self._subscribers:
+            return
+        payload = self.format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(payload)
+            except queue.Full:
+                try:
+                    q.get_nowait()  # slow client: drop its oldest event
+                except queue.Empty:
+                    pass
+                self.dropped += 1
+                try:
+                    q.put_nowait(payload)
+                except queue.Full:
+                    pass
+        self.published += 1
+
+    def stream(self, initial=None):
+        """
+        Generator for a streaming HTTP response. `initial()` returns (event, data) pairs that are
+        sent first (e.g. the current table); it is called after subscribing, so nothing published
+        in between is lost. Then live events follow. A comment line goes out every
+        `heartbeat` seconds so dead connections are noticed and the worker thread is released.
+        """
+        q = self.subscribe()
+        try:
+            yield "retry: 2000\n\n"
+            for event, data in (initial() if initial else ()):
+                yield self.format_event(event, data)
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(q)
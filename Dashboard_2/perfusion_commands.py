@@ -1,3 +1,5 @@
+from frame_schema import FrameError, SENSOR_DATA
+
 
 class Perfusion:
     
@@ -25,16 +27,14 @@ class Perfusion:
     def update_data(self, data: str):
         """Extract sensor data from a string."""
         try:
-            parts = data.split(',')
-            #self._humidity = float(parts[0])
-            #self._temperature = float(parts[1])
-            self._current_pressure = float(parts[2])
-            self._tilt = float(parts[3])
-            self._gyro = (float(parts[4]), float(parts[5]), float(parts[6]))
-            self._motor_speed = float(parts[7])
-            self._motor_direction = parts[8].strip()
-            self._syringe_current_position = int(parts[9])
-        except (ValueError, IndexError) as e:
+            reading = SENSOR_DATA.as_dict(data)
+            self._current_pressure = reading["pressure"]
+            self._tilt = reading["tilt"]
+            self._gyro = (reading["gyro_x"], reading["gyro_y"], reading["gyro_z"])
+            self._motor_speed = reading["motor_speed"]
+            self._motor_direction = reading["motor_direction"]
+            self._syringe_current_position = reading["syringe_current_position"]
+        except FrameError as e:
             print(f"Error extracting sensor data: {e}")
 
 
@@ -0,0 +1,530 @@
+import datetime
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from serial import Serial
+import serial.tools.list_ports
+
+from save_data import SensorDatabase, recover_journals
+from serial_reader import SerialReader
+from telemetry_buffer import TelemetryBuffer, VALUE_COLUMNS
+from live_stream import LiveBroadcaster
+from command_channel import CommandChannel, command_stats_text
+from frame_schema import DEFAULT_SCHEMA, FrameError, is_handshake, schema_for_handshake
+from session_catalog import SessionCatalog
+from analytics import ControlAnalytics, summary_text
+from pipeline_metrics import MetricsRegistry
+from daemon_client import RigSubscription
+
+
+WORKER_METRICS_INTERVAL = 5.0  # seconds between the metrics snapshots a worker process sends
+
+# What the UI shows of a rig (see Rig.view): log is ((time text, raw frame), ...) and rows are
+# DataTable records, both newest first; version counts the views a rig has published
+LiveView = namedtuple("LiveView", "version log rows")
+
+
+def find_rig_ports(limit=None):
+    """Serial ports to run rigs on, at most `limit`.
+    Set PERFUSION_SERIAL_PORTS (comma separated) or PERFUSION_SERIAL_PORT, e.g. to
+    Simulator/virtual_arduino.py ptys, to skip the port scan."""
+    configured = os.environ.get("PERFUSION_SERIAL_PORTS") or os.environ.get("PERFUSION_SERIAL_PORT")
+    if configured:
+        return [port.strip() for port in configured.split(",") if port.strip()][:limit]
+    ports = serial.tools.list_ports.comports()
+    active_ports = [p for p in sorted(ports) if p.hwid != 'n/a']
+    if not active_ports:
+        print("❌ No active serial ports found.")
+    for p in active_ports:
+        print(f"Found serial port: {p.device} - {p.description}")
+    return [p.device for p in active_ports][:limit]
+
+
+def open_serial(port, baudrate=115200):
+    """Open one controller's port, None if that fails."""
+    try:
+        print(f"🔌 Connecting to port: {port}")
+        ser = Serial(port=port, baudrate=baudrate, timeout=1)
+        time.sleep(1)  # Wait for connection to establish
+        return ser
+    except Exception as e:
+        print(f"Error connecting to serial port {port}: {e}")
+        return None
+
+
+class SessionRecorder:
+    """
+    Session database of one rig: opened when the controller reports PERFUSING, closed when it
+    reports IDLE again. Lives next to the serial reader (in the rig's worker process).
+    With a catalog_path every session is also listed in that SessionCatalog; with journal=True
+    readings go through an ingest journal first, so a crash loses none of the uncommitted ones.
+    `metrics` (a MetricsRegistry) is handed to every session database it opens.
+    """
+
+    def __init__(self, db_dir, rig_id, store_all_frames=True, store_rate_hz=1.0,
+                 batch_size=200, flush_interval=1.0, catalog_path=None, journal=False, metrics=None):
+        self.db_dir = Path(db_dir)
+        self.rig_id = rig_id
+        self.store_all_frames = store_all_frames  # False = only the first frame of every 1/store_rate_hz s
+        self.store_rate_hz = store_rate_hz
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.metrics = metrics
+        self.db = None
+        self.db_path = None
+        self.active = False
+        self._last_slot = None
+        self.catalog = SessionCatalog(catalog_path) if catalog_path is not None else None
+        self.firmware = None  # frame schema announced by the controller, for the catalog
+        self._failed_commits = 0  # of the sessions closed so far
+
+    def make_db_filename(self):
+        """Creates a unique, timestamped filename for the database."""
+        now = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self.db_dir / f"perfusion_{self.rig_id}_{now}.db"
+
+    def record(self, values, received_at):
+        """
+        Apply session start/stop for a parsed Status() frame and store it. Returns True if the
+        reading was stored; raises if the database rejects it.
+        """
+        cmd = values[0]
+        if cmd == 1 and not self.active:  # START_PERFUSION
+            self.db_path = self.make_db_filename()
+            self.db_path.touch(exist_ok=True)
+            self.db = SensorDatabase(database_path=self.db_path, batched=True, batch_size=self.batch_size,
+                                     flush_interval=self.flush_interval, journal=self.journal,
+                                     metrics=self.metrics)
+            self.active = True
+            print(f"[{self.rig_id}] Perfusion started → logging to: {self.db_path}")
+            self._catalog("session_opened", self.db_path, self.rig_id, received_at, self.firmware)
+
+        if cmd == 0 and self.active:  # STOP_PERFUSION
+            self.active = False
+            self.db.close()  # commit whatever the writer still holds
+            self._failed_commits += self.db.failed_commits
+            self.db = None
+            print(f"[{self.rig_id}] Perfusion stopped for: {self.db_path}")
+            self._catalog("session_closed", self.db_path, received_at, self.firmware)
+
+        if not self.active:
+            return False
+        if not self.store_all_frames:
+            slot = int(received_at * self.store_rate_hz)
+            if slot == self._last_slot:
+                return False
+            self._last_slot = slot
+        self.db.insert_values(values, received_at)
+        return True
+
+    @property
+    def failed_commits(self):
+        """Group commits that failed in this recorder's sessions (the writer retries them)."""
+        return self._failed_commits + (self.db.failed_commits if self.db is not None else 0)
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self._failed_commits += self.db.failed_commits
+            self.db = None
+        if self.active:
+            self._catalog("session_closed", self.db_path, time.time(), self.firmware)
+        self.active = False
+
+    def _catalog(self, method, *args):
+        """Update the catalog; a catalog that cannot be written must not stop the recording."""
+        if self.catalog is None:
+            return
+        try:
+            getattr(self.catalog, method)(*args)
+        except Exception as e:
+            print(f"[{self.rig_id}] Session catalog not updated: {e}")
+
+
+def recover_sessions(db_dir, catalog_path=None):
+    """
+    Before the rigs start: commit what the ingest journals of sessions cut short by a crash
+    still hold, and catalog those sessions as ended. Returns {database path: rows recovered}.
+    """
+    recovered = recover_journals(db_dir)
+    if recovered and catalog_path is not None:
+        catalog = SessionCatalog(catalog_path)
+        for db_path in recovered:
+            catalog.session_closed(db_path)
+    return recovered
+
+
+class FrameIngest:
+    """
+    What happens to a decoded frame payload of one rig, in whichever process reads the port:
+    ACKs go to the command channel, a handshake selects the frame schema, and readings are
+    parsed with that schema and recorded. Returns the event for the UI side (or None).
+    With a MetricsRegistry, parsing and recording are timed (stages parse and store).
+    """
+
+    def __init__(self, rig_id, recorder, channel=None, schema=DEFAULT_SCHEMA, metrics=None):
+        self.rig_id = rig_id
+        self.recorder = recorder
+        self.channel = channel
+        self.schema = schema
+        self.metrics = metrics
+        self._failed_commits = 0
+        if metrics is not None:
+            self._parse_time = metrics.stage("parse")
+            self._store_time = metrics.stage("store")
+
+    def __call__(self, raw_data, received_at):
+        if self.channel is not None and self.channel.handle_frame(raw_data):
+            return None
+        if is_handshake(raw_data):
+            schema = schema_for_handshake(raw_data)
+            if schema is None:
+                print(f"[{self.rig_id}] Unknown handshake <{raw_data}>, keeping {self.schema.name} frames")
+            else:
+                self.recorder.firmware = schema.name
+                if schema is not self.schema:
+                    self.schema = schema
+                    print(f"[{self.rig_id}] Controller announced {schema.name} frames")
+            return ("schema", self.schema.name)
+        started = time.perf_counter() if self.metrics is not None else None
+        try:
+            values = self.schema.parse(raw_data)
+        except FrameError:
+            return ("bad_frame", raw_data, received_at)
+        if started is not None:
+            parsed = time.perf_counter()
+            self._parse_time.observe(parsed - started)
+        try:
+            stored, error = self.recorder.record(values, received_at), False
+        except Exception:
+            stored, error = False, True
+        if started is not None:
+            self._store_time.observe(time.perf_counter() - parsed)
+        db_path = str(self.recorder.db_path) if self.recorder.db_path is not None else None
+        return ("frame", raw_data, values, received_at, stored, error, db_path)
+
+    def store_event(self):
+        """("store", failed commits) when the recorder's count changed since the last call, else None."""
+        failed = self.recorder.failed_commits
+        if failed == self._failed_commits:
+            return None
+        self._failed_commits = failed
+        return ("store", failed)
+
+
+def acquisition_worker(rig_id, port, db_dir, events, commands, store_settings, metrics_interval=None):
+    """
+    Body of a rig's worker process: owns the serial port, decodes and stores every frame,
+    sends queued commands through an acknowledged CommandChannel, and forwards each frame
+    (and the command statistics) to the UI process on `events`. With a metrics_interval the
+    pipeline is timed and a metrics snapshot follows every metrics_interval seconds. Returns
+    after a None command, or once the port is lost (the session is closed, "disconnected" sent).
+    """
+    ser = open_serial(port)
+    if ser is None:
+        events.put(("disconnected", port))
+        return
+    events.put(("connected", port))
+    metrics = MetricsRegistry(rig=rig_id) if metrics_interval else None
+    recorder = SessionRecorder(db_dir, rig_id, metrics=metrics, **store_settings)
+    channel = CommandChannel(ser.write, name=rig_id, on_update=lambda stats: events.put(("commands", stats)))
+    ingest = FrameIngest(rig_id, recorder, channel, metrics=metrics)
+
+    def on_frame(raw_data, received_at):
+        event = ingest(raw_data, received_at)
+        if event is not None:
+            events.put(event)
+        event = ingest.store_event()
+        if event is not None:
+            events.put(event)
+
+    # a lost port ends the worker as a stop does, so the daemon can reopen it
+    reader = SerialReader(ser, on_frame=on_frame, metrics=metrics, on_lost=lambda error: commands.put(None))
+    reader.start()
+    try:
+        while True:
+            try:
+                cmd_history = commands.get(timeout=metrics_interval)
+            except queue.Empty:
+                events.put(("metrics", metrics.snapshot()))
+                continue
+            if cmd_history is None:
+                break
+            channel.submit(cmd_history)
+    finally:
+        channel.close()
+        reader.close()
+        recorder.close()
+        ser.close()
+    if reader.lost is not None:
+        events.put(("disconnected", port))
+
+
+class Rig:
+    """
+    One perfusion rig (controller on one serial port) as seen by the UI: live buffers, counters,
+    event stream and command channel.
+
+    With use_process=True the port is read, decoded and stored in a worker process of its own,
+    so several rigs use several cores; only decoded frames come back over a queue. With
+    use_process=False (tests, single rig) the same work runs on a reader thread. With a
+    daemon_socket the rig attaches to acquisition_daemon.py, which owns the port, the session
+    databases and the command channel, instead: restarting the UI does not pause the capture.
+
+    The thread that applies frames publishes the log and table as one immutable LiveView in
+    `view`; Dash callbacks read that attribute once, without locks, and never see it change.
+
+    metrics=True times every stage of the pipeline (see pipeline_metrics.py); metrics_snapshot()
+    returns them, together with the last snapshot of the worker process.
+    """
+
+    def __init__(self, rig_id, port, db_dir, use_process=True, display_rate_hz=1.0,
+                 telemetry_capacity=86400, table_size=10, log_size=15, metrics=False, daemon_socket=None,
+                 **store_settings):
+        self.rig_id = rig_id
+        self.port = port
+        self.db_dir = Path(db_dir)
+        self.use_process = use_process
+        self.daemon_socket = daemon_socket
+        self.display_rate_hz = display_rate_hz  # Frames per second that reach the log and table (UI only)
+        store_settings.setdefault("store_rate_hz", display_rate_hz)  # the legacy sampled store follows the display
+        self.store_settings = store_settings
+        self.table_size = table_size
+        self.log_size = log_size
+
+        self.view = LiveView(0, (), ())  # replaced whole, never modified
+        self.telemetry = TelemetryBuffer(capacity=telemetry_capacity)  # every frame
+        self.broadcaster = LiveBroadcaster()
+        self.ingest_stats = {"received": 0, "stored": 0, "store_errors": 0, "bad_frames": 0, "displayed": 0,
+                             "failed_commits": 0}
+        self.schema_name = DEFAULT_SCHEMA.name  # frame layout announced by the controller
+        self.command_stats = {}  # CommandChannel.stats() of the last update
+        self.analytics = ControlAnalytics()  # control performance of the current session, from telemetry
+        self._analytics_lock = threading.Lock()
+        self.db_path = None  # current/last session database
+        self.connected = False
+        self.last_display_slot = None
+
+        self._ingest = None
+        self._ser = None
+        self._reader = None
+        self._channel = None
+        self._worker = None
+        self._events = None
+        self._commands = None
+        self._subscription = None
+
+        self.metrics = None
+        self.worker_metrics = []  # last MetricsRegistry.snapshot() of the worker process
+        if metrics:
+            self.metrics = MetricsRegistry(rig=rig_id)
+            self._apply_time = self.metrics.stage("apply")
+            self._lag = self.metrics.histogram("perfusion_ingest_lag_seconds",
+                                               "Seconds from a frame's arrival until it is in the UI buffers")
+            for key in ("received", "stored", "store_errors", "bad_frames", "displayed"):
+                self.metrics.counter("perfusion_frames_total", "Frames by what became of them",
+                                     function=lambda key=key: self.ingest_stats[key], result=key)
+            self.metrics.gauge("perfusion_queue_depth", "Items waiting in a pipeline queue",
+                               function=self._events_waiting, queue="events")
+
+    def __repr__(self):
+        return f"Rig({self.rig_id!r}, {self.port!r})"
+
+    # --- acquisition ---
+    def start(self):
+        if self.daemon_socket is not None:
+            self._subscription = RigSubscription(self.daemon_socket, self.rig_id, on_event=self._link_event)
+            self._subscription.start()
+        elif self.use_process:
+            ctx = multiprocessing.get_context("spawn")  # no fork of a threaded server
+            self._events = ctx.Queue()
+            self._commands = ctx.Queue()
+            self._worker = ctx.Process(
+                target=acquisition_worker, name=f"rig-{self.rig_id}", daemon=True,
+                args=(self.rig_id, self.port, str(self.db_dir), self._events, self._commands, self.store_settings,
+                      WORKER_METRICS_INTERVAL if self.metrics is not None else None))
+            self._worker.start()
+            threading.Thread(target=self._pump_events, name=f"rig-{self.rig_id}-events", daemon=True).start()
+        else:
+            self._ser = open_serial(self.port)
+            if self._ser is None:
+                return
+            self.connected = True
+            self._channel = CommandChannel(self._ser.write, name=self.rig_id, on_update=self._set_command_stats)
+            self._ingest = self._make_ingest(self._channel)
+            self._reader = SerialReader(self._ser, on_frame=self.handle_frame, metrics=self.metrics,
+                                        on_lost=self._port_lost)
+            self._reader.start()
+
+    def stop(self, timeout=5.0):
+        if self._subscription is not None:
+            self._subscription.stop(timeout)  # the daemon keeps recording
+        if self._worker is not None:
+            self._commands.put(None)
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                self._worker.terminate()
+            self._events.put(("stopped", None))
+        if self._reader is not None:
+            self._reader.close()
+            self._channel.close()
+            self._ser.close()
+        if self._ingest is not None:
+            self._ingest.recorder.close()
+        self.connected = False
+
+    def _port_lost(self, error):
+        """On the reader thread, once the port is gone: end the session as the worker does."""
+        self.connected = False
+        self._ingest.recorder.close()
+
+    def _make_ingest(self, channel=None):
+        recorder = SessionRecorder(self.db_dir, self.rig_id, metrics=self.metrics, **self.store_settings)
+        return FrameIngest(self.rig_id, recorder, channel, metrics=self.metrics)
+
+    def _events_waiting(self):
+        return self._events.qsize() if self._events is not None else 0
+
+    def _pump_events(self):
+        """UI process side of the worker: apply forwarded frames to the live buffers."""
+        while True:
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                if not self._worker.is_alive():
+                    self.connected = False
+                    return
+                continue
+            if not self._link_event(event):
+                return
+
+    def _link_event(self, event):
+        """Apply an event of the worker or daemon; False once the port is gone."""
+        kind = event[0]
+        if kind == "connected":
+            self.connected = True
+        elif kind in ("disconnected", "stopped"):
+            self.connected = False
+            return False
+        else:
+            self.apply_event(event)
+        return True
+
+    def apply_event(self, event):
+        """Apply a FrameIngest event (or command statistics) to the live state."""
+        kind = event[0]
+        if kind == "frame":
+            if self.metrics is None:
+                self.apply_frame(*event[1:])
+            else:
+                with self._apply_time.time():
+                    self.apply_frame(*event[1:])
+                self._lag.observe(time.time() - event[3])
+        elif kind == "metrics":
+            self.worker_metrics = event[1]
+        elif kind == "schema":
+            self.schema_name = event[1]
+        elif kind == "bad_frame":
+            self.ingest_stats["bad_frames"] += 1
+        elif kind == "store":
+            self.ingest_stats["failed_commits"] = event[1]
+        elif kind == "commands":
+            self._set_command_stats(event[1])
+
+    def handle_frame(self, raw_data, current_time):
+        """Record and show one frame in this process (use_process=False)."""
+        if self._ingest is None:
+            self._ingest = self._make_ingest()
+        for event in (self._ingest(raw_data, current_time), self._ingest.store_event()):
+            if event is not None:
+                self.apply_event(event)
+
+    def apply_frame(self, raw_data, values, current_time, stored, error, db_path):
+        """Count every parsed frame; only display_rate_hz frames per second reach the UI."""
+        timestamp = time.strftime('%H:%M:%S', time.localtime(current_time))
+        self.ingest_stats["received"] += 1
+        self.ingest_stats["stored"] += stored
+        self.ingest_stats["store_errors"] += error
+        if db_path is not None:
+            db_path = Path(db_path)
+            if db_path != self.db_path:  # a new session: its analytics start with this frame
+                self.analytics = ControlAnalytics().start_at(self.telemetry)
+            self.db_path = db_path
+        self.telemetry.append(current_time, values)
+
+        display_slot = int(current_time * self.display_rate_hz)
+        if display_slot == self.last_display_slot:
+            return
+        self.last_display_slot = display_slot
+        self.ingest_stats["displayed"] += 1
+
+        # Publish the next view in one assignment: readers hold either this one or the last
+        view = self.view
+        line = (timestamp, raw_data)
+        rows = view.rows
+        if values[0] != 0:
+            rows = (table_record(current_time, values),) + rows[:self.table_size - 1]
+        self.view = LiveView(view.version + 1, (line,) + view.log[:self.log_size - 1], rows)
+
+        self.broadcaster.publish("log", {"line": list(line), "stats": self.ingest_stats_text()})
+        if rows is not view.rows:
+            self.broadcaster.publish("row", rows[0])
+
+    # --- commands ---
+    def send_commands(self, cmd_history):
+        """Queue the commands for this rig's controller (sent, acknowledged and retried by its CommandChannel)."""
+        if not self.connected:
+            print(f"[{self.rig_id}] Serial port not available. Cannot send command.")
+            return
+        if self._subscription is not None:
+            self._subscription.submit(cmd_history)  # the daemon owns the channel
+        elif self._commands is not None:
+            self._commands.put(list(cmd_history))  # the worker process owns the channel
+        else:
+            self._channel.submit(cmd_history)
+
+    def _set_command_stats(self, stats):
+        self.command_stats = stats
+        self.broadcaster.publish("commands", {"stats": self.ingest_stats_text()})
+
+    # --- views ---
+    def ingest_stats_text(self):
+        stats = self.ingest_stats
+        return (f"Frames received: {stats['received']} · stored: {stats['stored']} · "
+                f"store errors: {stats['store_errors']} · "
+                + (f"failed commits (retried): {stats['failed_commits']} · " if stats["failed_commits"] else "")
+                + (f"rejected ({self.schema_name}): {stats['bad_frames']} · " if stats["bad_frames"] else "")
+                + f"shown at {self.display_rate_hz:g} Hz · " + command_stats_text(self.command_stats))
+
+    def metrics_snapshot(self):
+        """Pipeline metrics of this rig, from this process and from its worker (empty without metrics=True)."""
+        if self.metrics is None:
+            return []
+        return self.metrics.snapshot() + self.worker_metrics
+
+    def control_summary(self):
+        """ControlAnalytics summary of the current session, brought up to date with the telemetry."""
+        with self._analytics_lock:  # several callbacks may ask at once
+            return self.analytics.update_from_buffer(self.telemetry).summary()
+
+    def control_summary_text(self):
+        return summary_text(self.control_summary())
+
+    def table_records(self, n=None):
+        """Newest `n` table rows as DataTable records (newest first)."""
+        return list(self.view.rows[:n])
+
+
+def table_record(current_time, values):
+    """One DataTable record of a displayed frame: "t" is the epoch time, "0" the time text,
+    "1".. the VALUE_COLUMNS."""
+    record = {"t": current_time, "0": time.strftime('%H:%M:%S', time.localtime(current_time))}
+    for i, value in enumerate(values[:len(VALUE_COLUMNS)], start=1):
+        record[str(i)] = float(value)
+    return record
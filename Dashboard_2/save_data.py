@@ -1,33 +1,236 @@
+import atexit
+import queue
 import sqlite3
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import numpy as np
+
+from ingest_journal import IngestJournal, journal_path, read_journal, JOURNAL_SUFFIX
+
+
+# Schema versions (PRAGMA user_version):
+#   1  (user_version 0) timestamp TEXT filled in by SQLite with datetime('now', 'localtime') at
+#      insert time, one second resolution; AUTOINCREMENT id, and a redundant idx_id on it in
+#      databases written by the Streamlit dashboard
+#   2  timestamp INTEGER, epoch microseconds (UTC) taken when the frame was received
+SCHEMA_VERSION = 2
+
+READING_COLUMNS = ("perfusion_state", "valve_state", "humidity", "temperature", "envir_pressure",
+                   "AQI", "current_pressure", "target_pressure", "motor_speed")
+
+CREATE_READINGS_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        timestamp INTEGER NOT NULL,
+        perfusion_state INTEGER,
+        valve_state INTEGER,
+        humidity REAL,
+        temperature REAL,
+        envir_pressure REAL,
+        AQI REAL,
+        current_pressure REAL,
+        target_pressure REAL,
+        motor_speed REAL
+    )
+'''
+
+# Columns of SensorDatabase.fetch_after(), in this order
+FETCH_COLUMNS = ("id", "timestamp") + READING_COLUMNS
+FETCH_LIMIT = 10000  # rows per fetch_after() call by default
+
+INSERT_READING_SQL = f'''
+    INSERT INTO sensor_readings (timestamp, {", ".join(READING_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Rollups of sensor_readings: count/min/max/sum of ROLLUP_COLUMNS per bucket of each of
+# ROLLUP_RESOLUTIONS seconds, kept up to date in the same transaction as the raw rows so
+# overview queries of long runs read a few thousand buckets instead of every reading.
+ROLLUP_COLUMNS = ("current_pressure", "target_pressure", "temperature", "motor_speed")
+ROLLUP_RESOLUTIONS = (1, 60, 3600)
+
+CREATE_ROLLUPS_SQL = f'''
+    CREATE TABLE IF NOT EXISTS sensor_rollups (
+        resolution INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        {", ".join(f"{c}_min REAL, {c}_max REAL, {c}_sum REAL" for c in ROLLUP_COLUMNS)},
+        PRIMARY KEY (resolution, bucket)
+    ) WITHOUT ROWID
+'''
+
+# Folds the readings with id > ? into the buckets of one resolution (bucket = UTC epoch start)
+UPDATE_ROLLUP_SQL = f'''
+    INSERT INTO sensor_rollups (resolution, bucket, n,
+        {", ".join(f"{c}_min, {c}_max, {c}_sum" for c in ROLLUP_COLUMNS)})
+    SELECT ?1, timestamp / 1000000 / ?1 * ?1 AS b, COUNT(*),
+        {", ".join(f"MIN({c}), MAX({c}), TOTAL({c})" for c in ROLLUP_COLUMNS)}
+    FROM sensor_readings WHERE id > ?2 GROUP BY b
+    ON CONFLICT (resolution, bucket) DO UPDATE SET n = n + excluded.n,
+        {", ".join(f"{c}_min = MIN(IFNULL({c}_min, excluded.{c}_min), IFNULL(excluded.{c}_min, {c}_min)), "
+                   f"{c}_max = MAX(IFNULL({c}_max, excluded.{c}_max), IFNULL(excluded.{c}_max, {c}_max)), "
+                   f"{c}_sum = {c}_sum + excluded.{c}_sum" for c in ROLLUP_COLUMNS)}
+'''
+
+
+def to_us(epoch_s):
+    """Epoch seconds (time.time()) → a schema 2 timestamp."""
+    return round(epoch_s * 1_000_000)
+
+
+def schema_version(conn):
+    """Schema of a database's sensor_readings (see SCHEMA_VERSION); 1 if it was never numbered."""
+    return conn.execute("PRAGMA user_version").fetchone()[0] or 1
+
+
+def epoch_seconds_sql(version, column="timestamp"):
+    """SQL for `column` in epoch seconds, for readers that may open databases of either schema."""
+    if version >= 2:
+        return f"{column} / 1e6"
+    return f"CAST(strftime('%s', {column}, 'utc') AS REAL)"
+
+
+def last_reading_id(conn):
+    return conn.execute("SELECT IFNULL(MAX(id), 0) FROM sensor_readings").fetchone()[0]
+
+
+def update_rollups(conn, after_id):
+    """Add the readings with id > after_id to every rollup resolution (caller commits)."""
+    for resolution in ROLLUP_RESOLUTIONS:
+        conn.execute(UPDATE_ROLLUP_SQL, (resolution, after_id))
+
+
+def rebuild_rollups(conn):
+    """Recompute all rollups from sensor_readings, e.g. for a database written before them."""
+    with conn:
+        conn.execute("DELETE FROM sensor_rollups")
+        update_rollups(conn, 0)
+
+
+def upgrade_schema(conn):
+    """
+    Convert a schema 1 sensor_readings to the current schema in place: the local time TEXT
+    timestamps become epoch microseconds (converted with the time zone rules of each reading's
+    date), ids are kept, idx_id goes and the rollups are recomputed. Runs as one transaction,
+    so an interrupted upgrade leaves the old table. `conn` must be in autocommit mode
+    (isolation_level=None). Returns the number of rows converted, None if already current.
+    """
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return None
+    columns = ", ".join(READING_COLUMNS)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(CREATE_READINGS_SQL.format(table="sensor_readings_upgrade"))
+        rows = conn.execute(
+            f"INSERT INTO sensor_readings_upgrade (id, timestamp, {columns}) "
+            f"SELECT id, CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000000, {columns} "
+            "FROM sensor_readings ORDER BY id").rowcount
+        conn.execute("DROP TABLE sensor_readings")  # and with it idx_timestamp, idx_id
+        conn.execute("ALTER TABLE sensor_readings_upgrade RENAME TO sensor_readings")
+        conn.execute("CREATE INDEX idx_timestamp ON sensor_readings(timestamp)")
+        conn.execute("DROP TABLE IF EXISTS sensor_rollups")
+        conn.execute(CREATE_ROLLUPS_SQL)
+        update_rollups(conn, 0)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return rows
+
+
+def replay_journal(database_path):
+    """
+    Commit the records of the database's ingest journal that it is missing, then delete the
+    journal. Readings are only ever appended and committed in order, so the rows committed
+    since the journal was started are its first records. Returns the number of rows added.
+    """
+    path = journal_path(database_path)
+    if not path.exists():
+        return 0
+    base_id, records = read_journal(path)
+    conn = sqlite3.connect(database_path)
+    try:
+        with conn:
+            after_id = last_reading_id(conn)
+            missing = records[max(after_id - base_id, 0):]
+            conn.executemany(INSERT_READING_SQL, [(to_us(received_at), *values) for received_at, values in missing])
+            update_rollups(conn, after_id)
+    finally:
+        conn.close()
+    path.unlink()
+    return len(missing)
+
+
+def recover_journals(db_dir):
+    """Replay the journals a crash left in `db_dir`. Returns {database path: rows recovered}."""
+    recovered = {}
+    for path in sorted(Path(db_dir).glob(f"*.db{JOURNAL_SUFFIX}")):
+        database_path = path.with_suffix("")
+        if not database_path.exists():
+            continue
+        SensorDatabase(database_path=database_path)  # creates tables of a file that never got any
+        recovered[database_path] = replay_journal(database_path)
+        print(f"Recovered {recovered[database_path]} reading(s) from {path.name}")
+    return recovered
+
 
 
 class SensorDatabase:
-    def __init__(self, database_path='sensor_data.db'):
+    def __init__(self, database_path='sensor_data.db', batched=False,
+                 batch_size=200, flush_interval=1.0, queue_size=10000,
+                 journal=False, journal_sync_interval=0.2, metrics=None):
+        """
+        batched=False keeps the original behaviour (one connection and one commit per reading).
+        batched=True hands readings to a background writer that owns a single WAL connection
+        and commits them in groups of `batch_size` rows or every `flush_interval` seconds.
+        journal=True first appends every reading to an ingest journal (see ingest_journal.py),
+        so uncommitted readings survive a crash; a journal left by one is replayed here. The
+        writer checkpoints it after every group commit, so it never holds more than the
+        readings still waiting for one.
+        metrics (a pipeline_metrics.MetricsRegistry) times the writer's commits.
+        """
         self.database_path = database_path
         self._create_table()
-        
+        self._journal = None
+        if journal:
+            replay_journal(database_path)
+            with sqlite3.connect(database_path) as conn:
+                base_id = last_reading_id(conn)
+            conn.close()
+            self._journal = IngestJournal(journal_path(database_path), base_id=base_id,
+                                          sync_interval=journal_sync_interval)
+        self._reader = None  # read-only connection of fetch_after() & co, opened on first use
+        self._reader_lock = threading.Lock()
+        self._writer = None
+        if batched:
+            self._writer = GroupCommitWriter(database_path, batch_size=batch_size, flush_interval=flush_interval,
+                                             queue_size=queue_size, metrics=metrics,
+                                             on_commit=self._journal.checkpoint if self._journal is not None else None)
+
     def _create_table(self):
-        """Create optimized table structure with necessary index"""
-        with sqlite3.connect(self.database_path, isolation_level=None) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS sensor_readings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
-                    perfusion_state INTEGER,
-                    valve_state INTEGER,
-                    humidity REAL,
-                    temperature REAL,
-                    envir_pressure REAL,
-                    AQI REAL,
-                    current_pressure REAL,
-                    target_pressure REAL,
-                    motor_speed REAL
-                )
-            ''')
-            # Create index for timestamp queries only
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)')
-            conn.commit()
+        """Create the tables, or bring a database written with an older schema up to date"""
+        conn = sqlite3.connect(self.database_path, isolation_level=None)
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sensor_readings'").fetchone()
+            if exists:
+                upgrade_schema(conn)
+            else:
+                conn.execute(CREATE_READINGS_SQL.format(table="sensor_readings"))
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            # Range scans by time (plots, exports of a stretch); id order is the rowid itself
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_readings(timestamp)')
+            has_rollups = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sensor_rollups'").fetchone()
+            conn.execute(CREATE_ROLLUPS_SQL)
+            if not has_rollups and last_reading_id(conn):
+                update_rollups(conn, 0)  # session recorded before rollups existed
+        finally:
+            conn.close()
 
     def insert_reading(self, sensor_data):
         """Efficiently insert a sensor reading with optimized cleaning"""
@@ -35,7 +238,7 @@ class SensorDatabase:
             raise ValueError(
                 f"Expected 9 numeric fields, but got {len(sensor_data)}: {sensor_data!r}"
             )
-        
+
         cleaned = []
         for item in sensor_data[:9]:  # Process only first 9 items
             s = str(item).strip()
@@ -47,19 +250,322 @@ class SensorDatabase:
                 cleaned.append(val)
             except ValueError:
                 continue  # Skip non-numeric
-        
+
         if len(cleaned) != 9:
             raise ValueError(
                 f"Expected 9 numeric fields, but got {len(cleaned)} after cleaning"
             )
-        
-        with sqlite3.connect(self.database_path, isolation_level=None) as conn:
-            conn.execute('''
-                INSERT INTO sensor_readings (
-                    perfusion_state, valve_state, humidity, temperature, 
-                    envir_pressure, AQI, current_pressure, target_pressure, motor_speed
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', cleaned)
-            conn.commit()
-
-        
\ No newline at end of file
+
+        self.insert_values(tuple(cleaned))
+
+    def insert_values(self, values, received_at=None):
+        """Insert a reading that is already typed, e.g. parsed by a frame_schema FrameSchema.
+        received_at (epoch seconds, default now) is the time the frame arrived."""
+        if received_at is None:
+            received_at = time.time()
+        if self._journal is not None:
+            self._journal.append(received_at, values)
+        row = (to_us(received_at), *values)
+        if self._writer is not None:
+            self._writer.put(row)
+            return
+
+        with sqlite3.connect(self.database_path) as conn:  # commits reading and rollups together
+            after_id = last_reading_id(conn)
+            conn.execute(INSERT_READING_SQL, row)
+            update_rollups(conn, after_id)
+        conn.close()
+
+    def flush(self, timeout=None):
+        """Block until every queued reading is committed. No-op for unbatched databases."""
+        if self._writer is not None:
+            return self._writer.flush(timeout)
+        return True
+
+    @property
+    def failed_commits(self):
+        """Group commits that failed so far (their rows are retried); 0 for unbatched databases."""
+        return self._writer.failed_commits if self._writer is not None else 0
+
+    def close(self):
+        """Flush pending readings and stop the background writer (if any). Returns True if every
+        reading was committed; if not, the ingest journal is kept and replayed on the next open."""
+        committed = self._writer.close() if self._writer is not None else True
+        if self._journal is not None:
+            self._journal.close(remove=committed)
+            if not committed:
+                print(f"{self._writer.uncommitted} reading(s) of {self.database_path} not committed, "
+                      f"kept in {journal_path(self.database_path).name}")
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        return committed
+
+    def _reader_connection(self):
+        """The persistent read-only connection (call with _reader_lock held)."""
+        if self._reader is None:
+            # autocommit: every query sees what the writer has committed until then
+            self._reader = sqlite3.connect(f"file:{self.database_path}?mode=ro", uri=True,
+                                           isolation_level=None, check_same_thread=False)
+        return self._reader
+
+    def _read(self, query, params=()):
+        with self._reader_lock:
+            return self._reader_connection().execute(query, params).fetchall()
+
+    def fetch_after(self, after_id=0, limit=FETCH_LIMIT, fmt="numpy"):
+        """
+        Keyset read of the readings with id > after_id, oldest first, at most `limit` (None = all):
+        a range scan of the rowid, so a consumer that polls with the last id it got pays only for
+        the rows committed since. Returns (columns, last_id), last_id being the after_id of the
+        next call. Columns are FETCH_COLUMNS as NumPy arrays (id int64, timestamp epoch seconds,
+        readings float64 with NaN for NULL), or with fmt="arrow" a pyarrow Table of the same
+        columns with the timestamp as timestamp[us, UTC].
+        """
+        if fmt not in ("numpy", "arrow"):
+            raise ValueError(f"Unknown format {fmt!r}, expected 'numpy' or 'arrow'")
+        rows = self._read(f"SELECT {', '.join(FETCH_COLUMNS)} FROM sensor_readings WHERE id > ? ORDER BY id LIMIT ?",
+                          (after_id, -1 if limit is None else limit))
+        return fetched_columns(rows, fmt), (rows[-1][0] if rows else after_id)
+
+    def id_before(self, since):
+        """The after_id that makes fetch_after() start with the first reading received after
+        `since` (epoch seconds), found through idx_timestamp."""
+        row = self._read("SELECT id FROM sensor_readings WHERE timestamp > ? ORDER BY timestamp LIMIT 1",
+                         (to_us(since),))
+        if row:
+            return row[0][0] - 1
+        return self._read("SELECT IFNULL(MAX(id), 0) FROM sensor_readings")[0][0]
+
+    def cursor(self, after_id=0, since=None):
+        """ReadingCursor after reading `after_id`, or after the readings up to `since` (epoch seconds)."""
+        return ReadingCursor(self, after_id if since is None else self.id_before(since))
+
+
+class ReadingCursor:
+    """
+    Watermark of a polling consumer (chart, exporter, remote viewer): every fetch() returns the
+    readings committed since the previous one, see SensorDatabase.fetch_after().
+    """
+
+    def __init__(self, db, after_id=0):
+        self.db = db
+        self.last_id = after_id
+
+    def fetch(self, limit=FETCH_LIMIT, fmt="numpy"):
+        columns, self.last_id = self.db.fetch_after(self.last_id, limit, fmt)
+        return columns
+
+
+def fetched_columns(rows, fmt="numpy"):
+    """FETCH_COLUMNS rows → {name: NumPy array} or a pyarrow Table (see SensorDatabase.fetch_after)."""
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(FETCH_COLUMNS))
+    ids = data[:, 0].astype(np.int64)
+    timestamps = data[:, 1].astype(np.int64)  # epoch µs, exact in a float64 until the year 2255
+    if fmt == "arrow":
+        import pyarrow as pa  # only needed by Arrow consumers, not by the acquisition
+
+        arrays = [pa.array(ids), pa.array(timestamps, type=pa.timestamp("us", tz="UTC"))]
+        arrays += [pa.array(data[:, i]) for i in range(2, len(FETCH_COLUMNS))]
+        return pa.table(arrays, names=list(FETCH_COLUMNS))
+    columns = {"id": ids, "timestamp": timestamps / 1e6}
+    for i, name in enumerate(READING_COLUMNS, start=2):
+        columns[name] = data[:, i]
+    return columns
+
+
+class GroupCommitWriter:
+    """
+    Background writer thread for SensorDatabase.
+
+    The serial reader only pays for a queue.put(); the writer thread keeps one long-lived
+    connection in WAL mode and commits with executemany() once `batch_size` rows are waiting
+    or `flush_interval` seconds have passed since the first uncommitted row.
+    The queue is bounded, so a stalled disk slows the reader down instead of eating the RAM.
+
+    A batch whose commit fails is kept and retried every `flush_interval` before anything else
+    is taken from the queue, so the committed rows are always a prefix of the queued ones (and
+    of the ingest journal). `failed_commits` counts the failures, and close() returns False if
+    rows were left uncommitted. If the thread dies, put() and flush() raise/return False instead
+    of blocking on a queue nobody empties.
+    """
+
+    _STOP = object()
+
+    def __init__(self, database_path, batch_size=200, flush_interval=1.0, queue_size=10000, metrics=None,
+                 on_commit=None):
+        self.database_path = database_path
+        self.on_commit = on_commit  # called with the last committed row id, on the writer thread
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._wake = threading.Event()  # cuts a retry wait short on close()
+        self.rows_written = 0
+        self.commits = 0
+        self.failed_commits = 0
+        self.error = None  # exception of the last failed commit (None once one succeeds), or the one that stopped the thread
+        self.uncommitted = 0  # rows left when the thread ended
+
+        self._commit_time = self._batch_rows = None
+        if metrics is not None:
+            self._commit_time = metrics.stage("commit")
+            self._batch_rows = metrics.histogram("perfusion_commit_rows", "Readings per group commit",
+                                                 buckets=(1, 10, 50, 100, 200, 500, 1000, 5000))
+            metrics.gauge("perfusion_queue_depth", "Items waiting in a pipeline queue",
+                          function=self._queue.qsize, queue="writer")
+            metrics.counter("perfusion_commit_failures_total", "Group commits that failed (their rows are retried)",
+                            function=lambda: self.failed_commits)
+
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+        # Daemon threads are killed at interpreter exit, make sure the tail gets on disk
+        atexit.register(self.close)
+
+    def _check_alive(self):
+        if not self._thread.is_alive():
+            raise RuntimeError(f"Writer for {self.database_path} has stopped: {self.error!r}")
+
+    def put(self, row):
+        """Queue one row (timestamp, *values) (blocks while the queue is full)."""
+        if self._closed:
+            raise RuntimeError(f"Writer for {self.database_path} is closed")
+        self._check_alive()
+        while True:
+            try:
+                self._queue.put(row, timeout=1.0)
+                return
+            except queue.Full:
+                self._check_alive()
+
+    def flush(self, timeout=None):
+        """Commit everything queued so far. Returns False if `timeout` expired first, a commit
+        is failing or the writer has stopped."""
+        if self._closed:
+            return self.uncommitted == 0
+        done = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                self._queue.put(done, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                    return False
+        while not done.wait(0.1):
+            if self.error is not None or not self._thread.is_alive():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        return self.error is None
+
+    def close(self):
+        """Commit what is queued and stop the thread. Returns True if every row was committed."""
+        if self._closed:
+            return self.uncommitted == 0
+        self._closed = True
+        self._wake.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.put(self._STOP, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self._thread.join()
+        atexit.unregister(self.close)
+        # rows the thread never got to, e.g. because it died
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                self.uncommitted += 1
+        return self.uncommitted == 0
+
+    def _open_connection(self):
+        conn = sqlite3.connect(self.database_path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # In WAL mode NORMAL only syncs on checkpoints, not on every commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _commit(self, conn, pending):
+        """Commit `pending`, retrying every flush_interval while it fails. Returns False if the
+        writer was closed before the rows could be committed (they stay in `pending`)."""
+        while pending:
+            started = time.perf_counter()
+            try:
+                with conn:
+                    after_id = last_reading_id(conn)
+                    conn.executemany(INSERT_READING_SQL, pending)
+                    update_rollups(conn, after_id)  # one grouped upsert per resolution for the whole batch
+            except sqlite3.Error as e:
+                self.failed_commits += 1
+                self.error = e
+                print(f"DB batch insert failed ({len(pending)} rows), retrying: {e}")
+                if self._closed:
+                    return False
+                self._wake.wait(self.flush_interval)
+                continue
+            self.rows_written += len(pending)
+            self.commits += 1
+            self.error = None
+            if self._commit_time is not None:
+                self._commit_time.observe(time.perf_counter() - started)
+                self._batch_rows.observe(len(pending))
+            if self.on_commit is not None:
+                try:
+                    self.on_commit(after_id + len(pending))
+                except OSError as e:  # the rows are committed all the same
+                    print(f"Journal of {self.database_path} not checkpointed: {e}")
+            pending.clear()
+        return True
+
+    def _run(self):
+        conn = self._open_connection()
+        pending = []
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    # flush_interval expired
+                    if not self._commit(conn, pending):
+                        break  # closed while the commit was failing: the journal keeps the rest
+                    deadline = None
+                    continue
+
+                if item is self._STOP:
+                    self._commit(conn, pending)
+                    break
+                if isinstance(item, threading.Event):
+                    committed = self._commit(conn, pending)
+                    deadline = None
+                    item.set()
+                    if not committed:
+                        break
+                    continue
+
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) >= self.batch_size:
+                    if not self._commit(conn, pending):
+                        break
+                    deadline = None
+        except Exception as e:
+            self.error = e  # put() and flush() report it from now on
+            print(f"DB writer for {self.database_path} stopped:")
+            traceback.print_exc()
+        finally:
+            self.uncommitted = len(pending)
+            # Fold the -wal file back into the .db so the session file can be copied on its own
+            try:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error:
+                pass
+            conn.close()
@@ -0,0 +1,155 @@
+import os
+import queue
+import selectors
+import threading
+import time
+
+from binary_frames import AutoFrameDecoder
+
+
+class SerialReader:
+    """
+    Event-driven reader for an open Serial port.
+
+    On POSIX the thread sleeps in select() on the port's file descriptor and wakes up exactly
+    when bytes arrive, instead of polling `in_waiting` and sleeping 100 ms. Where the port has
+    no pollable descriptor (Windows) it falls back to a blocking read of the first byte, which
+    pyserial also wakes up on as soon as data is there.
+
+    Every complete frame is delivered as (raw_data: str, received_at: float epoch seconds):
+      - to `on_frame(raw_data, received_at)` if given (called on the reader thread),
+      - and/or put on `frame_queue` as a (received_at, raw_data) tuple.
+
+    A port that fails while it is read (unplugged, EIO) ends the reader: the error is kept in
+    `lost` and `on_lost(error)` is called on the reader thread, so the owner can close the
+    session and reopen the port. stop() ends it without either.
+
+    With a pipeline_metrics.MetricsRegistry, the reads and the frame splitting are timed
+    (stages serial_read and frame_split) and the bytes still waiting for a frame end are exposed.
+    """
+
+    def __init__(self, ser, on_frame=None, frame_queue=None, decoder=None, read_timeout=1.0, metrics=None,
+                 on_lost=None):
+        if on_frame is None and frame_queue is None:
+            frame_queue = queue.Queue()
+        self.ser = ser
+        self.on_frame = on_frame
+        self.frame_queue = frame_queue
+        self.decoder = decoder or AutoFrameDecoder()
+        self.read_timeout = read_timeout
+        self.on_lost = on_lost
+        self.errors = 0
+        self.lost = None  # the error that ended the reader
+
+        self.metrics = metrics
+        if metrics is not None:
+            self._read_time = metrics.stage("serial_read")
+            self._split_time = metrics.stage("frame_split")
+            self._bytes = metrics.counter("perfusion_serial_bytes_total", "Bytes read from the serial port")
+            metrics.gauge("perfusion_decoder_pending_bytes", "Bytes read but not yet part of a complete frame",
+                          function=self.decoder.pending)
+
+        self._running = False
+        self._thread = None
+        self._wake_r, self._wake_w = os.pipe()
+
+    def _fileno(self):
+        try:
+            return self.ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def _deliver(self, chunk):
+        received_at = time.time()
+        if self.metrics is None:
+            frames = self.decoder.feed(chunk)
+        else:
+            started = time.perf_counter()
+            frames = self.decoder.feed(chunk)
+            self._split_time.observe(time.perf_counter() - started)
+            self._bytes.inc(len(chunk))
+        for frame in frames:
+            raw_data = frame.decode('utf-8', errors='replace').strip()
+            if self.on_frame is not None:
+                self.on_frame(raw_data, received_at)
+            if self.frame_queue is not None:
+                self.frame_queue.put((received_at, raw_data))
+
+    def _read_available(self):
+        if self.metrics is None:
+            return self.ser.read(self.ser.in_waiting or 1)
+        started = time.perf_counter()
+        chunk = self.ser.read(self.ser.in_waiting or 1)
+        self._read_time.observe(time.perf_counter() - started)
+        return chunk
+
+    def _next_chunk(self, selector, fd):
+        """The bytes that have arrived; b"" if none did within read_timeout or stop() woke us."""
+        if selector is None:
+            # pyserial returns as soon as the first byte arrives (or after its timeout)
+            chunk = self.ser.read(1)
+            if chunk and self.ser.in_waiting:
+                chunk += self.ser.read(self.ser.in_waiting)
+            return chunk
+        events = selector.select(timeout=self.read_timeout)
+        if not self._running or not any(key.fd == fd for key, _ in events):
+            return b""
+        return self._read_available()
+
+    def run(self):
+        """Read until stop() is called or the port is lost. Blocks; use start() for a background thread."""
+        self._running = True
+        fd = self._fileno()
+        selector = None
+        if fd is not None:
+            selector = selectors.DefaultSelector()
+            selector.register(fd, selectors.EVENT_READ)
+            selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while self._running:
+                try:
+                    chunk = self._next_chunk(selector, fd)
+                except OSError as e:  # SerialException is one too: the port is gone (unplugged, EIO)
+                    if self._running:  # not just closed under a stop()ped reader
+                        self.lost = e
+                    break
+                try:
+                    if chunk:
+                        self._deliver(chunk)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Serial error: {e}")
+                    time.sleep(1)
+        finally:
+            if selector is not None:
+                selector.close()
+        if self.lost is not None:
+            self._running = False
+            self.errors += 1
+            print(f"Serial port lost: {self.lost}")
+            if self.on_lost is not None:
+                self.on_lost(self.lost)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="serial-reader", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=None):
+        self._running = False
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"\0")
+            except OSError:
+                pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def close(self):
+        """Stop and release the wake pipe; closing again does nothing."""
+        self.stop()
+        if self._wake_r is None:
+            return
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        self._wake_r = self._wake_w = None
@@ -0,0 +1,261 @@
+"""
+Catalog of the session databases in DB_DIR (perfusion_<rig>_YYYYMMDD_HHMMSS.db), so past runs
+can be listed without opening every file.
+
+One row per session: file path, rig, start/end time, number of readings, the target pressures
+used, the firmware (frame schema) the controller announced and min/max/mean of pressure,
+temperature and motor speed. The recorder adds a row when a session opens and fills in the
+summary when it closes; the summary is taken from the session's hourly rollups, so closing a
+multi-day run does not scan its readings. A session that is still recording has no end time.
+
+Files recorded elsewhere (or before the catalog existed) are indexed with a rebuild, which
+summarizes the databases on a thread pool and skips files that have not changed since:
+    python session_catalog.py rebuild ~/Downloads/Perfusion_System/databases
+    python session_catalog.py list ~/Downloads/Perfusion_System/databases --rig rig1
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ingest_journal import journal_path
+from save_data import epoch_seconds_sql, schema_version
+
+
+CATALOG_NAME = "catalog.sqlite"  # in DB_DIR, not *.db so it is never taken for a session
+SESSION_GLOB = "perfusion_*.db"
+_SESSION_NAME = re.compile(r"perfusion_(?:(?P<rig>.+)_)?\d{8}_\d{6}\.db$")
+
+SUMMARY_COLUMNS = ("current_pressure", "temperature", "motor_speed")
+
+CREATE_CATALOG_SQL = f'''
+    CREATE TABLE IF NOT EXISTS sessions (
+        path TEXT PRIMARY KEY,
+        rig_id TEXT,
+        started_at REAL,
+        ended_at REAL,
+        rows INTEGER,
+        setpoints TEXT,
+        firmware TEXT,
+        {", ".join(f"{c}_min REAL, {c}_max REAL, {c}_mean REAL" for c in SUMMARY_COLUMNS)},
+        file_size INTEGER,
+        file_mtime REAL
+    )
+'''
+
+# Columns a summary may leave as None without erasing what the recorder already knew
+_KEEP_IF_NULL = ("rig_id", "started_at", "firmware")
+_COLUMNS = ("path", "rig_id", "started_at", "ended_at", "rows", "setpoints", "firmware",
+            *(f"{c}_{s}" for c in SUMMARY_COLUMNS for s in ("min", "max", "mean")),
+            "file_size", "file_mtime")
+UPSERT_SQL = (
+    f"INSERT INTO sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join(':' + c for c in _COLUMNS)}) "
+    "ON CONFLICT (path) DO UPDATE SET "
+    + ", ".join(f"{c} = IFNULL(excluded.{c}, {c})" if c in _KEEP_IF_NULL else f"{c} = excluded.{c}"
+                for c in _COLUMNS[1:])
+)
+
+
+def rig_from_filename(path):
+    """Rig id in a session file name, None for names from before rigs (perfusion_YYYYMMDD_HHMMSS.db)."""
+    match = _SESSION_NAME.match(Path(path).name)
+    return match.group("rig") if match else None
+
+
+def summarize(db_path):
+    """Catalog row of one session database (without firmware, which only the recorder knows)."""
+    db_path = Path(db_path).resolve()
+    stat = db_path.stat()
+    summary = dict.fromkeys(_COLUMNS)
+    summary.update(path=str(db_path), rig_id=rig_from_filename(db_path), rows=0,
+                   file_size=stat.st_size, file_mtime=stat.st_mtime)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        # two subqueries, so each MIN/MAX is a single lookup in idx_timestamp; files that
+        # migrate_db.py has not upgraded yet still have local time TEXT timestamps
+        version = schema_version(conn)
+        summary["started_at"], summary["ended_at"] = conn.execute(
+            f"SELECT {epoch_seconds_sql(version, '(SELECT MIN(timestamp) FROM sensor_readings)')}, "
+            f"{epoch_seconds_sql(version, '(SELECT MAX(timestamp) FROM sensor_readings)')}").fetchone()
+        aggregates = ", ".join(f"MIN({c}_min), MAX({c}_max), TOTAL({c}_sum) / SUM(n)" for c in SUMMARY_COLUMNS)
+        try:
+            row = conn.execute(f"SELECT IFNULL(SUM(n), 0), {aggregates} FROM sensor_rollups "
+                               "WHERE resolution = 3600").fetchone()
+            setpoints = conn.execute(
+                "SELECT target_pressure_min FROM sensor_rollups WHERE resolution = 1 "
+                "UNION SELECT target_pressure_max FROM sensor_rollups WHERE resolution = 1").fetchall()
+        except sqlite3.OperationalError:  # recorded before the rollups, and not reopened since
+            aggregates = ", ".join(f"MIN({c}), MAX({c}), AVG({c})" for c in SUMMARY_COLUMNS)
+            row = conn.execute(f"SELECT COUNT(*), {aggregates} FROM sensor_readings").fetchone()
+            setpoints = conn.execute("SELECT DISTINCT target_pressure FROM sensor_readings").fetchall()
+    finally:
+        conn.close()
+
+    summary["rows"] = row[0]
+    for i, name in enumerate(_COLUMNS[7:16]):
+        summary[name] = row[1 + i]
+    summary["setpoints"] = json.dumps(sorted(value for value, in setpoints if value is not None))
+    return summary
+
+
+class SessionCatalog:
+    """
+    The catalog database. Holds only its path, so it can be handed to a rig's worker process;
+    every call opens a short connection (WAL, so several rigs and a browser can use it at once).
+    """
+
+    def __init__(self, catalog_path):
+        self.catalog_path = Path(catalog_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(CREATE_CATALOG_SQL)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_started ON sessions(started_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_rig ON sessions(rig_id, started_at)")
+        conn.close()
+
+    def __repr__(self):
+        return f"SessionCatalog({str(self.catalog_path)!r})"
+
+    def _connect(self):
+        return sqlite3.connect(self.catalog_path, timeout=10)
+
+    def _upsert(self, rows):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(UPSERT_SQL, rows)
+        finally:
+            conn.close()
+
+    # --- recorder side ---
+    def session_opened(self, db_path, rig_id, started_at, firmware=None):
+        """A new session database: listed right away, without end time or summary."""
+        row = dict.fromkeys(_COLUMNS)
+        row.update(path=str(Path(db_path).resolve()), rig_id=rig_id, started_at=started_at,
+                   rows=0, setpoints="[]", firmware=firmware)
+        self._upsert([row])
+
+    def session_closed(self, db_path, ended_at=None, firmware=None):
+        """Summarize a session whose writer has been closed, and mark it as ended."""
+        row = summarize(db_path)
+        row["firmware"] = firmware
+        if ended_at is not None:
+            row["ended_at"] = ended_at
+        self._upsert([row])
+
+    # --- browsing ---
+    def sessions(self, rig_id=None, start=None, end=None, limit=200):
+        """Newest first: sessions of `rig_id` (any if None) started between start and end (epoch s)."""
+        where, params = [], []
+        if rig_id is not None:
+            where.append("rig_id = ?")
+            params.append(rig_id)
+        if start is not None:
+            where.append("started_at >= ?")
+            params.append(start)
+        if end is not None:
+            where.append("started_at < ?")
+            params.append(end)
+        query = (f"SELECT * FROM sessions {'WHERE ' + ' AND '.join(where) if where else ''} "
+                 "ORDER BY started_at DESC LIMIT ?")
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute(query, params + [limit]).fetchall()
+        finally:
+            conn.close()
+        return [_as_session(row) for row in rows]
+
+    def get(self, db_path):
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute("SELECT * FROM sessions WHERE path = ?", (str(Path(db_path).resolve()),)).fetchone()
+        finally:
+            conn.close()
+        return None if row is None else _as_session(row)
+
+    # --- bulk indexing ---
+    def rebuild(self, db_dir, workers=None, force=False):
+        """
+        Index every session database in `db_dir`: files that are new or changed since they were
+        cataloged (size/mtime) are summarized in parallel, entries of deleted files are removed.
+        A session that is still recording (its ingest journal exists, or its entry has no end time
+        yet) keeps ended_at NULL: its last reading is not its end. force=True also ends entries
+        left open by a recorder that never closed them. Returns the number of files summarized.
+        """
+        paths = sorted(str(path.resolve()) for path in Path(db_dir).glob(SESSION_GLOB))
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT path, file_size, file_mtime, ended_at FROM sessions").fetchall()
+            known = {path: (size, mtime) for path, size, mtime, _ in rows}
+            open_paths = set() if force else {path for path, _, _, ended_at in rows if ended_at is None}
+            present = set(paths)
+            gone = [(path,) for path in known if path not in present]
+            with conn:
+                conn.executemany("DELETE FROM sessions WHERE path = ?", gone)
+        finally:
+            conn.close()
+
+        def changed(path):
+            stat = os.stat(path)
+            return force or known.get(path) != (stat.st_size, stat.st_mtime)
+
+        todo = [path for path in paths if changed(path)]
+        summaries = []
+        # sqlite3 releases the GIL while it reads, so threads summarize files in parallel
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, summary in zip(todo, pool.map(_try_summarize, todo)):
+                if summary is None:
+                    print(f"Skipping {path}: not a readable session database")
+                else:
+                    if path in open_paths or journal_path(path).exists():
+                        summary["ended_at"] = None
+                    summaries.append(summary)
+        self._upsert(summaries)
+        return len(summaries)
+
+
+def _try_summarize(path):
+    try:
+        return summarize(path)
+    except sqlite3.Error:
+        return None
+
+
+def _as_session(row):
+    session = dict(row)
+    session["setpoints"] = json.loads(session["setpoints"] or "[]")
+    return session
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and list perfusion session databases.")
+    parser.add_argument("command", choices=("rebuild", "list"))
+    parser.add_argument("db_dir", nargs="?", default=os.path.expanduser("~/Downloads/Perfusion_System/databases"))
+    parser.add_argument("--workers", type=int, default=None, help="Threads for rebuild (default: CPU based)")
+    parser.add_argument("--force", action="store_true", help="Summarize unchanged files again")
+    parser.add_argument("--rig", default=None, help="Only sessions of this rig (list)")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    catalog = SessionCatalog(Path(args.db_dir) / CATALOG_NAME)
+    if args.command == "rebuild":
+        started = time.perf_counter()
+        count = catalog.rebuild(args.db_dir, workers=args.workers, force=args.force)
+        print(f"Indexed {count} session(s) in {time.perf_counter() - started:.2f} s")
+        return
+    for session in catalog.sessions(rig_id=args.rig, limit=args.limit):
+        start = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["started_at"] or 0))
+        end = "recording" if session["ended_at"] is None else time.strftime("%H:%M:%S", time.localtime(session["ended_at"]))
+        print(f"{start} → {end}  {session['rig_id'] or '-':6} {session['rows']:>9} rows  "
+              f"setpoints {session['setpoints']}  {session['firmware'] or '?'}  {Path(session['path']).name}")
+
+
+if __name__ == "__main__":
+    main()
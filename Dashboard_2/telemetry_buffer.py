@@ -0,0 +1,112 @@
+import numpy as np
+
+
+# Same columns as sensor_readings; timestamp is the receipt time in epoch seconds
+COLUMNS = (
+    ("timestamp", np.float64),
+    ("perfusion_state", np.int16),
+    ("valve_state", np.int16),
+    ("humidity", np.float64),
+    ("temperature", np.float64),
+    ("envir_pressure", np.float64),
+    ("AQI", np.float64),
+    ("current_pressure", np.float64),
+    ("target_pressure", np.float64),
+    ("motor_speed", np.float64),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+VALUE_COLUMNS = COLUMN_NAMES[1:]
+
+
+class TelemetryBuffer:
+    """
+    Fixed-capacity columnar ring buffer for live telemetry.
+
+    One NumPy array per column. Every row is written twice, at `i` and `i + capacity`, so the
+    last N rows (N <= capacity) are always one contiguous slice: reads return views, never copies.
+    append() is O(1) and meant for a single writer (the serial reader thread).
+
+    Views alias the ring, so they are only stable until the writer wraps around past them
+    (capacity rows later). Copy them if they are kept longer than that.
+    """
+
+    def __init__(self, capacity=86400):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._columns = {name: np.zeros(2 * capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self._value_columns = [self._columns[name] for name in VALUE_COLUMNS]
+        self._count = 0  # rows ever appended
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        """Rows appended since creation (including the ones overwritten since)."""
+        return self._count
+
+    def append(self, timestamp, values):
+        """Append one reading: `values` in sensor_readings order (perfusion_state ... motor_speed)."""
+        if len(values) != len(VALUE_COLUMNS):
+            raise ValueError(f"Expected {len(VALUE_COLUMNS)} values, but got {len(values)}: {values!r}")
+        i = self._count % self.capacity
+        j = i + self.capacity
+        ts = self._columns["timestamp"]
+        ts[i] = ts[j] = timestamp
+        for column, value in zip(self._value_columns, values):
+            column[i] = column[j] = value
+        self._count += 1
+
+    def append_frame(self, data_list, timestamp):
+        """Append a split Status() frame (list of strings). Returns False if it is not 9 numbers."""
+        try:
+            values = [float(item) for item in data_list]
+        except (TypeError, ValueError):
+            return False
+        if len(values) != len(VALUE_COLUMNS):
+            return False
+        self.append(timestamp, values)
+        return True
+
+    def _bounds(self, n):
+        """Slice of the mirrored arrays holding the newest `n` rows."""
+        count = self._count
+        if not count:
+            return 0, 0
+        n = min(n, count, self.capacity)
+        # the mirror half always holds the newest row with `capacity` rows in front of it
+        end = (count - 1) % self.capacity + 1 + self.capacity
+        return end - n, end
+
+    def last(self, n, columns=None):
+        """Views of the newest `n` rows, oldest first, as {column: ndarray}."""
+        start, end = self._bounds(n)
+        names = columns or COLUMN_NAMES
+        return {name: self._columns[name][start:end] for name in names}
+
+    def window(self, seconds, now=None, columns=None):
+        """Views of the rows received in the last `seconds` (relative to `now` or the newest row)."""
+        start, end = self._bounds(self.capacity)
+        ts = self._columns["timestamp"][start:end]
+        if not len(ts):
+            return self.last(0, columns)
+        if now is None:
+            now = ts[-1]
+        first = start + int(np.searchsorted(ts, now - seconds, side="left"))
+        names = columns or COLUMN_NAMES
+        return {name: self._columns[name][first:end] for name in names}
+
+    def between(self, start=None, end=None, columns=None):
+        """Views of the rows with start <= timestamp <= end (either bound may be None)."""
+        lo, hi = self._bounds(self.capacity)
+        ts = self._columns["timestamp"][lo:hi]
+        first = lo + (0 if start is None else int(np.searchsorted(ts, start, side="left")))
+        last = hi if end is None else lo + int(np.searchsorted(ts, end, side="right"))
+        names = columns or COLUMN_NAMES
+        return {name: self._columns[name][first:max(first, last)] for name in names}
+
+    def column(self, name, n=None):
+        """View of one column, the newest `n` rows (default: everything buffered)."""
+        start, end = self._bounds(self.capacity if n is None else n)
+        return self._columns[name][start:end]
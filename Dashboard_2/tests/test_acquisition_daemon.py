@@ -0,0 +1,185 @@
+# test_acquisition_daemon.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Simulator')))
+import json
+import socket
+import sqlite3
+import time
+import threading
+import pytest
+import acquisition_daemon
+from acquisition_daemon import AcquisitionDaemon, DaemonRig
+from daemon_client import RigSubscription, daemon_rigs
+from pipeline_metrics import render
+from rig import Rig
+from session_catalog import CATALOG_NAME, SessionCatalog
+from virtual_arduino import VirtualArduino, ScriptedPressure
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def stored_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+
+
+def test_ui_restart_does_not_pause_capture(tmp_path):
+    socket_path = tmp_path / "acq.sock"
+    with VirtualArduino(rate_hz=50, pressure_model=ScriptedPressure([(0, 20.0)])) as sim:
+        daemon = AcquisitionDaemon([sim.port], tmp_path, socket_path).start()
+        try:
+            assert daemon_rigs(socket_path) == {"rig1": sim.port}
+            with pytest.raises(RuntimeError):  # one daemon per socket
+                AcquisitionDaemon([sim.port], tmp_path, socket_path).start()
+
+            ui = Rig("rig1", sim.port, tmp_path, daemon_socket=socket_path, metrics=True)
+            ui.start()
+            assert wait_for(lambda: ui.connected)
+            ui.send_commands(["START_PERFUSION", "20.0", "2.5", "50", "100", "0"])
+            assert wait_for(lambda: ui.db_path is not None and ui.ingest_stats["stored"] >= 20)
+            assert wait_for(lambda: ui.command_stats.get("acked") == 1)
+            assert ui.telemetry.column("current_pressure")[-1] == 20.0
+            db_path = ui.db_path
+            ui.stop()  # the UI goes away...
+
+            before = stored_rows(db_path)
+            assert wait_for(lambda: stored_rows(db_path) >= before + 25)  # ...the capture goes on
+
+            restarted = Rig("rig1", sim.port, tmp_path, daemon_socket=socket_path)
+            restarted.start()
+            assert wait_for(lambda: restarted.connected and restarted.db_path == db_path)
+            assert restarted.ingest_stats["received"] >= 50  # the backlog, frames from while it was away
+            assert sim.commands_received == 1
+            restarted.stop()
+        finally:
+            daemon.stop()
+    assert not socket_path.exists()
+    assert daemon.rigs["rig1"].frames > 0
+
+
+def test_reattach_resumes_after_last_frame(tmp_path):
+    socket_path = tmp_path / "acq.sock"
+    daemon = AcquisitionDaemon([], tmp_path, socket_path).start()
+    rig = daemon.rigs["rig1"] = DaemonRig("rig1", None, tmp_path, {})  # fed by hand, not started
+    t0 = 1_700_000_000.0
+    frame = ["frame", "1, 0, ...", [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234], None, True, False, "s.db"]
+    try:
+        rig.publish(("connected", "/dev/ttyACM0"))
+        for i in range(5):
+            rig.publish(tuple(frame[:3] + [t0 + i] + frame[4:]))
+        events = []
+        subscription = RigSubscription(socket_path, "rig1", events.append, retry_interval=0.05).start()
+        assert wait_for(lambda: len(events) == 6)
+        assert events[0] == ("connected", "/dev/ttyACM0")
+        assert subscription.last_seq == max(seq for seq, _ in rig.backlog)
+
+        for client in list(rig.clients):  # the daemon drops the client, e.g. it fell behind
+            rig.detach(client)
+        assert wait_for(lambda: ("disconnected", None) in events)
+        assert wait_for(lambda: len(rig.clients) == 1)
+        rig.publish(tuple(frame[:3] + [t0 + 5] + frame[4:]))
+        assert wait_for(lambda: events[-1][0] == "frame" and events[-1][3] == t0 + 5)
+        frame_times = [event[3] for event in events if event[0] == "frame"]
+        assert frame_times == [t0 + i for i in range(6)]  # nothing twice, nothing lost
+        subscription.stop()
+    finally:
+        daemon.stop()
+
+
+def test_resume_inside_a_read_chunk(tmp_path):
+    rig = DaemonRig("rig1", None, tmp_path, {})
+    frame = ("frame", "1, 0, ...", [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234], 1_700_000_000.0,
+             True, False, "s.db")
+    for _ in range(5):  # decoded from one read: they share received_at
+        rig.publish(frame)
+
+    def replay(after_seq, count):
+        ours, theirs = socket.socketpair()
+        client = rig.attach(ours, "test", after_seq)
+        theirs.settimeout(5)
+        with theirs, theirs.makefile("rb") as lines:
+            received = [json.loads(lines.readline()) for _ in range(count)]
+        rig.detach(client)
+        return received
+
+    first = replay(None, 5)
+    seqs = [frame[-1] for frame in first]
+    assert seqs == sorted(set(seqs))
+    assert replay(seqs[1], 3) == first[2:]  # cut off after the second frame: the other three follow
+
+
+def test_slow_client_is_dropped(tmp_path):
+    rig = DaemonRig("rig1", None, tmp_path, {}, backlog=10, client_queue=10)
+    ours, theirs = socket.socketpair()  # a UI that never reads
+    rig.attach(ours, "stuck")
+    line = "x" * 1000
+    for i in range(2000):  # far more than the socket buffers and the queue hold
+        rig.publish(("bad_frame", line, i))
+        if not rig.clients:
+            break
+    assert not rig.clients
+    theirs.close()
+
+
+def test_worker_metrics_survive_json():
+    snapshot = [("perfusion_stage_seconds", "histogram", "help", {"stage": "parse"}, [[0.001, 0.01], [1, 2, 0], 0.01, 3])]
+    assert 'perfusion_stage_seconds_bucket{stage="parse",le="+Inf"} 3' in render([snapshot])
+
+
+def test_replies_after_attach_are_not_interleaved_with_events(tmp_path):
+    socket_path = tmp_path / "acq.sock"
+    daemon = AcquisitionDaemon([], tmp_path, socket_path).start()
+    rig = daemon.rigs["rig1"] = DaemonRig("rig1", None, tmp_path, {})
+    values = [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234]
+    try:
+        for i in range(200):  # a backlog the client's thread is still writing when the reply is due
+            rig.publish(("frame", "x" * 4000, values, float(i), None, True, False, "s.db"))
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(10)
+            sock.connect(str(socket_path))
+            sock.sendall(b'{"op": "attach", "rig": "rig1"}\n{"op": "rigs"}\n')
+            reader = sock.makefile("rb")
+            replies = [json.loads(reader.readline()) for _ in range(201)]
+    finally:
+        daemon.stop()
+    assert [reply[3] for reply in replies[:200]] == list(range(200))
+    assert replies[200:] == [{"rigs": {"rig1": None}}]
+
+
+def test_lost_port_is_reopened(tmp_path, monkeypatch):
+    monkeypatch.setattr(acquisition_daemon, "RESTART_INTERVAL", 0.2)
+    link = tmp_path / "ttyRIG"  # like a udev symlink, it follows the controller to its new pty
+    catalog_path = tmp_path / CATALOG_NAME
+    sim = VirtualArduino(rate_hz=50, pressure_model=ScriptedPressure([(0, 20.0)]), link=str(link),
+                         disconnect_every=4.0, reconnect_delay=0.5)
+    sim.start()
+    rig = DaemonRig("rig1", str(link), tmp_path, {"catalog_path": catalog_path}, metrics_interval=None)
+    ours, theirs = socket.socketpair()
+    kinds = []
+    reader = theirs.makefile("rb")
+    threading.Thread(target=lambda: kinds.extend(json.loads(line)[0] for line in reader), daemon=True).start()
+    rig.attach(ours, "test")
+    rig.start()
+    try:
+        assert wait_for(lambda: rig.frames > 0)
+        rig.submit(["START_PERFUSION", "20.0", "2.5", "50", "100", "0"])
+        assert wait_for(lambda: len(SessionCatalog(catalog_path).sessions()) == 1)
+
+        assert wait_for(lambda: sim.disconnects == 1)  # the port goes away mid-session...
+        assert wait_for(lambda: kinds.count("connected") == 2)  # ...and the worker is started on it again
+        frames = rig.frames
+        assert wait_for(lambda: rig.frames > frames)
+        assert "disconnected" in kinds[kinds.index("connected") + 1:]
+        first = SessionCatalog(catalog_path).sessions()[-1]
+        assert first["ended_at"] is not None and first["rows"] > 0  # closed when the port was lost
+    finally:
+        rig.stop()
+        sim.stop()
+        theirs.close()
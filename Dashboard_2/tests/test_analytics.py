@@ -0,0 +1,144 @@
+# test_analytics.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import numpy as np
+import pytest
+from analytics import ControlAnalytics, analyze_series, analyze_session, summary_text
+from save_data import SensorDatabase
+from telemetry_buffer import TelemetryBuffer
+
+
+def step_response(n=4000, rate=10.0, t0=1_700_000_000.0):
+    """10 → 20 mmHg at t = 100 s: first-order approach with a 2 mmHg overshoot, settled by t ≈ 112 s."""
+    t = t0 + np.arange(n) / rate
+    target = np.where(t - t0 < 100, 10.0, 20.0)
+    since = np.clip(t - t0 - 100, 0, None)
+    pressure = np.where(t - t0 < 100, 10.0, 20.0 + 2.0 * np.exp(-since / 2) * np.cos(since) - 10.0 * np.exp(-since * 3))
+    return {
+        "timestamp": t,
+        "perfusion_state": np.ones(n),
+        "valve_state": (np.arange(n) % 4 == 0).astype(float),  # open a quarter of the time
+        "current_pressure": pressure,
+        "target_pressure": target,
+        "motor_speed": np.full(n, 500.0),
+    }
+
+
+def chunks(series, size):
+    n = len(series["timestamp"])
+    for start in range(0, n, size):
+        yield {name: column[start:start + size] for name, column in series.items()}
+
+
+def test_step_settling_and_overshoot():
+    series = step_response()
+    summary = analyze_series(series)
+    (step,) = summary["steps"]
+    assert (step["from"], step["to"]) == (10.0, 20.0)
+    assert step["t"] == pytest.approx(series["timestamp"][1000])
+    assert step["in_progress"]
+
+    # reference: last frame outside the band, found the slow way
+    outside = np.flatnonzero(np.abs(series["current_pressure"] - 20.0) > 1.0)
+    settled_at = series["timestamp"][outside[-1] + 1]
+    assert step["settling_time_s"] == pytest.approx(settled_at - step["t"])
+    overshoot = (series["current_pressure"][1000:] - 20.0).max()
+    assert step["overshoot"] == pytest.approx(overshoot)
+    assert step["overshoot_pct"] == pytest.approx(10 * overshoot)
+
+
+def test_chunked_updates_match_batch():
+    series = step_response()
+    batch = analyze_series(series)
+    live = ControlAnalytics()
+    for chunk in chunks(series, 137):
+        live.update(chunk)
+    chunked = live.summary()
+    assert chunked["steps"] == batch["steps"]
+    for key in ("samples", "active_s", "rms_error", "valve_duty", "above_threshold_s", "mean_motor_speed"):
+        assert chunked[key] == pytest.approx(batch[key])
+
+
+def test_time_weighted_metrics():
+    t = np.arange(0.0, 100.0)  # 1 Hz
+    series = {
+        "timestamp": t,
+        "perfusion_state": np.ones(100),
+        "valve_state": (t < 25).astype(float),
+        "current_pressure": np.where((t >= 50) & (t < 60), 14.0, 11.0),  # 14 > 1.3 × 10 for 10 s
+        "target_pressure": np.full(100, 10.0),
+        "motor_speed": np.full(100, 300.0),
+    }
+    summary = analyze_series(series)
+    assert summary["active_s"] == pytest.approx(99.0)  # the last frame has no duration yet
+    assert summary["valve_duty"] == pytest.approx(25 / 99)
+    assert summary["above_threshold_s"] == pytest.approx(10.0)
+    assert summary["rms_error"] == pytest.approx(np.sqrt((10 * 16 + 89 * 1) / 99))
+    assert summary["mean_motor_speed"] == pytest.approx(300.0)
+    assert summary["steps"] == []
+
+
+def test_gaps_and_idle_time_left_out():
+    t = np.array([0.0, 1.0, 2.0, 60.0, 61.0, 62.0, 63.0])  # 58 s without frames
+    state = np.array([1, 1, 1, 1, 1, 0, 0], dtype=float)  # stopped at t = 62
+    series = {
+        "timestamp": t,
+        "perfusion_state": state,
+        "valve_state": np.ones(7),
+        "current_pressure": np.full(7, 12.0),
+        "target_pressure": np.full(7, 10.0),
+        "motor_speed": np.zeros(7),
+    }
+    summary = analyze_series(series, max_gap=5.0)
+    assert summary["active_s"] == pytest.approx(4.0)  # 0→1, 1→2, 60→61, 61→62
+    assert summary["valve_duty"] == pytest.approx(1.0)
+
+
+def test_not_perfusing_text():
+    assert summary_text(ControlAnalytics().summary()) == "Control: not perfusing yet"
+    text = summary_text(analyze_series(step_response()))
+    assert "RMS error" in text and "last step 10→20 mmHg" in text
+
+
+def test_update_from_buffer_follows_session():
+    series = step_response(n=600)
+    buffer = TelemetryBuffer()
+
+    def feed(rows):
+        for i in rows:
+            values = [series["perfusion_state"][i], series["valve_state"][i], 40.0, 22.0, 1010.0, 30.0,
+                      series["current_pressure"][i], series["target_pressure"][i], series["motor_speed"][i]]
+            buffer.append(series["timestamp"][i], values)
+
+    feed(range(0, 50))  # a previous session
+    analytics = ControlAnalytics().start_at(buffer)
+    feed(range(50, 300))
+    analytics.update_from_buffer(buffer)
+    feed(range(300, 600))
+    analytics.update_from_buffer(buffer)
+
+    expected = analyze_series({name: column[50:600] for name, column in series.items()})
+    summary = analytics.summary()
+    assert summary["samples"] == 550
+    assert summary["rms_error"] == pytest.approx(expected["rms_error"])
+    assert summary["steps"] == expected["steps"]
+
+
+def test_analyze_session(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path)
+    t0 = 1_700_000_000.0
+    for i in range(40):
+        target = 15.0 if i < 20 else 25.0
+        pressure = target + (3.0 if i == 21 else 0.0)
+        db.insert_values([1, i % 2, 45.0, 22.0, 712.5, 30, pressure, target, 500.0], received_at=t0 + i)
+    db.close()
+
+    summary = analyze_session(db_path)
+    assert summary["samples"] == 40
+    (step,) = summary["steps"]
+    assert (step["from"], step["to"]) == (15.0, 25.0)
+    assert step["overshoot"] == pytest.approx(3.0)
+    assert step["settling_time_s"] == pytest.approx(2.0)
+    assert summary["valve_duty"] == pytest.approx(0.5, abs=0.02)
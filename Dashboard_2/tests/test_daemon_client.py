@@ -0,0 +1,69 @@
+# test_daemon_client.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+import socketserver
+import threading
+import time
+from daemon_client import RigSubscription, daemon_rigs
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+class FakeDaemon(socketserver.ThreadingUnixStreamServer):
+    """Answers rigs, and streams two frames and the command statistics to an attached client."""
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.requests = []
+        super().__init__(path, self.Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                message = json.loads(line)
+                self.server.requests.append(message)
+                if message["op"] == "rigs":
+                    self.wfile.write(b'{"rigs": {"rig1": "/dev/ttyACM0"}}\n')
+                elif message["op"] == "attach":
+                    for seq in (7, 8):  # both from one read chunk: one received_at
+                        frame = ["frame", "raw", [1, 0, 40, 22, 1010, 30, 14.8, 15, 0.1], 1.0, True, False, "s.db", seq]
+                        self.wfile.write(json.dumps(frame).encode() + b"\n")
+                elif message["op"] == "command":
+                    self.wfile.write(b'["commands", {"sent": 1, "acked": 1}]\n')
+
+
+def test_subscription(tmp_path):
+    path = str(tmp_path / "d.sock")
+    server = FakeDaemon(path)
+    try:
+        assert daemon_rigs(path) == {"rig1": "/dev/ttyACM0"}
+        events = []
+        subscription = RigSubscription(path, "rig1", events.append).start()
+        assert wait_for(lambda: len(events) == 2)
+        assert events[0][0] == "frame" and events[0][2][6] == 14.8
+        assert len(events[0]) == 7  # the seq is the subscription's
+        assert subscription.last_seq == 8
+
+        assert subscription.submit(["START_PERFUSION", "20.0", "2.5", "0", "0", "0"])
+        assert wait_for(lambda: subscription.stats().get("acked") == 1)
+        assert server.requests[-1] == {"op": "command", "commands": ["START_PERFUSION", "20.0", "2.5", "0", "0", "0"]}
+        assert server.requests[1] == {"op": "attach", "rig": "rig1", "after_seq": None}
+        subscription.stop()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_no_daemon(tmp_path):
+    subscription = RigSubscription(str(tmp_path / "none.sock"), "rig1", lambda event: None, retry_interval=0.05)
+    subscription.start()
+    assert not subscription.submit(["IDLE"])  # not attached: the commands are not sent
+    subscription.stop()
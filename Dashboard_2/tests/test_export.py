@@ -0,0 +1,51 @@
+# test_export.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import io
+import sqlite3
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from export import export, iter_export
+from save_data import SensorDatabase
+
+
+def make_db(path, n):
+    db = SensorDatabase(database_path=path, batched=True)
+    for i in range(n):
+        db.insert_reading([1, 0, 45.0, 22.0, 712.5, 30, i / 10, 15.0, 0.5])
+    db.close()
+    return sqlite3.connect(path)
+
+
+def test_parquet_stream_in_row_groups(tmp_path):
+    conn = make_db(tmp_path / "run.db", 2500)
+    chunks = list(iter_export(conn, "parquet", chunk_rows=1000))
+    assert len(chunks) >= 3  # bytes go out per chunk, not at the end
+
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert table.num_rows == 2500
+    assert table.schema.field("perfusion_state").type == "int64"
+    assert str(table.schema.field("timestamp").type) == "timestamp[us, tz=UTC]"
+    assert table.column("current_pressure").to_pylist()[-1] == 249.9
+
+
+def test_csv_file_matches_stream(tmp_path):
+    conn = make_db(tmp_path / "run.db", 1200)
+    progress = []
+    rows = export(conn, str(tmp_path / "run.csv"), "csv", chunk_rows=500, progress=progress.append)
+    assert rows == 1200
+    assert progress == [500, 1000, 1200]
+
+    streamed = b"".join(iter_export(conn, "csv", chunk_rows=500))
+    assert streamed == (tmp_path / "run.csv").read_bytes()
+    table = pa_csv.read_csv(io.BytesIO(streamed))
+    assert table.num_rows == 1200
+    assert table.column_names[:3] == ["id", "timestamp", "perfusion_state"]
+
+
+def test_empty_database(tmp_path):
+    conn = make_db(tmp_path / "run.db", 0)
+    assert pq.read_table(io.BytesIO(b"".join(iter_export(conn, "parquet")))).num_rows == 0
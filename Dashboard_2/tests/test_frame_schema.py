@@ -0,0 +1,57 @@
+# test_frame_schema.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import pytest
+from frame_schema import (CONTROLLER_1, CONTROLLER_2, SENSOR_DATA, Field, FrameError, FrameSchema,
+                          get_schema, is_handshake, register, schema_for_handshake)
+from sensor_data import Sensor_Data
+
+FRAME = "1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.00, 0.1234"
+
+
+def test_parse_types_and_order():
+    values = CONTROLLER_2.parse(FRAME)
+    assert values == (1, 0, 45.2, 22.1, 712.5, 30.0, 14.8, 15.0, 0.1234)
+    assert type(values[0]) is int and type(values[2]) is float
+    assert CONTROLLER_2.columns[6] == "current_pressure"
+    assert CONTROLLER_2.units["current_pressure"] == "mmHg"
+
+
+def test_shifted_or_malformed_frames_are_rejected():
+    with pytest.raises(FrameError, match="expected 9 fields, got 8"):
+        CONTROLLER_2.parse("1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.00")
+    with pytest.raises(FrameError, match="controller-2"):
+        CONTROLLER_2.parse("1, 0, 45.2, 22.1, 712.5, 30, nan?, 15.00, 0.1")
+    with pytest.raises(FrameError):
+        CONTROLLER_2.parse("1.5, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.00, 0.1")  # state is an integer
+
+
+def test_handshake_selects_schema():
+    assert schema_for_handshake("OK") is CONTROLLER_1
+    assert schema_for_handshake(b"OK,C2") is CONTROLLER_2
+    assert schema_for_handshake("OK,BIN") is CONTROLLER_2
+    assert schema_for_handshake("OK,C9") is None
+    assert is_handshake("OK,C9") and not is_handshake("1, 0")
+
+
+def test_registry_rejects_clashes():
+    with pytest.raises(ValueError):
+        register(FrameSchema("controller-2", [Field("x", int)]))
+    with pytest.raises(ValueError):
+        register(FrameSchema("another", [Field("x", int)], handshakes=("OK,C2",)))
+    with pytest.raises(TypeError):
+        FrameSchema("bad", [Field("x", bytes)])
+    with pytest.raises(KeyError):
+        get_schema("missing")
+
+
+def test_sensor_data_layout():
+    reading = SENSOR_DATA.as_dict("45.0,22.0,10.5,1.5,0.1,0.2,0.3,12.0, CW ,250")
+    assert reading["motor_direction"] == "CW"
+    assert reading["syringe_current_position"] == 250
+
+    sensor = Sensor_Data()
+    sensor.extract_sensor_data("45.0,22.0,10.5,1.5,0.1,0.2,0.3,12.0,CCW,250")
+    assert sensor.get_sensor_data()["gyro"] == (0.1, 0.2, 0.3)
+    assert sensor.get_sensor_data()["motor_direction"] == "CCW"
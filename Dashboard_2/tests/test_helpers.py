@@ -2,7 +2,7 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
-from Dashboard_2.dashboard_2 import make_db_filename  # Adjust import path
+from rig import SessionRecorder  # make_db_filename moved here with the per-rig workers
 from unittest.mock import patch
 import datetime
 
@@ -22,15 +22,14 @@ def test_make_db_filename():
 """
 
 def test_file_creation(tmp_path):
-    # Patch the base directory used in make_db_filename if it uses a BASE_DIR or similar variable
-    with patch("dashboard.DB_DIR", tmp_path):
-        filename = make_db_filename()
-        full_path = tmp_path / filename
-        
-        # Create dummy file
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-        full_path.touch()
-        
-        assert full_path.exists()
-        assert "perfusion_" in filename
-        assert filename.endswith(".db")
\ No newline at end of file
+    # Each rig's SessionRecorder names the session files in its own db_dir
+    full_path = SessionRecorder(tmp_path, "rig1").make_db_filename()
+
+    # Create dummy file
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    full_path.touch()
+
+    assert full_path.exists()
+    assert full_path.parent == tmp_path
+    assert full_path.name.startswith("perfusion_rig1_")
+    assert full_path.suffix == ".db"
@@ -0,0 +1,96 @@
+# test_history.py
+import sys
+import os
+import sqlite3
+import pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+from history import SessionHistory
+from save_data import SensorDatabase
+
+T0 = 1_700_000_000.0
+VALUES = [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234]
+
+
+def record(path, n, t0=T0, db=None):
+    db = db or SensorDatabase(database_path=path, batched=True, batch_size=100)
+    for i in range(n):
+        db.insert_values(VALUES, received_at=t0 + i)  # 1 Hz
+    db.flush()
+    return db
+
+
+def ids(page):
+    return [row[0] for row in page.rows]
+
+
+def test_keyset_pages(tmp_path):
+    record(tmp_path / "run.db", 1000).close()
+    history = SessionHistory(tmp_path / "run.db")
+
+    first = history.page_after(0, limit=300)
+    assert ids(first) == list(range(1, 301))
+    assert not first.has_older and first.has_newer
+    assert first.rows[0][1] == round(T0 * 1e6)  # epoch µs
+    second = history.page_after(first.rows[-1][0], limit=300)
+    assert ids(second)[0] == 301 and second.has_older
+
+    newest = history.page_before(None, limit=300)
+    assert ids(newest) == list(range(701, 1001))
+    assert newest.has_older and not newest.has_newer
+    older = history.page_before(newest.rows[0][0], limit=300)
+    assert ids(older) == list(range(401, 701))
+    assert history.span() == (T0, T0 + 999)
+    history.close()
+
+
+def test_time_range_and_jump(tmp_path):
+    record(tmp_path / "run.db", 1000).close()
+    history = SessionHistory(tmp_path / "run.db")
+    start, end = T0 + 100, T0 + 199.5  # readings 101..200
+
+    page = history.page_after(0, start, end, limit=60)
+    assert ids(page) == list(range(101, 161)) and not page.has_older and page.has_newer
+    page = history.page_after(page.rows[-1][0], start, end, limit=60)
+    assert ids(page) == list(range(161, 201)) and not page.has_newer
+    assert ids(history.page_before(None, start, end, limit=10)) == list(range(191, 201))
+
+    assert ids(history.page_at(T0 + 500.5, limit=5)) == [502, 503, 504, 505, 506]
+    assert ids(history.page_at(T0 + 5000, limit=5)) == [996, 997, 998, 999, 1000]  # past the end: newest
+    assert history.page_after(0, T0 + 5000, None).rows == []
+    history.close()
+
+
+def test_browsing_the_session_being_recorded(tmp_path):
+    db = record(tmp_path / "live.db", 200)
+    history = SessionHistory(tmp_path / "live.db")
+    assert ids(history.page_before(None, limit=5)) == [196, 197, 198, 199, 200]
+    record(None, 50, t0=T0 + 200, db=db)  # the writer commits while the reader is open
+    page = history.page_before(None, limit=5)
+    assert ids(page) == [246, 247, 248, 249, 250]
+    db.close()
+    history.close()
+
+
+def test_query_after_close_reopens(tmp_path):
+    record(tmp_path / "run.db", 10).close()
+    history = SessionHistory(tmp_path / "run.db")
+    history.close()  # e.g. evicted from dashboard_2's cache while a callback still had it
+    assert ids(history.page_before(None, limit=2)) == [9, 10]
+    history.close()
+    history.close()
+
+
+def test_empty_session(tmp_path):
+    SensorDatabase(database_path=tmp_path / "empty.db")
+    history = SessionHistory(tmp_path / "empty.db")
+    assert history.page_before(None) == ([], False, False)
+    assert history.page_at(T0).rows == []
+    assert history.span() is None
+
+
+def test_older_schema_is_not_opened(tmp_path):
+    with sqlite3.connect(tmp_path / "old.db") as conn:  # schema 1: text timestamps, never numbered
+        conn.execute("CREATE TABLE sensor_readings (id INTEGER PRIMARY KEY, timestamp TEXT)")
+    conn.close()
+    with pytest.raises(ValueError, match="migrate_db"):
+        SessionHistory(tmp_path / "old.db")
@@ -0,0 +1,216 @@
+# test_ingest.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Simulator')))
+import sqlite3
+import threading
+import time
+from rig import Rig
+from virtual_arduino import VirtualArduino, ScriptedPressure
+
+FRAME = "1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.00, 0.1234"
+STOP_FRAME = "0, 0, 45.2, 22.1, 712.5, 30, 0.0, 15.00, 0.0000"
+
+
+def test_every_frame_stored_display_decimated(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False, display_rate_hz=2.0)
+    t0 = 1_700_000_000.0
+    for i in range(100):  # 100 frames at 50 Hz = 2 seconds
+        rig.handle_frame(FRAME, t0 + i * 0.02)
+    db_path = rig.db_path
+    rig.handle_frame(STOP_FRAME, t0 + 2.0)
+    stats = dict(rig.ingest_stats)
+
+    assert db_path.name.startswith("perfusion_rig1_")
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0] == 100
+    assert stats["received"] == 101
+    assert stats["stored"] == 100
+    assert stats["displayed"] == 5  # 2 Hz over 2 s, plus the stop frame
+    assert len(rig.telemetry) == 101
+
+
+def test_sampled_store_rate_apart_from_display(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False, display_rate_hz=2.0,
+              store_all_frames=False, store_rate_hz=10.0)
+    t0 = 1_700_000_000.0
+    for i in range(100):  # 100 frames at 50 Hz = 2 seconds
+        rig.handle_frame(FRAME, t0 + i * 0.02)
+    rig.handle_frame(STOP_FRAME, t0 + 2.0)
+    assert rig.ingest_stats["stored"] == 20  # 10 Hz over 2 s, not the display's 2 Hz
+    assert rig.ingest_stats["displayed"] == 5
+
+
+def test_handshake_and_malformed_frames(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False)
+    t0 = 1_700_000_000.0
+    rig.handle_frame("OK", t0)
+    assert rig.schema_name == "controller-1"
+    rig.handle_frame("OK,C2", t0)
+    assert rig.schema_name == "controller-2"
+    rig.handle_frame("1, 0, 45.2, 22.1, 14.8, 15.00, 0.1234", t0 + 1)  # fields missing
+    rig.handle_frame(FRAME, t0 + 2)
+
+    assert rig.ingest_stats["bad_frames"] == 1
+    assert rig.ingest_stats["received"] == 1
+    assert rig.telemetry.column("current_pressure")[-1] == 14.8
+    assert "rejected (controller-2): 1" in rig.ingest_stats_text()
+    rig.stop()
+
+
+def wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+def test_rigs_run_in_separate_worker_processes(tmp_path):
+    sims = [VirtualArduino(rate_hz=50, pressure_model=ScriptedPressure([(0, p)])) for p in (10.0, 20.0)]
+    rigs = [Rig(f"rig{i}", sim.start(), tmp_path, use_process=True) for i, sim in enumerate(sims, start=1)]
+    try:
+        for rig in rigs:
+            rig.start()
+        assert wait_for(lambda: all(rig.connected for rig in rigs))
+
+        # Each rig's commands go to its own controller
+        rigs[1].send_commands(["START_PERFUSION", "20.0", "2.5", "50", "100", "0"])
+        assert wait_for(lambda: rigs[1].db_path is not None and rigs[1].ingest_stats["stored"] >= 20)
+        assert sims[0].commands_received == 0
+        assert rigs[0].db_path is None
+        assert rigs[0].ingest_stats["received"] > 0
+        assert rigs[1].telemetry.column("current_pressure")[-1] == 20.0
+    finally:
+        for rig in rigs:
+            rig.stop()
+        for sim in sims:
+            sim.stop()
+
+    with sqlite3.connect(rigs[1].db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0] >= 20
+
+
+def test_commands_are_acknowledged(tmp_path):
+    with VirtualArduino(rate_hz=20) as sim:
+        rig = Rig("rig1", sim.port, tmp_path, use_process=False)
+        rig.start()
+        try:
+            rig.send_commands(["IDLE", "20.0", "2.5", "0", "0", "0"])
+            assert wait_for(lambda: rig.command_stats.get("acked") == 1, timeout=5)
+        finally:
+            rig.stop()
+    assert sim.acks_sent == 1
+    assert sim.target_pressure == 20.0
+    assert rig.command_stats["rtt_last_ms"] < 1000
+    assert "Commands acked: 1/1" in rig.ingest_stats_text()
+
+
+
+def test_sessions_are_cataloged(tmp_path):
+    from session_catalog import SessionCatalog
+    rig = Rig("rig1", None, tmp_path, use_process=False, catalog_path=tmp_path / "catalog.sqlite")
+    t0 = 1_700_000_000.0
+    rig.handle_frame("OK,C2", t0)
+    for i in range(10):
+        rig.handle_frame(FRAME, t0 + i)
+    session = SessionCatalog(tmp_path / "catalog.sqlite").get(rig.db_path)
+    assert session["started_at"] == t0 and session["ended_at"] is None
+
+    rig.handle_frame(STOP_FRAME, t0 + 10)
+    session = SessionCatalog(tmp_path / "catalog.sqlite").get(rig.db_path)
+    assert session["rows"] == 10 and session["ended_at"] == t0 + 10
+    assert session["firmware"] == "controller-2" and session["setpoints"] == [15.0]
+
+
+def test_pipeline_metrics(tmp_path):
+    with VirtualArduino(rate_hz=50) as sim:
+        rig = Rig("rig1", sim.port, tmp_path, use_process=False, metrics=True, batch_size=10)
+        rig.start()
+        try:
+            rig.send_commands(["START_PERFUSION", "20.0", "2.5", "50", "100", "0"])
+            assert wait_for(lambda: rig.ingest_stats["stored"] >= 30)
+        finally:
+            rig.stop()
+
+    samples = {(name, labels.get("stage"), labels.get("queue"), labels.get("result")): value
+               for name, kind, help, labels, value in rig.metrics_snapshot()}
+    for stage in ("serial_read", "frame_split", "parse", "store", "commit", "apply"):
+        buckets, counts, total, count = samples[("perfusion_stage_seconds", stage, None, None)]
+        assert count > 0 and sum(counts) == count
+    assert samples[("perfusion_ingest_lag_seconds", None, None, None)][3] == rig.ingest_stats["received"]
+    assert samples[("perfusion_frames_total", None, None, "stored")] == rig.ingest_stats["stored"]
+    assert ("perfusion_queue_depth", None, "writer", None) in samples
+    assert samples[("perfusion_serial_bytes_total", None, None, None)] > 0
+    assert all(labels["rig"] == "rig1" for *_, labels, value in rig.metrics_snapshot())
+
+
+def test_no_metrics_by_default(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False)
+    rig.handle_frame(FRAME, time.time())
+    rig.stop()
+    assert rig.metrics_snapshot() == []
+    assert rig._ingest.metrics is None
+
+
+def test_live_view_is_published_whole(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False, table_size=3, log_size=4)
+    t0 = 1_700_000_000.0
+    rig.handle_frame(FRAME, t0)
+    first = rig.view
+    for i in range(1, 10):
+        rig.handle_frame(FRAME if i < 8 else STOP_FRAME, t0 + i)
+    view = rig.view
+
+    assert first.version == 1 and len(first.log) == 1 and len(first.rows) == 1  # left as it was
+    assert view.version == 10
+    assert [line[1] for line in view.log] == [STOP_FRAME, STOP_FRAME, FRAME, FRAME]  # newest first
+    assert [row["t"] for row in view.rows] == [t0 + 7, t0 + 6, t0 + 5]  # idle frames are not tabled
+    assert view.rows[0]["7"] == 14.8
+    assert rig.table_records(1) == [view.rows[0]]
+    rig.handle_frame(FRAME, t0 + 9.5)  # same display slot: nothing new to show
+    assert rig.view is view
+    rig.stop()
+
+
+def test_live_view_reads_during_ingest(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False, display_rate_hz=1000.0)
+    t0 = 1_700_000_000.0
+    done = threading.Event()
+    seen, torn = [], []
+
+    def read():
+        while not done.is_set():
+            view = rig.view
+            times = [row["t"] for row in view.rows]
+            if len(view.log) > rig.log_size or len(times) > rig.table_size or times != sorted(times, reverse=True):
+                torn.append(view)
+            seen.append(view.version)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for i in range(5000):
+        rig.apply_frame(FRAME, [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234], t0 + i / 500, False, False, None)
+    done.set()
+    reader.join()
+    rig.stop()
+    assert not torn and seen and seen == sorted(seen)
+    assert rig.view.version == 5000
+
+
+def test_failed_commits_are_counted(tmp_path):
+    rig = Rig("rig1", None, tmp_path, use_process=False, batch_size=5, flush_interval=0.05)
+    t0 = 1_700_000_000.0
+    rig.handle_frame(FRAME, t0)
+    with sqlite3.connect(rig.db_path) as conn:  # the disk fills up
+        conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON sensor_readings "
+                     "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.close()
+    for i in range(1, 200):
+        rig.handle_frame(FRAME, t0 + i * 0.02)
+        if rig.ingest_stats["failed_commits"]:
+            break
+        time.sleep(0.01)
+    assert rig.ingest_stats["failed_commits"] >= 1
+    assert "failed commits" in rig.ingest_stats_text()
+    rig.handle_frame(STOP_FRAME, t0 + 5)
@@ -0,0 +1,169 @@
+# test_ingest_journal.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import sqlite3
+import subprocess
+import textwrap
+import threading
+import time
+from ingest_journal import HEADER_SIZE, IngestJournal, RECORD_SIZE, journal_path, read_journal
+from save_data import SensorDatabase, recover_journals, replay_journal
+
+VALUES = (1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234)
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+
+
+def test_round_trip_stops_at_torn_record(tmp_path):
+    path = tmp_path / "run.db.ingest"
+    journal = IngestJournal(path, base_id=7, sync_interval=None)
+    for i in range(5):
+        journal.append(1000.0 + i, VALUES)
+    journal.close()
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - RECORD_SIZE // 2)  # power cut in the middle of the last write
+
+    base_id, records = read_journal(path)
+    assert base_id == 7
+    assert [t for t, _ in records] == [1000.0, 1001.0, 1002.0, 1003.0]
+    assert tuple(records[0][1]) == VALUES
+
+
+def test_synced_by_its_own_thread(tmp_path):
+    journal = IngestJournal(tmp_path / "run.db.ingest", sync_interval=0.02)
+    for i in range(3):
+        journal.append(1000.0 + i, VALUES)
+    deadline = time.time() + 5
+    while journal.syncs == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert journal.syncs == 1  # the tail of a burst, with no append after it
+    time.sleep(0.1)
+    assert journal.syncs == 1  # nothing new, no fsync
+    journal.close()
+
+
+def test_checkpoint_keeps_the_uncommitted_records(tmp_path):
+    path = tmp_path / "run.db.ingest"
+    journal = IngestJournal(path, base_id=100, sync_interval=0.01)
+    appender = threading.Thread(target=lambda: [journal.append(float(i), VALUES) for i in range(5000)])
+    appender.start()
+    while appender.is_alive():  # the writer commits (and checkpoints) while the reader appends
+        journal.checkpoint(100 + journal.records // 2)
+    appender.join()
+    journal.checkpoint(100 + 4990)
+    journal.close()
+
+    assert journal.checkpoints > 1
+    assert path.stat().st_size == HEADER_SIZE + 10 * RECORD_SIZE
+    base_id, records = read_journal(path)
+    assert base_id == 100 + 4990
+    assert [t for t, _ in records] == [float(i) for i in range(4990, 5000)]
+
+
+def test_replay_adds_only_uncommitted_rows(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path)
+    db.insert_values(VALUES)  # before the journal
+    journal = IngestJournal(journal_path(db_path), base_id=1)
+    for i in range(10):
+        journal.append(1_700_000_000.0 + i, VALUES)
+        if i < 4:
+            db.insert_values(VALUES)  # committed before the crash
+    journal.close()
+
+    assert replay_journal(db_path) == 6
+    assert count_rows(db_path) == 11
+    assert not journal_path(db_path).exists()
+    with sqlite3.connect(db_path) as conn:
+        last = conn.execute("SELECT timestamp FROM sensor_readings ORDER BY id DESC LIMIT 1").fetchone()[0]
+        rollup_rows = conn.execute("SELECT SUM(n) FROM sensor_rollups WHERE resolution = 60").fetchone()[0]
+    assert last == 1_700_000_009_000_000  # the time it was received
+    assert rollup_rows == 11
+
+
+def test_clean_close_removes_journal(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path, batched=True, journal=True)
+    for _ in range(20):
+        db.insert_values(VALUES)
+    assert journal_path(db_path).exists()
+    db.close()
+    assert not journal_path(db_path).exists()
+    assert count_rows(db_path) == 20
+
+
+def test_crash_before_commit_recovered(tmp_path):
+    db_path = tmp_path / "perfusion_rig1_20250601_101500.db"
+    script = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))!r})
+        from save_data import SensorDatabase
+        db = SensorDatabase(database_path={str(db_path)!r}, batched=True, batch_size=10_000,
+                            flush_interval=60, journal=True)
+        for i in range(250):
+            db.insert_values({VALUES!r}, 1_700_000_000.0 + i)
+        os._exit(1)  # killed: no flush, no atexit
+    """)
+    subprocess.run([sys.executable, "-c", script], check=False, timeout=60)
+    assert count_rows(db_path) == 0
+
+    assert recover_journals(tmp_path) == {db_path: 250}
+    assert count_rows(db_path) == 250
+    assert not journal_path(db_path).exists()
+
+
+def test_journal_holds_only_uncommitted_rows(tmp_path):
+    db_path = tmp_path / "perfusion_rig1_20250601_101500.db"
+    script = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {os.path.abspath(os.path.join(os.path.dirname(__file__), '../'))!r})
+        from save_data import SensorDatabase
+        db = SensorDatabase(database_path={str(db_path)!r}, batched=True, batch_size=100,
+                            flush_interval=60, journal=True)
+        for i in range(1000):
+            db.insert_values({VALUES!r}, 1_700_000_000.0 + i)
+        assert db.flush(timeout=30)
+        for i in range(1000, 1030):
+            db.insert_values({VALUES!r}, 1_700_000_000.0 + i)
+        os._exit(3)  # killed: no flush, no atexit
+    """)
+    assert subprocess.run([sys.executable, "-c", script], timeout=60).returncode == 3
+    assert count_rows(db_path) == 1000
+
+    base_id, records = read_journal(journal_path(db_path))
+    assert base_id == 1000 and len(records) == 30  # the committed rows were checkpointed away
+    assert recover_journals(tmp_path) == {db_path: 30}
+    with sqlite3.connect(db_path) as conn:
+        times = [t for t, in conn.execute("SELECT timestamp FROM sensor_readings ORDER BY id")]
+    assert times == [round((1_700_000_000.0 + i) * 1e6) for i in range(1030)]
+
+
+def test_journal_kept_when_a_commit_failed(tmp_path):
+    db_path = tmp_path / "run.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=10, flush_interval=0.05, journal=True)
+    for i in range(10):
+        db.insert_values(VALUES, 1_700_000_000.0 + i)
+    assert db.flush(timeout=5)
+    with sqlite3.connect(db_path) as conn:  # the disk fills up
+        conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON sensor_readings "
+                     "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+    conn.close()
+    for i in range(10, 35):
+        db.insert_values(VALUES, 1_700_000_000.0 + i)
+    assert not db.flush(timeout=1)
+    assert not db.close()
+    assert count_rows(db_path) == 10
+    assert journal_path(db_path).exists()
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TRIGGER fail_insert")
+    conn.close()
+    SensorDatabase(database_path=db_path, batched=True, journal=True).close()  # replays the journal
+    with sqlite3.connect(db_path) as conn:
+        times = [t for t, in conn.execute("SELECT timestamp FROM sensor_readings ORDER BY id")]
+    assert times == [round((1_700_000_000.0 + i) * 1e6) for i in range(35)]
+    assert not journal_path(db_path).exists()
@@ -0,0 +1,42 @@
+# test_live_stream.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import json
+from live_stream import LiveBroadcaster
+
+
+def parse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_snapshot_then_live_events():
+    broadcaster = LiveBroadcaster()
+    stream = broadcaster.stream(lambda: [("snapshot", {"rows": []})])
+    assert next(stream) == "retry: 2000\n\n"
+    assert parse(next(stream)) == ("snapshot", {"rows": []})
+    assert broadcaster.clients == 1
+
+    broadcaster.publish("row", {"t": 1.0, "0": "12:00:00"})
+    assert parse(next(stream)) == ("row", {"t": 1.0, "0": "12:00:00"})
+
+    stream.close()
+    assert broadcaster.clients == 0
+
+
+def test_slow_client_drops_oldest_without_blocking():
+    broadcaster = LiveBroadcaster(max_queue=3)
+    q = broadcaster.subscribe()
+    for i in range(10):
+        broadcaster.publish("log", {"i": i})
+    assert broadcaster.dropped == 7
+    assert [parse(q.get_nowait())[1]["i"] for _ in range(3)] == [7, 8, 9]
+
+
+def test_heartbeat_when_idle():
+    broadcaster = LiveBroadcaster(heartbeat=0.01)
+    stream = broadcaster.stream()
+    next(stream)
+    assert next(stream) == ": ping\n\n"
+    stream.close()
@@ -0,0 +1,92 @@
+# test_migrate_db.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import sqlite3
+import time
+from migrate_db import main, migrate_file
+from save_data import SCHEMA_VERSION, SensorDatabase, rebuild_rollups
+
+# sensor_readings as the dashboards created it before schema 2 (Streamlit flavour, with idx_id)
+LEGACY_SCHEMA = '''
+    CREATE TABLE sensor_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
+        perfusion_state INTEGER, valve_state INTEGER, humidity REAL, temperature REAL,
+        envir_pressure REAL, AQI REAL, current_pressure REAL, target_pressure REAL, motor_speed REAL
+    );
+    CREATE INDEX idx_timestamp ON sensor_readings(timestamp);
+    CREATE INDEX idx_id ON sensor_readings(id);
+'''
+T0 = 1_700_000_000
+
+
+def make_legacy(path, n=100):
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+        conn.executemany(
+            "INSERT INTO sensor_readings (timestamp, perfusion_state, valve_state, humidity, temperature, "
+            "envir_pressure, AQI, current_pressure, target_pressure, motor_speed) "
+            "VALUES (datetime(?, 'unixepoch', 'localtime'), 1, 0, 45.0, 22.0, 712.5, 30, ?, 15.0, 0.5)",
+            [(T0 + i, float(i)) for i in range(n)])
+    conn.close()
+    return path
+
+
+def indexes(conn):
+    return {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                           "AND name NOT LIKE 'sqlite_autoindex%'")}
+
+
+def test_new_database_uses_current_schema(tmp_path):
+    db_path = tmp_path / "new.db"
+    SensorDatabase(database_path=db_path).insert_values((1, 0, 45.0, 22.0, 712.5, 30, 14.8, 15.0, 0.5), 1234.25)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute("SELECT timestamp FROM sensor_readings").fetchone()[0] == 1_234_250_000
+        assert indexes(conn) == {"idx_timestamp"}
+
+
+def test_upgrade_in_place(tmp_path):
+    db_path = make_legacy(tmp_path / "perfusion_20250601_101500.db")
+    rows, before, after = migrate_file(db_path)
+    assert rows == 100
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert indexes(conn) == {"idx_timestamp"}
+        ids, stamps = zip(*conn.execute("SELECT id, timestamp FROM sensor_readings ORDER BY id"))
+        assert ids == tuple(range(1, 101))
+        assert stamps == tuple((T0 + i) * 1_000_000 for i in range(100))  # local time back to UTC
+        incremental = conn.execute("SELECT * FROM sensor_rollups ORDER BY resolution, bucket").fetchall()
+        rebuild_rollups(conn)
+        assert incremental == conn.execute("SELECT * FROM sensor_rollups ORDER BY resolution, bucket").fetchall()
+        plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM sensor_readings WHERE timestamp BETWEEN 1 AND 2"))
+    assert "idx_timestamp" in plan
+
+    assert migrate_file(db_path)[0] is None  # already current
+
+
+def test_sensor_database_upgrades_on_open(tmp_path):
+    db_path = make_legacy(tmp_path / "old.db", n=5)
+    db = SensorDatabase(database_path=db_path)
+    db.insert_values((1, 0, 45.0, 22.0, 712.5, 30, 99.0, 15.0, 0.5), T0 + 10.25)
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT id, timestamp FROM sensor_readings ORDER BY id DESC LIMIT 1").fetchone() == \
+            (6, (T0 + 10) * 1_000_000 + 250_000)
+
+
+def test_bulk_cli(tmp_path, capsys):
+    for i in range(4):
+        make_legacy(tmp_path / f"perfusion_rig1_2025060{i + 1}_101500.db", n=50)
+    (tmp_path / "notes.db").write_bytes(b"")  # empty file: no sensor_readings
+    main([str(tmp_path), "--workers", "2"])
+    out = capsys.readouterr().out
+    assert "Upgraded 4 of 5 file(s)" in out
+    assert "notes.db: skipped" in out
+
+    main([str(tmp_path), "--check"])
+    out = capsys.readouterr().out
+    assert out.count(f"schema {SCHEMA_VERSION}") == 4
+    assert "notes.db: not a session database" in out
@@ -0,0 +1,172 @@
+# test_save_data.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+import sqlite3
+import pytest
+from save_data import FETCH_COLUMNS, ROLLUP_COLUMNS, SensorDatabase, rebuild_rollups
+
+FRAME = ["1", "0", "45.2", "22.1", "712.5", "30", "14.8", "15.0", "0.1234"]
+
+
+def count_rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+
+
+def test_unbatched_insert(tmp_path):
+    db_path = tmp_path / "plain.db"
+    db = SensorDatabase(database_path=db_path)
+    db.insert_reading(FRAME)
+    assert count_rows(db_path) == 1
+
+
+def test_batched_flush_and_close(tmp_path):
+    db_path = tmp_path / "batched.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=1000, flush_interval=60)
+    for _ in range(250):
+        db.insert_reading(FRAME)
+
+    # Nothing reached the size/time threshold yet, flush() must force the commit
+    assert db.flush(timeout=5)
+    assert count_rows(db_path) == 250
+
+    db.insert_reading(FRAME)
+    db.close()
+    assert count_rows(db_path) == 251
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_batched_commits_on_batch_size(tmp_path):
+    db_path = tmp_path / "size.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=10, flush_interval=60)
+    for _ in range(30):
+        db.insert_reading(FRAME)
+    db.close()
+    assert db._writer.commits == 3
+    assert count_rows(db_path) == 30
+
+
+def rollups(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT * FROM sensor_rollups ORDER BY resolution, bucket").fetchall()
+
+
+def expected_rollups(db_path):
+    """The rollups recomputed from scratch, to compare with the incrementally maintained ones."""
+    with sqlite3.connect(db_path) as conn:
+        rebuild_rollups(conn)
+    return rollups(db_path)
+
+
+def test_rollups_follow_unbatched_inserts(tmp_path):
+    db_path = tmp_path / "plain.db"
+    db = SensorDatabase(database_path=db_path)
+    for i in range(20):
+        db.insert_values((1, 0, 45.0, 22.0 + i, 712.5, 30, 14.0 + i, 15.0, 0.5))
+    incremental = rollups(db_path)
+    assert incremental == expected_rollups(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        n, p_min, p_max, p_sum = conn.execute(
+            "SELECT SUM(n), MIN(current_pressure_min), MAX(current_pressure_max), SUM(current_pressure_sum) "
+            "FROM sensor_rollups WHERE resolution = 3600").fetchone()
+    assert (n, p_min, p_max, p_sum) == (20, 14.0, 33.0, sum(14.0 + i for i in range(20)))
+
+
+def test_rollups_follow_batched_inserts(tmp_path):
+    db_path = tmp_path / "batched.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=7, flush_interval=60)
+    for i in range(50):
+        db.insert_values((1, 0, 45.0, 22.0, 712.5, 30, float(i % 9), 15.0, 0.5))
+    db.close()
+    assert rollups(db_path) == expected_rollups(db_path)
+    with sqlite3.connect(db_path) as conn:
+        totals = conn.execute("SELECT resolution, SUM(n) FROM sensor_rollups GROUP BY resolution").fetchall()
+    assert totals == [(1, 50), (60, 50), (3600, 50)]
+
+
+def test_rollups_backfilled_for_old_database(tmp_path):
+    db_path = tmp_path / "old.db"
+    SensorDatabase(database_path=db_path).insert_reading(FRAME)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE sensor_rollups")  # as recorded before rollups existed
+
+    SensorDatabase(database_path=db_path)
+    rows = rollups(db_path)
+    assert [row[:3] for row in rows if row[0] == 60] and sum(row[2] for row in rows) == 3
+    assert len(rows[0]) == 3 + 3 * len(ROLLUP_COLUMNS)
+
+
+def test_fetch_after_reads_only_new_rows(tmp_path):
+    db = SensorDatabase(database_path=tmp_path / "run.db", batched=True, batch_size=10)
+    t0 = 1_700_000_000.0
+    values = [1, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234]
+    for i in range(25):
+        db.insert_values(values, received_at=t0 + i * 0.02)
+    db.flush()
+
+    cursor = db.cursor()
+    first = cursor.fetch(limit=20)
+    assert first["id"].tolist() == list(range(1, 21))
+    assert first["timestamp"][1] - first["timestamp"][0] == pytest.approx(0.02)
+    assert first["current_pressure"][0] == 14.8
+    assert cursor.fetch()["id"].tolist() == list(range(21, 26))
+    assert len(cursor.fetch()["id"]) == 0  # nothing new: nothing read
+    assert cursor.last_id == 25
+
+    db.insert_values(values, received_at=t0 + 1.0)
+    db.flush()
+    table = cursor.fetch(fmt="arrow")  # committed since: visible to the same read-only connection
+    assert table.column_names == list(FETCH_COLUMNS)
+    assert table.num_rows == 1 and table["id"][0].as_py() == 26
+    assert str(table.schema.field("timestamp").type) == "timestamp[us, tz=UTC]"
+
+    assert db.cursor(since=t0 + 0.1).fetch()["id"][0] == 7  # the first reading after t0 + 0.1 s
+    assert db.cursor(since=t0 + 60).fetch()["id"].size == 0
+    with pytest.raises(ValueError):
+        db.fetch_after(0, fmt="pandas")
+    db.close()
+
+
+def fail_inserts(db_path, fail=True):
+    """Make every insert into sensor_readings fail (a stand-in for a full disk), or stop doing so."""
+    with sqlite3.connect(db_path) as conn:
+        if fail:
+            conn.execute("CREATE TRIGGER fail_insert BEFORE INSERT ON sensor_readings "
+                         "BEGIN SELECT RAISE(ABORT, 'disk full'); END")
+        else:
+            conn.execute("DROP TRIGGER fail_insert")
+    conn.close()
+
+
+def test_failed_commit_is_kept_and_retried(tmp_path):
+    db_path = tmp_path / "retry.db"
+    db = SensorDatabase(database_path=db_path, batched=True, batch_size=10, flush_interval=0.05)
+    fail_inserts(db_path)
+    for i in range(25):
+        db.insert_values((i, 0, 45.2, 22.1, 712.5, 30, 14.8, 15.0, 0.1234), received_at=1_700_000_000.0 + i)
+    assert not db.flush(timeout=1)
+    assert db.failed_commits >= 1 and count_rows(db_path) == 0
+
+    fail_inserts(db_path, fail=False)
+    assert db.flush(timeout=5)
+    assert db.close()
+    with sqlite3.connect(db_path) as conn:
+        assert [row[0] for row in conn.execute("SELECT perfusion_state FROM sensor_readings ORDER BY id")] == \
+               list(range(25))  # nothing lost, nothing out of order
+
+
+def test_put_raises_once_the_writer_died(tmp_path, monkeypatch):
+    import save_data
+
+    def broken(conn, after_id):
+        raise RuntimeError("bug")
+    monkeypatch.setattr(save_data, "update_rollups", broken)
+    db = SensorDatabase(database_path=tmp_path / "dead.db", batched=True, batch_size=1, queue_size=5)
+    with pytest.raises(RuntimeError, match="stopped"):
+        for _ in range(100):  # far more than the queue holds: must not block
+            db.insert_reading(FRAME)
+    assert not db.flush(timeout=5)
+    assert not db.close()  # rows were left uncommitted
@@ -0,0 +1,79 @@
+# test_virtual_arduino.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Simulator')))
+import time
+from serial import Serial
+from frame_decoder import FrameDecoder
+from binary_frames import AutoFrameDecoder
+from virtual_arduino import VirtualArduino, ScriptedPressure
+
+
+def read_frames(ser, decoder, count, timeout=5):
+    frames = []
+    deadline = time.time() + timeout
+    while len(frames) < count and time.time() < deadline:
+        frames.extend(decoder.feed(ser.read(ser.in_waiting or 1)))
+    return frames
+
+
+def test_handshake_commands_and_frames():
+    with VirtualArduino(rate_hz=200, pressure_model=ScriptedPressure([(0, 10.0)])) as sim:
+        ser = Serial(port=sim.port, baudrate=115200, timeout=0.2)
+        decoder = FrameDecoder()
+        ser.write(b"START_PERFUSION,15.0,2.5,50,100,0\n")
+        frames = read_frames(ser, decoder, 50)
+        ser.close()
+
+    fields = [f.strip() for f in frames[-1].decode().split(",")]
+    assert len(fields) == 9
+    assert fields[0] == "1"  # PERFUSING
+    assert float(fields[6]) == 10.0
+    assert float(fields[7]) == 15.0
+    assert sim.commands_received == 1
+
+
+def test_fault_injection_is_survivable():
+    with VirtualArduino(rate_hz=500, garbage_rate=0.2, truncate_rate=0.2, seed=1) as sim:
+        ser = Serial(port=sim.port, baudrate=115200, timeout=0.2)
+        decoder = FrameDecoder()
+        frames = read_frames(ser, decoder, 100)
+        ser.close()
+
+    assert len(frames) >= 100
+    assert decoder.discarded_bytes > 0
+    assert all(len(f.split(b",")) in (2, 9) for f in frames)  # <OK,C2> or complete Status()
+
+
+def test_binary_frames():
+    with VirtualArduino(rate_hz=200, pressure_model=ScriptedPressure([(0, 10.0)]), binary=True) as sim:
+        ser = Serial(port=sim.port, baudrate=115200, timeout=0.2)
+        decoder = AutoFrameDecoder()
+        ser.write(b"START_PERFUSION,15.0,2.5,50,100,0\n")
+        frames = read_frames(ser, decoder, 50)
+        ser.close()
+
+    assert decoder.binary_mode
+    fields = [f.strip() for f in frames[-1].decode().split(",")]
+    assert len(fields) == 9
+    assert fields[0] == "1"
+    assert float(fields[6]) == 10.0
+    assert decoder.binary.crc_errors == 0
+    assert decoder.binary.lost_frames == 0
+
+
+def test_sequenced_commands_are_acknowledged():
+    with VirtualArduino(rate_hz=50, binary=True) as sim:
+        ser = Serial(port=sim.port, baudrate=115200, timeout=0.2)
+        decoder = AutoFrameDecoder()
+        ser.write(b"START_PERFUSION,15.0,2.5,50,100,0,#7\n")
+        frames = []
+        deadline = time.time() + 5
+        while b"ACK,7" not in frames and time.time() < deadline:
+            frames.extend(decoder.feed(ser.read(ser.in_waiting or 1)))
+        ser.close()
+
+    assert b"ACK,7" in frames
+    assert sim.commands == ["START_PERFUSION", "15.0", "2.5", "50", "100", "0"]
+
@@ -0,0 +1,7 @@
+#!/usr/bin/env bash
+# Make it executable by running following command in bash:
+# chmod +x Pi_run_simulator.sh
+# — Activate your venv (if you use one) —
+source /home/AG-Lang/Downloads/Perfusion_System/.venv/bin/activate
+# — Run the virtual Arduino (then start a dashboard with PERFUSION_SERIAL_PORT=/tmp/ttyPERF0) —
+python "/home/AG-Lang/Downloads/Perfusion_System/Simulator/virtual_arduino.py" --link /tmp/ttyPERF0 "$@"
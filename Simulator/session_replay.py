@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded run through the live pipeline, without the hardware.
+
+Sources:
+  perfusion_*.db   a session database; every reading becomes the Status() frame the controller
+                   sent (<state, valve, humidity, ..., rpm>), after the <OK,C2> handshake, and a
+                   final IDLE frame closes the session again on the receiving side
+  anything else    a raw capture of the serial port (e.g. `cat /dev/ttyACM0 > run.cap`), sent
+                   byte for byte, garbage included; it has no times, so frames are paced at --rate
+
+Speed is a factor on the recorded pace: 1 = real time, 10 = ten times faster, max = as fast as
+the receiver reads. Two ways to feed it in:
+
+  pty (default)    a pseudo-terminal like Simulator/virtual_arduino.py, so either dashboard runs
+                   unchanged: read_serial / the rig workers decode, store and display the frames
+                       python Simulator/session_replay.py perfusion_rig1_20250601_101500.db --speed 10 --link /tmp/ttyREPLAY
+                       PERFUSION_SERIAL_PORT=/tmp/ttyREPLAY python Dashboard_2/dashboard_2.py
+  --pipeline DIR   in this process: the bytes go through AutoFrameDecoder into a Dashboard_2 Rig
+                   (parse → session database in DIR → live buffers), with the recorded reception
+                   times, and the frames/s are reported; how fast a week-long run goes through
+                       python Simulator/session_replay.py perfusion_rig1_20250601_101500.db --speed max --pipeline /tmp/replayed
+
+In pty mode commands from the dashboard are acknowledged (<ACK,seq>) but change nothing: the
+recording cannot react to them.
+"""
+import argparse
+import os
+import re
+import select
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "Dashboard_2"))
+
+from virtual_arduino import VirtualArduino  # noqa: E402
+from binary_frames import AutoFrameDecoder, BINARY_HANDSHAKE, encode_frame  # noqa: E402
+from save_data import READING_COLUMNS, epoch_seconds_sql, schema_version  # noqa: E402
+
+
+TEXT_HANDSHAKE = b"<OK,C2>\r\n"
+READER_GRACE = 0.2  # seconds between a reader opening the port and the first byte (Serial() flushes on open)
+SQLITE_MAGIC = b"SQLite format 3\x00"
+_CAPTURE_RECORD = re.compile(rb"[^\n\x00]*[\n\x00]+|[^\n\x00]+$")  # up to a frame end (\r\n or 0x00)
+
+
+def text_frame(values):
+    """Status() frame for one sensor_readings row; repr() keeps every stored float exact."""
+    state, valve, *floats = values
+    return f"<{int(state)}, {int(valve)}, {', '.join(repr(float(v)) for v in floats)}>\r\n".encode()
+
+
+class SessionRecording:
+    """A session database as (recorded time, frame bytes), read in id order a batch at a time."""
+
+    recorded_times = True
+
+    def __init__(self, path, binary=False, batch_size=5000):
+        self.path = Path(path)
+        self.binary = binary  # re-encode as BINARY_FRAMES (float32, like the firmware's)
+        self.batch_size = batch_size
+        self.handshake = BINARY_HANDSHAKE + b"\r\n\x00" if binary else TEXT_HANDSHAKE
+        conn = self._connect()
+        try:
+            self.frame_count = conn.execute("SELECT COUNT(*) FROM sensor_readings").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def frames(self):
+        conn = self._connect()
+        try:
+            query = (f"SELECT {epoch_seconds_sql(schema_version(conn))}, {', '.join(READING_COLUMNS)} "
+                     "FROM sensor_readings ORDER BY id")
+            cursor = conn.execute(query)
+            last = None
+            seq = 0
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                for t, *values in rows:
+                    if self.binary:
+                        yield t, encode_frame(seq, int(t * 1000), values)
+                        seq += 1
+                    else:
+                        yield t, text_frame(values)
+                last = rows[-1]
+        finally:
+            conn.close()
+        if last is not None and last[1] != 0:
+            # the recording ends while perfusing; IDLE closes the replayed session as STOP did
+            t, state, valve, *floats = last
+            idle = [0, 0, *floats[:-1], 0.0]
+            yield t, encode_frame(seq, int(t * 1000), idle) if self.binary else text_frame(idle)
+
+
+class CaptureRecording:
+    """Raw serial bytes, one record per frame end; record i is due at i / rate seconds."""
+
+    recorded_times = False
+    handshake = b""  # whatever the port said is in the capture itself
+
+    def __init__(self, path, rate_hz=1.0):
+        self.path = Path(path)
+        self.rate_hz = rate_hz
+        self._data = self.path.read_bytes()
+        self.frame_count = len(_CAPTURE_RECORD.findall(self._data))
+
+    def frames(self):
+        for i, match in enumerate(_CAPTURE_RECORD.finditer(self._data)):
+            yield i / self.rate_hz, match.group()
+
+
+def open_recording(path, rate_hz=1.0, binary=False):
+    with open(path, "rb") as f:
+        is_database = f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    return SessionRecording(path, binary=binary) if is_database else CaptureRecording(path, rate_hz)
+
+
+def paced(frames, speed=1.0, max_gap=None, stop=None):
+    """
+    Yield (t, frame) when it is due: the recorded gaps (at most `max_gap` s each) divided by
+    `speed`. speed None or 0 = no waiting. Stops early once the `stop` Event is set.
+    """
+    started = time.monotonic()
+    offset = 0.0
+    previous = None
+    for t, frame in frames:
+        if speed:
+            if previous is not None:
+                gap = max(t - previous, 0.0)
+                offset += gap if max_gap is None else min(gap, max_gap)
+            previous = t
+            delay = started + offset / speed - time.monotonic()
+            if delay > 0:
+                if stop is None:
+                    time.sleep(delay)
+                elif stop.wait(delay):
+                    return
+        if stop is not None and stop.is_set():
+            return
+        yield t, frame
+
+
+def parse_speed(text):
+    """'1', '10', '0.5' → factor; 'max' (or 0) → None, as fast as possible."""
+    if text in ("max", "0"):
+        return None
+    speed = float(text)
+    if speed <= 0:
+        raise ValueError("speed must be positive, or 'max'")
+    return speed
+
+
+class ReplayPort(VirtualArduino):
+    """
+    Pseudo-terminal that plays a recording instead of simulating the controller. Nothing is
+    lost: the replay starts once a reader has opened the port, and writes wait while the reader
+    is behind, which is what paces speed=None. `finished` is set once the last frame is out.
+    """
+
+    def __init__(self, recording, speed=1.0, max_gap=None, link=None):
+        super().__init__(link=link)
+        self.recording = recording
+        self.speed = speed
+        self.max_gap = max_gap
+        self.finished = threading.Event()
+
+    def handle_command(self, line):
+        line = line.strip()
+        if not line:
+            return
+        self.commands_received += 1
+        if ",#" in line and self.acks:
+            self.acks_sent += 1
+            self._write(f"<ACK,{line.rpartition(',#')[2]}>\r\n".encode())
+
+    def _write_all(self, data):
+        while data:
+            master = self._master
+            if master is None or self._stop.is_set():
+                return False
+            try:
+                data = data[os.write(master, data):]
+            except BlockingIOError:
+                select.select([], [master], [], 0.1)  # the reader is behind
+            except OSError:
+                return False
+        return True
+
+    def _wait_for_reader(self):
+        """Until a reader opens the port, the master reports a hang-up. False if stopped first."""
+        poller = select.poll()
+        poller.register(self._master, select.POLLHUP)
+        while not self._stop.is_set():
+            if not poller.poll(0):
+                return not self._stop.wait(READER_GRACE)
+            self._stop.wait(0.05)
+        return False
+
+    def _emit_loop(self):
+        if not self._wait_for_reader() or not self._write_all(self.recording.handshake):
+            return
+        for _, frame in paced(self.recording.frames(), self.speed, self.max_gap, self._stop):
+            if not self._write_all(frame):
+                break
+            self.frames_sent += 1
+        self.finished.set()
+
+    def start(self):
+        """Open the pty and wait for a reader in the background. Returns the device path."""
+        self._open_pty()
+        os.close(self._slave)  # only the reader holds the slave, so the master sees when it is open
+        self._slave = None
+        self.finished.clear()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._emit_loop, name="replay-emit", daemon=True),
+            threading.Thread(target=self._command_loop, name="replay-commands", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self.port
+
+
+def replay_through_pipeline(recording, db_dir, speed=None, max_gap=None, rig_id="replay", **rig_settings):
+    """
+    Decode → store → display in this process: the recording's bytes go through the decoder
+    SerialReader uses into a Dashboard_2 Rig (use_process=False), stamped with the recorded
+    times (arrival times for captures). Returns the stopped Rig; its db_path is the replayed session.
+    """
+    from rig import Rig
+
+    rig = Rig(rig_id, None, db_dir, use_process=False, **rig_settings)
+    decoder = AutoFrameDecoder()
+    for frame in decoder.feed(recording.handshake):
+        rig.handle_frame(frame.decode("utf-8", errors="replace").strip(), time.time())
+    try:
+        for t, chunk in paced(recording.frames(), speed, max_gap):
+            received_at = t if recording.recorded_times else time.time()
+            for frame in decoder.feed(chunk):
+                rig.handle_frame(frame.decode("utf-8", errors="replace").strip(), received_at)
+    finally:
+        rig.stop()
+    return rig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session or raw capture through the pipeline")
+    parser.add_argument("recording", help="perfusion_*.db session database or raw serial capture")
+    parser.add_argument("--speed", default="1", help="Factor on the recorded pace, or 'max' (default 1 = real time)")
+    parser.add_argument("--rate", type=float, default=1.0, help="Frames per second of a raw capture at speed 1")
+    parser.add_argument("--max-gap", type=float, default=None, help="Shorten recorded pauses to this many seconds")
+    parser.add_argument("--binary", action="store_true", help="Send a session as BINARY_FRAMES (float32) frames")
+    parser.add_argument("--link", default=None, help="Stable symlink to the pty, e.g. /tmp/ttyREPLAY")
+    parser.add_argument("--pipeline", default=None, metavar="DB_DIR",
+                        help="Replay in this process into a Dashboard_2 Rig storing to DB_DIR, and report frames/s")
+    args = parser.parse_args()
+
+    try:
+        speed = parse_speed(args.speed)
+    except ValueError as e:
+        parser.error(str(e))
+    recording = open_recording(args.recording, rate_hz=args.rate, binary=args.binary)
+    print(f"▶ {recording.path.name}: {recording.frame_count} frames at "
+          + ("max speed" if speed is None else f"{speed:g}× speed"))
+
+    if args.pipeline:
+        Path(args.pipeline).mkdir(parents=True, exist_ok=True)
+        started, cpu = time.perf_counter(), time.process_time()
+        rig = replay_through_pipeline(recording, args.pipeline, speed, args.max_gap, journal=True)
+        wall, cpu = time.perf_counter() - started, time.process_time() - cpu
+        stats = rig.ingest_stats
+        print(f"{stats['received']} frames in {wall:.2f} s ({stats['received'] / wall:.0f} frames/s, "
+              f"{cpu / max(stats['received'], 1) * 1e6:.1f} µs CPU/frame), stored {stats['stored']}, "
+              f"rejected {stats['bad_frames']} → {rig.db_path}")
+        return
+
+    port = ReplayPort(recording, speed, args.max_gap, link=args.link)
+    port.start()
+    print(f"🔌 Replaying on {port.port}" + (f" (linked as {args.link})" if args.link else ""))
+    print(f"   Set PERFUSION_SERIAL_PORT={args.link or port.port} and start a dashboard; the replay starts "
+          "when it opens the port.")
+    try:
+        while not port.finished.wait(5):
+            print(f"sent {port.frames_sent}/{recording.frame_count}")
+        print(f"Done: {port.frames_sent} frames sent. Ctrl+C closes the port.")
+        while True:
+            time.sleep(5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        port.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Virtual Controller_2 on a pseudo-terminal.
+
+Opens a pty that behaves like the Arduino running Controller_2.ino: it prints <OK,C2> once it is
+"booted", accepts the 6-field cmd_history packets (START_PERFUSION,15.0,2.5,50,100,0) and
+reports Status() frames
+
+    <state, valve, humidity, temperature, envir_pressure, AQI, current_pressure, target_pressure, rpm>
+
+at a configurable rate (1 Hz like the firmware, up to several kHz for load tests).
+
+Point a dashboard at it with the PERFUSION_SERIAL_PORT environment variable:
+
+    python Simulator/virtual_arduino.py --rate 1000 --link /tmp/ttyPERF0
+    PERFUSION_SERIAL_PORT=/tmp/ttyPERF0 python Dashboard_2/dashboard_2.py
+
+Pressure dynamics can be scripted with a JSON file of [seconds, mmHg] breakpoints (linearly
+interpolated, the last value is held), and faults can be injected: garbage bytes, truncated
+frames and periodic disconnects. With --binary it behaves like firmware built with
+BINARY_FRAMES = true: handshake <OK,BIN> and COBS/CRC16 frames (see Dashboard_2/binary_frames.py).
+"""
+import argparse
+import binascii
+import bisect
+import json
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+
+# Same order/meaning as the firmware's enum PerfusionState { IDLE, PERFUSING, PAUSED }
+IDLE, PERFUSING, PAUSED = 0, 1, 2
+DEFAULT_COMMANDS = ["IDLE", "500", "2.5", "0", "0", "0"]  # Commands[] in Controller_2.ino
+BINARY_BODY = struct.Struct("<BHIBB7f")  # send_binary_frame() in Controller_2/Framing.cpp
+
+
+def cobs_encode(data):
+    out = bytearray(b"\x00")
+    code_index, code = 0, 1
+    for byte in data:
+        if byte:
+            out.append(byte)
+            code += 1
+        if not byte or code == 0xFF:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+    out[code_index] = code
+    return bytes(out)
+
+
+class ScriptedPressure:
+    """Piecewise-linear pressure profile from [(seconds, mmHg), ...] breakpoints."""
+
+    def __init__(self, points):
+        points = sorted((float(t), float(p)) for t, p in points)
+        if not points:
+            raise ValueError("Pressure script needs at least one [seconds, mmHg] point")
+        self._times = [t for t, _ in points]
+        self._values = [p for _, p in points]
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def __call__(self, t, sim):
+        i = bisect.bisect_right(self._times, t)
+        if i == 0:
+            return self._values[0]
+        if i == len(self._times):
+            return self._values[-1]
+        t0, t1 = self._times[i - 1], self._times[i]
+        p0, p1 = self._values[i - 1], self._values[i]
+        return p0 + (p1 - p0) * (t - t0) / (t1 - t0)
+
+
+class FirstOrderPressure:
+    """
+    Default plant: pressure relaxes towards the target while perfusing and back to zero
+    otherwise, with a bit of sensor noise. `tau` is the time constant in seconds.
+    """
+
+    def __init__(self, tau=20.0, noise=0.05):
+        self.tau = tau
+        self.noise = noise
+        self._pressure = 0.0
+        self._last_t = None
+
+    def __call__(self, t, sim):
+        dt = 0.0 if self._last_t is None else t - self._last_t
+        self._last_t = t
+        goal = sim.target_pressure if sim.state == PERFUSING else 0.0
+        if sim.valve_open:
+            goal = min(goal, 0.5 * sim.target_pressure)
+        alpha = min(1.0, dt / self.tau) if self.tau > 0 else 1.0
+        self._pressure += (goal - self._pressure) * alpha
+        return self._pressure + random.gauss(0.0, self.noise)
+
+
+class VirtualArduino:
+    """
+    Pseudo-terminal Controller_2. `port` is the device path a Serial() can open.
+
+    rate_hz: Status() frames per second.
+    pressure_model: callable(t_seconds, sim) -> mmHg.
+    garbage_rate / truncate_rate: probability per frame of injecting junk bytes / cutting the frame short.
+    disconnect_every: seconds between simulated cable pulls (0 = never); the pty is reopened
+    after `reconnect_delay` seconds and `link` (if given) is re-pointed at the new device.
+    binary: emit BINARY_FRAMES frames instead of <...> text lines.
+    acks: answer sequenced command packets with <ACK,seq> (False = firmware before the ACKs).
+    """
+
+    def __init__(self, rate_hz=1.0, pressure_model=None, garbage_rate=0.0, truncate_rate=0.0,
+                 disconnect_every=0.0, reconnect_delay=2.0, link=None, seed=None, binary=False, acks=True):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.rate_hz = rate_hz
+        self.pressure_model = pressure_model or FirstOrderPressure()
+        self.garbage_rate = garbage_rate
+        self.truncate_rate = truncate_rate
+        self.disconnect_every = disconnect_every
+        self.reconnect_delay = reconnect_delay
+        self.link = link
+        self.binary = binary
+        self.acks = acks
+        self._random = random.Random(seed)
+
+        # Firmware state
+        self.commands = list(DEFAULT_COMMANDS)
+        self.state = IDLE
+        self.valve_open = False
+        self.target_pressure = float(DEFAULT_COMMANDS[1])
+        self.flow_rate = float(DEFAULT_COMMANDS[2])
+        self.current_pressure = 0.0
+        self.frame_seq = 0
+        self._started_at = time.monotonic()
+
+        # Statistics
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.commands_received = 0
+        self.acks_sent = 0
+        self.disconnects = 0
+
+        self._master = None
+        self._slave = None
+        self.port = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- pty handling ---
+    def _open_pty(self):
+        master, slave = os.openpty()
+        tty.setraw(slave)  # no echo, no newline translation: behave like a UART
+        os.set_blocking(master, False)
+        self._master, self._slave = master, slave
+        self.port = os.ttyname(slave)
+        if self.link:
+            tmp = f"{self.link}.tmp"
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            os.symlink(self.port, tmp)
+            os.replace(tmp, self.link)
+
+    def _close_pty(self):
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def _write(self, data):
+        """Non-blocking write; like a USB-serial bridge with nobody listening, excess is lost."""
+        if self._master is None:
+            return False
+        try:
+            written = os.write(self._master, data)
+        except (BlockingIOError, OSError):
+            return False
+        return written == len(data)
+
+    @property
+    def handshake(self):
+        return b"<OK,BIN>\r\n\x00" if self.binary else b"<OK,C2>\r\n"
+
+    # --- firmware behaviour ---
+    def handle_command(self, line):
+        """Apply one cmd_history packet the way loop()/CommandParser() in Controller_2.ino do."""
+        line = line.strip()
+        seq = None
+        if ",#" in line:  # sequenced packet, acknowledged with <ACK,seq> once applied
+            line, _, seq = line.rpartition(",#")
+        self._apply_commands(line)
+        if seq is not None and self.acks:
+            self.acks_sent += 1
+            ack = f"<ACK,{seq}>\r\n".encode()
+            self._write(ack + b"\x00" if self.binary else ack)
+
+    def _apply_commands(self, line):
+        if not line or line == ",".join(self.commands):
+            return
+        self.commands_received += 1
+        for index, value in enumerate(line.split(",")[:len(self.commands)]):
+            self.commands[index] = value
+
+        command = self.commands[0]
+        if command in ("START_PERFUSION", "CONTINUE_PERFUSION"):
+            self.state = PERFUSING
+        elif command == "PAUSE_PERFUSION":
+            self.state = PAUSED
+            self.valve_open = False
+        elif command == "END_PERFUSION":
+            self.state = IDLE
+
+        try:
+            if self.commands[1] != "1":
+                self.target_pressure = float(self.commands[1])
+            self.flow_rate = float(self.commands[2])
+        except ValueError:
+            pass
+        if self.state == IDLE:
+            self.valve_open = self.commands[5].strip() == "1"
+
+    def status_frame(self, t):
+        """Build one Status() frame (text line or binary frame) for simulation time t."""
+        self.current_pressure = self.pressure_model(t, self)
+        if self.state == PERFUSING:
+            # Perfusion::open_valve(): relieve pressure above the target
+            self.valve_open = self.current_pressure > self.target_pressure
+            # firmware safety stop at 1.3x target
+            if self.current_pressure > 1.3 * self.target_pressure:
+                self.state = IDLE
+        rpm = self.flow_rate / 50.0 if self.state == PERFUSING else 0.0
+        humidity = 45.0 + random.uniform(-0.5, 0.5)
+        temperature = 22.0 + random.uniform(-0.2, 0.2)
+        if self.binary:
+            millis = int((time.monotonic() - self._started_at) * 1000)
+            body = BINARY_BODY.pack(1, self.frame_seq, millis & 0xFFFFFFFF, self.state, int(self.valve_open),
+                                    humidity, temperature, 712.5, 30.0, self.current_pressure,
+                                    self.target_pressure, rpm)
+            self.frame_seq = (self.frame_seq + 1) & 0xFFFF
+            return cobs_encode(body + binascii.crc_hqx(body, 0xFFFF).to_bytes(2, "big")) + b"\x00"
+        return (f"<{self.state}, {int(self.valve_open)}, {humidity:.1f}, {temperature:.1f}, 712.5, 30, "
+                f"{self.current_pressure:.2f}, {self.target_pressure:.2f}, {rpm:.4f}>\r\n").encode()
+
+    def _inject_faults(self, frame):
+        if self.truncate_rate and self._random.random() < self.truncate_rate:
+            frame = frame[:self._random.randint(1, len(frame) - 3)]
+        if self.garbage_rate and self._random.random() < self.garbage_rate:
+            junk = bytes(self._random.randrange(256) for _ in range(self._random.randint(1, 32)))
+            frame = junk + frame
+        return frame
+
+    # --- threads ---
+    def _emit_loop(self):
+        start = time.monotonic()
+        last_disconnect = start
+        sent = 0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self.disconnect_every and now - last_disconnect >= self.disconnect_every:
+                with self._lock:
+                    self._close_pty()
+                self.disconnects += 1
+                if self._stop.wait(self.reconnect_delay):
+                    break
+                with self._lock:
+                    self._open_pty()
+                    self._write(self.handshake)
+                last_disconnect = time.monotonic()
+
+            # Emit every frame that is due since the start (several per write at kHz rates)
+            due = int((now - start) * self.rate_hz) + 1
+            if due > sent:
+                t = now - start
+                with self._lock:
+                    chunk = b"".join(self._inject_faults(self.status_frame(t)) for _ in range(due - sent))
+                    ok = self._write(chunk)
+                if ok:
+                    self.frames_sent += due - sent
+                else:
+                    self.frames_dropped += due - sent
+                sent = due
+            next_due = start + sent / self.rate_hz
+            self._stop.wait(max(0.0005, next_due - time.monotonic()))
+
+    def _command_loop(self):
+        pending = b""
+        while not self._stop.is_set():
+            master = self._master
+            if master is None:
+                self._stop.wait(0.05)
+                continue
+            try:
+                ready, _, _ = select.select([master], [], [], 0.1)
+                if not ready:
+                    continue
+                data = os.read(master, 4096)
+            except (OSError, ValueError):
+                self._stop.wait(0.05)
+                continue
+            pending += data
+            while b"\n" in pending:
+                line, pending = pending.split(b"\n", 1)
+                with self._lock:
+                    self.handle_command(line.decode("utf-8", errors="replace"))
+
+    def start(self):
+        """Open the pty, print the <OK,C2> handshake and start streaming. Returns the device path."""
+        self._open_pty()
+        self._started_at = time.monotonic()
+        self._write(self.handshake)
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._emit_loop, name="sim-emit", daemon=True),
+            threading.Thread(target=self._command_loop, name="sim-commands", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self.port
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            self._close_pty()
+        if self.link and os.path.islink(self.link):
+            os.unlink(self.link)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Controller_2 on a pseudo-terminal")
+    parser.add_argument("--rate", type=float, default=1.0, help="Status() frames per second (default 1)")
+    parser.add_argument("--link", default=None, help="Stable symlink to the pty, e.g. /tmp/ttyPERF0")
+    parser.add_argument("--script", default=None, help="JSON list of [seconds, mmHg] pressure breakpoints")
+    parser.add_argument("--tau", type=float, default=20.0, help="Time constant of the default pressure model (s)")
+    parser.add_argument("--garbage", type=float, default=0.0, help="Probability per frame of junk bytes")
+    parser.add_argument("--truncate", type=float, default=0.0, help="Probability per frame of a truncated frame")
+    parser.add_argument("--disconnect-every", type=float, default=0.0, help="Seconds between simulated disconnects")
+    parser.add_argument("--reconnect-delay", type=float, default=2.0, help="Seconds the port stays away")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for fault injection")
+    parser.add_argument("--binary", action="store_true", help="COBS/CRC16 binary frames (BINARY_FRAMES firmware)")
+    parser.add_argument("--no-acks", action="store_true", help="Do not acknowledge commands (older firmware)")
+    args = parser.parse_args()
+
+    model = ScriptedPressure.from_file(args.script) if args.script else FirstOrderPressure(tau=args.tau)
+    sim = VirtualArduino(rate_hz=args.rate, pressure_model=model, garbage_rate=args.garbage,
+                         truncate_rate=args.truncate, disconnect_every=args.disconnect_every,
+                         reconnect_delay=args.reconnect_delay, link=args.link, seed=args.seed, binary=args.binary,
+                         acks=not args.no_acks)
+    port = sim.start()
+    print(f"🔌 Virtual Arduino on {port}" + (f" (linked as {args.link})" if args.link else ""))
+    print(f"   Set PERFUSION_SERIAL_PORT={args.link or port} before starting a dashboard.")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"sent={sim.frames_sent} dropped={sim.frames_dropped} "
+                  f"commands={sim.commands_received} state={sim.state} "
+                  f"pressure={sim.current_pressure:.2f}/{sim.target_pressure:.2f}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import sqlite3
 import pandas as pd
 import streamlit as st
+import os
 import tempfile
+import datetime
+import shutil
 from io import StringIO
+from export import FORMATS, MIME_TYPES, count_rows, export
 
 
 st.set_page_config(
@@ -12,6 +16,9 @@ st.set_page_config(
 )
 
 
+PREVIEW_ROWS = 1000
+
+
 # ---- Functions ----
 def get_connection(db_path: str) -> sqlite3.Connection:
     """
@@ -27,9 +34,42 @@ def fetch_all_readings(conn: sqlite3.Connection) -> pd.DataFrame:
     """
     query = f"SELECT * FROM sensor_readings"
     df = pd.read_sql_query(query, conn)
+    return local_timestamps(df)
+
+
+def fetch_preview(conn: sqlite3.Connection, limit: int = PREVIEW_ROWS) -> pd.DataFrame:
+    """
+    Fetch the first `limit` rows only; the full table is never loaded for display.
+    """
+    return local_timestamps(
+        pd.read_sql_query("SELECT * FROM sensor_readings ORDER BY id LIMIT ?", conn, params=(limit,)))
+
+
+def local_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Show schema 2 timestamps (INTEGER epoch microseconds) as local date/time, like the TEXT
+    timestamps of older session databases.
+    """
+    if "timestamp" in df and pd.api.types.is_integer_dtype(df["timestamp"]):
+        df["timestamp"] = (pd.to_datetime(df["timestamp"], unit="us", utc=True)
+                           .dt.tz_convert(datetime.datetime.now().astimezone().tzinfo))
     return df
 
 
+def export_to_file(db_path: str, fmt: str, progress=None) -> str:
+    """
+    Stream sensor_readings chunk by chunk into a temporary Parquet/CSV file and return its path.
+    """
+    out_file = tempfile.NamedTemporaryFile(delete=False, suffix=FORMATS[fmt])
+    out_file.close()
+    conn = get_connection(db_path)
+    try:
+        export(conn, out_file.name, fmt, progress=progress)
+    finally:
+        conn.close()
+    return out_file.name
+
+
 def save_dataframe_to_csv(df: pd.DataFrame) -> str:
     """
     Convert a DataFrame to a CSV string for download.
@@ -50,36 +90,49 @@ uploaded_db = st.file_uploader(
 
 if uploaded_db is not None:
     print(f"Uploaded file: {uploaded_db.name}")
-    # Save uploaded file to a temporary location
+    # Save uploaded file to a temporary location (copied in chunks, not read() in one piece)
     tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".db")
-    tmp_file.write(uploaded_db.read())
+    uploaded_db.seek(0)
+    shutil.copyfileobj(uploaded_db, tmp_file)
     tmp_file.flush()
     db_path = tmp_file.name
 
-    temp_file_name = uploaded_db.name.replace('.db', '.csv')
+    fmt = st.radio("Export format", ["parquet", "csv"], horizontal=True,
+                   help="Parquet is compressed and typed; week-long runs stay small.")
+    temp_file_name = uploaded_db.name.rsplit('.', 1)[0] + FORMATS[fmt]
 
     # Fetch and display readings
     if st.button("🔄 Load All Readings"):
         with st.spinner("Fetching data..."):
             conn = get_connection(db_path)
-            df = fetch_all_readings(conn)
+            total = count_rows(conn)
+            preview = fetch_preview(conn)
             conn.close()
 
-            if df.empty:
+            if total == 0:
                 st.warning("No readings found in the database.")
             else:
-                st.success(f"Loaded {len(df)} records from sensor_readings.")
-                
-
-                # Offer CSV download
-                csv_buffer = save_dataframe_to_csv(df)
-                st.download_button(
-                    label="📥 Download CSV",
-                    data=csv_buffer,
-                    file_name=temp_file_name,
-                    mime="text/csv"
-                )
-                st.dataframe(df)
+                st.success(f"Found {total} records in sensor_readings.")
+
+                # Rows are streamed from SQLite into the export file in chunks, so memory stays
+                # bounded by one chunk rather than the whole run
+                progress = st.progress(0.0, text="Exporting...")
+                export_path = export_to_file(
+                    db_path, fmt,
+                    progress=lambda rows: progress.progress(min(rows / total, 1.0), text=f"Exported {rows}/{total} rows"))
+                progress.empty()
+
+                # Offer download
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        label=f"📥 Download {fmt.upper()}",
+                        data=export_file,
+                        file_name=temp_file_name,
+                        mime=MIME_TYPES[fmt]
+                    )
+                os.remove(export_path)  # the download button keeps its own copy
+                st.caption(f"Showing the first {len(preview)} of {total} rows.")
+                st.dataframe(preview)
 else:
     st.info("Please upload a SQLite database file to begin.")
 